@@ -0,0 +1,390 @@
+# File: analytics.py
+"""
+Incremental cohort rollups over the assessment log.
+
+Aggregates are kept per (day, stage) cell and persisted to
+``analytics_rollup.json`` together with a cursor into the log segments, so
+``refresh()`` only reads entries appended since the last call. Marginals
+(overall, per stage, per day) are maintained alongside the cells, so
+dashboard queries cost the same regardless of how many entries were logged.
+
+Both log schemas are understood:
+    legacy  {"d", "i", "s", "c", "stage"}                     raw totals, no timestamp
+    current {"timestamp", "traits", "trait_score", "harmony_ratio", "stage", "mood"?}
+
+Legacy rows get trait percentages, harmony ratio and trait score derived the
+way analyze_profile computes them, and are filed under the day "unknown".
+
+    python analytics.py            # refresh and print a summary
+    python analytics.py --rebuild  # recompute from the whole log (streaming)
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from content import STAGE_COUNT, TRAITS
+from utils import AssessmentLog, get_assessment_log, locked
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_PATH = "analytics_rollup.json"
+ROLLUP_VERSION = 1
+UNKNOWN_DAY = "unknown"
+HARMONY_BIN_WIDTH = 5  # harmony-ratio histogram bins: [0, 5), [5, 10), ... [95, 100]
+HARMONY_BINS = 100 // HARMONY_BIN_WIDTH
+MOOD_LEVELS = 11  # mood slider 0..10
+
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_STAGE_RE = re.compile(r"(\d+)")
+
+
+# ——— Normalization ————————————————————————————————————————————————
+
+def _stage_number(value: Any) -> int:
+    """Stage as 1..STAGE_COUNT, or 0 when missing or unparseable."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        n = value
+    else:
+        m = _STAGE_RE.search(str(value or ""))
+        n = int(m.group(1)) if m else 0
+    return n if 1 <= n <= STAGE_COUNT else 0
+
+
+def normalize_entry(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Map a log entry of either schema onto one record shape.
+
+    Args:
+        entry: One decoded log line.
+
+    Returns:
+        {"day", "stage", "traits" (D/I/S/C percentages tuple), "harmony",
+        "score", "mood"} with None for unknown numbers, or None if the entry
+        has no usable trait data.
+    """
+    if not isinstance(entry, dict):
+        return None
+    try:
+        if isinstance(entry.get("traits"), dict):
+            traits = tuple(float(entry["traits"].get(t, 0)) for t in TRAITS)
+            harmony = entry.get("harmony_ratio")
+            score = entry.get("trait_score")
+        elif all(k in entry for k in ("d", "i", "s", "c")):
+            raw = [float(entry[k]) for k in ("d", "i", "s", "c")]
+            total = sum(raw) if sum(raw) > 0 else 1
+            traits = tuple(float(round(v / total * 100)) for v in raw)
+            avg = sum(traits) / 4
+            harmony = round(100 - sum(abs(v - avg) for v in traits) / 4, 2)
+            score = round((avg + harmony) / 2, 2)
+        else:
+            return None
+    except (TypeError, ValueError):
+        return None
+
+    timestamp = str(entry.get("timestamp") or "")
+    mood = entry.get("mood")
+    return {
+        "day": timestamp[:10] if _DAY_RE.match(timestamp) else UNKNOWN_DAY,
+        "stage": _stage_number(entry.get("stage")),
+        "traits": traits,
+        "harmony": float(harmony) if isinstance(harmony, (int, float)) else None,
+        "score": float(score) if isinstance(score, (int, float)) else None,
+        "mood": int(mood) if isinstance(mood, (int, float)) and 0 <= mood < MOOD_LEVELS else None,
+    }
+
+
+def read_entries(path: str, offset: int = 0) -> Iterator[Tuple[Optional[Dict[str, Any]], int]]:
+    """
+    Yield (entry, offset after it) for each complete line of a log file from
+    ``offset`` on; entry is None for a malformed line.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # a writer is mid-line; pick it up next time
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), offset
+            except ValueError:
+                logger.warning("Skipping malformed log line in %s at byte %d", path, offset - len(line))
+                yield None, offset
+
+
+# ——— Aggregates ————————————————————————————————————————————————————
+
+class Aggregate:
+    """Mergeable counters for one group of records."""
+
+    __slots__ = ("count", "trait_sums", "harmony_sum", "harmony_n", "harmony_hist",
+                 "score_sum", "score_n", "mood_sum", "mood_n", "mood_hist")
+
+    def __init__(self):
+        self.count = 0
+        self.trait_sums = [0.0] * len(TRAITS)
+        self.harmony_sum = 0.0
+        self.harmony_n = 0
+        self.harmony_hist = [0] * HARMONY_BINS
+        self.score_sum = 0.0
+        self.score_n = 0
+        self.mood_sum = 0
+        self.mood_n = 0
+        self.mood_hist = [0] * MOOD_LEVELS
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.count += 1
+        for k, v in enumerate(record["traits"]):
+            self.trait_sums[k] += v
+        if record["harmony"] is not None:
+            self.harmony_sum += record["harmony"]
+            self.harmony_n += 1
+            self.harmony_hist[min(HARMONY_BINS - 1, max(0, int(record["harmony"] // HARMONY_BIN_WIDTH)))] += 1
+        if record["score"] is not None:
+            self.score_sum += record["score"]
+            self.score_n += 1
+        if record["mood"] is not None:
+            self.mood_sum += record["mood"]
+            self.mood_n += 1
+            self.mood_hist[record["mood"]] += 1
+
+    def merge(self, other: "Aggregate") -> None:
+        self.count += other.count
+        self.trait_sums = [a + b for a, b in zip(self.trait_sums, other.trait_sums)]
+        self.harmony_sum += other.harmony_sum
+        self.harmony_n += other.harmony_n
+        self.harmony_hist = [a + b for a, b in zip(self.harmony_hist, other.harmony_hist)]
+        self.score_sum += other.score_sum
+        self.score_n += other.score_n
+        self.mood_sum += other.mood_sum
+        self.mood_n += other.mood_n
+        self.mood_hist = [a + b for a, b in zip(self.mood_hist, other.mood_hist)]
+
+    def mean_traits(self) -> Dict[str, float]:
+        return {t: (s / self.count if self.count else 0.0) for t, s in zip(TRAITS, self.trait_sums)}
+
+    def mean_harmony(self) -> Optional[float]:
+        return self.harmony_sum / self.harmony_n if self.harmony_n else None
+
+    def mean_score(self) -> Optional[float]:
+        return self.score_sum / self.score_n if self.score_n else None
+
+    def mean_mood(self) -> Optional[float]:
+        return self.mood_sum / self.mood_n if self.mood_n else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Aggregate":
+        agg = cls()
+        for name in cls.__slots__:
+            if name in data:
+                setattr(agg, name, data[name])
+        return agg
+
+
+def _stage_label(stage: int) -> str:
+    return f"Stage {stage}" if stage else "Unknown"
+
+
+class Rollups:
+    """
+    Per-(day, stage) aggregates with a cursor into the assessment log.
+
+    Args:
+        log: The AssessmentLog to read (defaults to the process-wide log).
+        path: Where the rollups and cursor are persisted.
+    """
+
+    def __init__(self, log: Optional[AssessmentLog] = None, path: str = ROLLUP_PATH):
+        self.log = log or get_assessment_log()
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of the rollup file we hold
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        self.cursor: Tuple[int, int] = (1, 0)  # (segment number, byte offset); the active file is last + 1
+        self.cells: Dict[Tuple[str, int], Aggregate] = {}
+        self.overall = Aggregate()
+        self.by_stage: Dict[int, Aggregate] = {}
+        self.by_day: Dict[str, Aggregate] = {}
+
+    # ——— Persistence ———————————————————————————————————————————
+
+    def _load(self) -> None:
+        try:
+            st = os.stat(self.path)
+            if (st.st_mtime_ns, st.st_size) == self._loaded:
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning("Ignoring unreadable analytics rollup %s; it will be rebuilt", self.path)
+            return
+        if data.get("version") != ROLLUP_VERSION:
+            return
+        self._reset()
+        self.cursor = tuple(data["cursor"])
+        for cell in data["cells"]:
+            self._add_cell(cell["day"], cell["stage"], Aggregate.from_dict(cell["agg"]))
+        self._loaded = (st.st_mtime_ns, st.st_size)
+
+    def _save(self) -> None:
+        data = {
+            "version": ROLLUP_VERSION,
+            "cursor": list(self.cursor),
+            "cells": [{"day": day, "stage": stage, "agg": agg.to_dict()}
+                      for (day, stage), agg in sorted(self.cells.items())],
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._loaded = (st.st_mtime_ns, st.st_size)
+
+    def _add_cell(self, day: str, stage: int, agg: Aggregate) -> None:
+        for table, key in ((self.cells, (day, stage)), (self.by_stage, stage), (self.by_day, day)):
+            if key not in table:
+                table[key] = Aggregate()
+            table[key].merge(agg)
+        self.overall.merge(agg)
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        day, stage = record["day"], record["stage"]
+        for table, key in ((self.cells, (day, stage)), (self.by_stage, stage), (self.by_day, day)):
+            agg = table.get(key)
+            if agg is None:
+                agg = table[key] = Aggregate()
+            agg.add(record)
+        self.overall.add(record)
+
+    # ——— Updating ——————————————————————————————————————————————
+
+    def refresh(self) -> int:
+        """
+        Fold entries appended since the last refresh into the rollups.
+
+        Returns:
+            Number of log entries consumed.
+        """
+        with self._lock, open(self.path + ".lock", "a") as lock_file, locked(lock_file.fileno()):
+            self._load()  # another process may have advanced the cursor
+            seq, offset = self.cursor
+            consumed = 0
+            for number, path in self.log.numbered_segments():
+                if number < seq:
+                    continue
+                position = offset if number == seq else 0
+                for entry, position in read_entries(path, position):
+                    record = normalize_entry(entry) if entry is not None else None
+                    if record is not None:
+                        self._add(record)
+                    consumed += 1
+                self.cursor = (number, position)
+            if consumed:
+                self._save()
+            return consumed
+
+    def rebuild(self) -> int:
+        """
+        Recompute every aggregate by streaming the whole log.
+
+        Memory is bounded by the number of (day, stage) cells, not by log size.
+
+        Returns:
+            Number of log entries consumed.
+        """
+        with self._lock:
+            self._reset()
+            self._loaded = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        return self.refresh()
+
+    # ——— Queries ———————————————————————————————————————————————
+
+    def stage_distribution(self) -> Dict[str, int]:
+        """Entry count per stage (including "Unknown" when present)."""
+        with self._lock:
+            return {_stage_label(stage): agg.count for stage, agg in sorted(self.by_stage.items())}
+
+    def mean_traits(self, stage: Optional[int] = None, day: Optional[str] = None) -> Dict[str, float]:
+        """Mean trait percentages overall, for one stage, one day, or one (day, stage) cell."""
+        return self._select(stage, day).mean_traits()
+
+    def harmony_histogram(self, stage: Optional[int] = None, day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Harmony-ratio counts in HARMONY_BIN_WIDTH-point bins."""
+        hist = self._select(stage, day).harmony_hist
+        return [{"low": k * HARMONY_BIN_WIDTH, "high": (k + 1) * HARMONY_BIN_WIDTH, "count": n}
+                for k, n in enumerate(hist)]
+
+    def daily(self, last: int = 30) -> List[Dict[str, Any]]:
+        """Per-day count, mean harmony, mean trait score and mean mood for the most recent ``last`` days."""
+        with self._lock:
+            days = sorted(d for d in self.by_day if d != UNKNOWN_DAY)[-last:]
+            return [{
+                "day": d,
+                "count": self.by_day[d].count,
+                "harmony": self.by_day[d].mean_harmony(),
+                "score": self.by_day[d].mean_score(),
+                "mood": self.by_day[d].mean_mood(),
+            } for d in days]
+
+    def summary(self) -> Dict[str, Any]:
+        """Headline numbers for dashboards."""
+        return {
+            "entries": self.overall.count,
+            "mean_traits": self.overall.mean_traits(),
+            "mean_harmony": self.overall.mean_harmony(),
+            "mean_score": self.overall.mean_score(),
+            "mean_mood": self.overall.mean_mood(),
+            "stages": self.stage_distribution(),
+            "days": len(self.by_day) - (UNKNOWN_DAY in self.by_day),
+        }
+
+    def _select(self, stage: Optional[int], day: Optional[str]) -> Aggregate:
+        if stage is not None and day is not None:
+            return self.cells.get((day, stage)) or Aggregate()
+        if stage is not None:
+            return self.by_stage.get(stage) or Aggregate()
+        if day is not None:
+            return self.by_day.get(day) or Aggregate()
+        return self.overall
+
+
+_rollups: Optional[Rollups] = None
+_rollups_lock = threading.Lock()
+
+
+def get_rollups() -> Rollups:
+    """
+    Return the process-wide Rollups over the default assessment log.
+    """
+    global _rollups
+    if _rollups is None:
+        with _rollups_lock:
+            if _rollups is None:
+                _rollups = Rollups()
+    return _rollups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh and print assessment-log rollups.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from the whole log")
+    args = parser.parse_args()
+    rollups = get_rollups()
+    consumed = rollups.rebuild() if args.rebuild else rollups.refresh()
+    print(f"Consumed {consumed} new entries")
+    print(json.dumps(rollups.summary(), indent=2))
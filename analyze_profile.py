@@ -1,7 +1,112 @@
 # File: analyze_profile.py
 import json
 import os
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
+
+from content import REMEDIES_FILE, get_content, thaw
+
+# Z9 recursion: each pass feeds every trait back from itself and the other
+# traits (weighted as in the subtrait approximations: 0.6 self, 0.5 per pair,
+# normalized to sum to 1), while a negated trait drains its own share.
+RECURSION_GAIN = 0.4            # feedback per pass; < 1 keeps the loop contracting
+RECURSION_TOLERANCE = 1e-4      # largest per-trait change (percentage points) at convergence
+RECURSION_MAX_ITERATIONS = 50
+RECURSION_SELF_WEIGHT = 0.6 / 2.1
+RECURSION_PAIR_WEIGHT = 0.5 / 2.1
+_SELF_GAP = RECURSION_SELF_WEIGHT - RECURSION_PAIR_WEIGHT
+
+
+def _load_remedies(remedy_file: str) -> Dict[str, Any]:
+    """
+    Return remedy metadata, served from the shared content bundle when
+    ``remedy_file`` is the bundle's own remedy file, read directly otherwise.
+    """
+    if os.path.abspath(remedy_file) == os.path.abspath(REMEDIES_FILE):
+        return get_content().remedies
+    if os.path.exists(remedy_file):
+        with open(remedy_file, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def attach_remedies(
+    trait_percentages: Dict[str, int],
+    remedy_file: str = "remedy_traits.json"
+) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+    """
+    Collect remedy metadata and first product links for the profiled traits.
+
+    Args:
+        trait_percentages: DISC trait percentages keyed by trait.
+        remedy_file: Path to JSON file mapping traits to remedies.
+
+    Returns:
+        A (remedies, product_links) tuple as included in analyze_profile's result.
+    """
+    remedies = {}
+    product_links = []
+    for trait, data in _load_remedies(remedy_file).items():
+        if trait in trait_percentages:
+            remedies[trait] = thaw(data)
+            products = data.get("products", [])
+            if products:
+                product_links.append({"title": f"{trait} Remedy", "link": products[0]})
+    return remedies, product_links
+
+
+def stable_recursion(
+    trait_percentages: Dict[str, int],
+    tolerance: float = RECURSION_TOLERANCE,
+    max_iterations: int = RECURSION_MAX_ITERATIONS
+) -> Dict[str, Any]:
+    """
+    Iterate the Z9 recursion on a profile to its fixed point.
+
+    Starting from the trait percentages p, each pass computes
+    ``x = p + RECURSION_GAIN * (W x - n * x)``, where W is the trait coupling
+    and n the negation level (1 - pct/100 for traits under 25%, else 0). The
+    loop stops once no trait moves by more than ``tolerance``. The stable score
+    is the composite trait score (step 4) of the converged profile, on a 0-10
+    scale. batch_scoring.solve_recursion_batch computes the same values.
+
+    Args:
+        trait_percentages: DISC trait percentages keyed D, I, S, C.
+        tolerance: Convergence threshold in percentage points.
+        max_iterations: Iteration cap.
+
+    Returns:
+        {"stable_score", "iterations", "converged"}.
+    """
+    stable_score, iterations, converged = _solve_recursion(
+        tuple(trait_percentages.values()), tolerance, max_iterations)
+    return {"stable_score": stable_score, "iterations": iterations, "converged": converged}
+
+
+@lru_cache(maxsize=65536)
+def _solve_recursion(percentages: Tuple[int, ...], tolerance: float, max_iterations: int) -> Tuple[float, int, bool]:
+    p = [float(v) for v in percentages]
+    n = [(100 - v) / 100 if v < 25 else 0.0 for v in p]
+    x = p
+    iterations, converged = 0, False
+    while iterations < max_iterations:
+        total = x[0] + x[1] + x[2] + x[3]
+        nxt = [p[k] + RECURSION_GAIN * (_SELF_GAP * x[k] + RECURSION_PAIR_WEIGHT * total - n[k] * x[k])
+               for k in range(4)]
+        delta = max(abs(a - b) for a, b in zip(nxt, x))
+        x = nxt
+        iterations += 1
+        if delta <= tolerance:
+            converged = True
+            break
+
+    total = x[0] + x[1] + x[2] + x[3]
+    if total <= 0:
+        total = 1
+    deviation = sum(abs(v / total * 100 - 25) for v in x) / 4
+    harmony_ratio = 100 - deviation
+    return round((25 + harmony_ratio) / 2 / 10, 2), iterations, converged
+
 
 def analyze_profile(
     d: float,
@@ -19,7 +124,7 @@ def analyze_profile(
     2. Compute trait subtrait approximations.
     3. Identify negated traits (scores < 25%).
     4. Calculate harmony ratio and composite trait score.
-    5. Apply recursive logic placeholder.
+    5. Iterate the Z9 recursion to its fixed point (stable_recursion).
     6. Load remedy metadata per trait.
 
     Args:
@@ -37,7 +142,7 @@ def analyze_profile(
             negated: Traits with low scores needing development.
             harmony_ratio: Balance metric (0-100).
             trait_score: Composite development score.
-            recursion_result: Placeholder Z9 recursion data.
+            recursion_result: Stable score and iterations used (see stable_recursion).
             remedies: Loaded remedy metadata per trait.
             product_links: First product link for each remedy.
     """
@@ -82,24 +187,11 @@ def analyze_profile(
     harmony_ratio = round(100 - deviation, 2)
     trait_score = round((avg_pct + harmony_ratio) / 2, 2)
 
-    # 5. Recursive logic placeholder
-    recursion_result = {
-        "stable_score": round(trait_score / 10, 2),
-        "iterations": 4
-    }
+    # 5. Z9 recursion to a fixed point
+    recursion_result = stable_recursion(trait_percentages)
 
     # 6. Load remedy metadata and product links
-    remedies = {}
-    product_links = []
-    if os.path.exists(remedy_file):
-        with open(remedy_file, "r") as f:
-            remedy_data = json.load(f)
-        for trait, data in remedy_data.items():
-            if trait in trait_percentages:
-                remedies[trait] = data
-                products = data.get("products", [])
-                if products:
-                    product_links.append({"title": f"{trait} Remedy", "link": products[0]})
+    remedies, product_links = attach_remedies(trait_percentages, remedy_file)
 
     return {
         "traits": trait_percentages,
@@ -0,0 +1,252 @@
+# File: batch_scoring.py
+from typing import Any, Dict
+
+import numpy as np
+
+from analyze_profile import (
+    RECURSION_GAIN, RECURSION_MAX_ITERATIONS, RECURSION_PAIR_WEIGHT, RECURSION_SELF_WEIGHT, RECURSION_TOLERANCE
+)
+
+TRAIT_KEYS = ("D", "I", "S", "C")
+
+# Column order of the subtrait matrix; matches the key order built by analyze_profile.
+SUBTRAIT_KEYS = (
+    "DD", "DI", "DS", "DC",
+    "II", "ID", "IS", "IC",
+    "SS", "SD", "SI", "SC",
+    "CC", "CD", "CI", "CS",
+)
+_SUBTRAIT_PAIRS = [(TRAIT_KEYS.index(k[0]), TRAIT_KEYS.index(k[1])) for k in SUBTRAIT_KEYS]
+
+
+def _as_matrix(scores: Any) -> np.ndarray:
+    """
+    Coerce an N×4 array-like or DataFrame of raw D/I/S/C totals to float64.
+
+    DataFrames are read by their d/i/s/c (or D/I/S/C) columns when present,
+    otherwise by their first four columns.
+    """
+    if hasattr(scores, "columns"):
+        cols = list(scores.columns)
+        for names in (list(TRAIT_KEYS), [t.lower() for t in TRAIT_KEYS]):
+            if all(n in cols for n in names):
+                scores = scores[names]
+                break
+        else:
+            scores = scores.iloc[:, :4]
+        scores = scores.to_numpy()
+    arr = np.asarray(scores, dtype=np.float64)
+    if arr.ndim != 2 or arr.shape[1] != 4:
+        raise ValueError(f"Expected an N×4 array of D, I, S, C scores, got shape {arr.shape}")
+    return arr
+
+
+def _harmony_and_score(percentages: np.ndarray):
+    """
+    Harmony ratio and composite trait score, bit-identical to analyze_profile.
+
+    Both values depend only on the percentage sum and on the sum of absolute
+    deviations, which are exact small integers (scaled by 4). The handful of
+    distinct pairs are scored with the scalar formula and scattered back, so
+    Python's decimal ``round(x, 2)`` is reproduced exactly.
+    """
+    total = percentages.sum(axis=1)
+    dev16 = np.abs(4 * percentages - total[:, None]).sum(axis=1)
+    keys, inverse = np.unique((total << 32) + dev16, return_inverse=True)
+
+    harmony = np.empty(len(keys))
+    score = np.empty(len(keys))
+    for n, key in enumerate(keys.tolist()):
+        avg_pct = (key >> 32) / 4
+        harmony_ratio = round(100 - (key & 0xFFFFFFFF) / 16, 2)
+        harmony[n] = harmony_ratio
+        score[n] = round((avg_pct + harmony_ratio) / 2, 2)
+    return harmony[inverse.ravel()], score[inverse.ravel()]
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Python's ``round(x, 2)`` for a float array.
+
+    ``rint(x * 100) / 100`` gives the same double except where ``x * 100``
+    lies within rounding error of a half; those few are rounded in Python.
+    """
+    scaled = values * 100
+    out = np.rint(scaled) / 100
+    for k in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6).tolist():
+        out[k] = round(float(values[k]), 2)
+    return out
+
+
+_RECURSION_BLOCK = 8192
+
+
+def _solve_block(p: np.ndarray, tolerance: float, max_iterations: int,
+                 iterations: np.ndarray, converged: np.ndarray) -> np.ndarray:
+    """
+    Iterate one block of rows; fills ``iterations``/``converged`` and returns
+    the unrounded scores. Works on 4×n trait-major arrays so every trait is a
+    contiguous vector.
+    """
+    p = np.ascontiguousarray(p.T)
+    n = np.where(p < 25, (100 - p) / 100, 0.0)
+    gap = RECURSION_SELF_WEIGHT - RECURSION_PAIR_WEIGHT
+    x = p.copy()
+    rows = np.arange(p.shape[1])
+    xa, pa, na = x, p, n
+    for iteration in range(1, max_iterations + 1):
+        total = xa[0] + xa[1] + xa[2] + xa[3]
+        nxt = pa + RECURSION_GAIN * (gap * xa + RECURSION_PAIR_WEIGHT * total - na * xa)
+        step = np.abs(nxt - xa)
+        delta = np.maximum(np.maximum(step[0], step[1]), np.maximum(step[2], step[3]))
+        done = delta <= tolerance
+        if done.any():
+            x[:, rows] = nxt
+            iterations[rows[done]] = iteration
+            converged[rows[done]] = True
+            moving = ~done
+            rows, xa, pa, na = rows[moving], nxt[:, moving], pa[:, moving], na[:, moving]
+            if not len(rows):
+                break
+        else:
+            xa = nxt
+    else:
+        x[:, rows] = xa
+        iterations[rows] = max_iterations
+
+    total = x[0] + x[1] + x[2] + x[3]
+    total = np.where(total <= 0, 1.0, total)
+    dev = np.abs(x / total * 100 - 25)
+    harmony_ratio = 100 - (dev[0] + dev[1] + dev[2] + dev[3]) / 4
+    return (25 + harmony_ratio) / 2 / 10
+
+
+def solve_recursion_batch(
+    percentages: Any,
+    tolerance: float = RECURSION_TOLERANCE,
+    max_iterations: int = RECURSION_MAX_ITERATIONS
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized analyze_profile.stable_recursion.
+
+    Rows iterate together in cache-sized blocks; a row drops out of the
+    working set as soon as it converges, so each pass only touches rows
+    still moving. Per row, the
+    arithmetic is the scalar solver's in the same order, so results are
+    bit-identical.
+
+    Args:
+        percentages: N×4 array-like of D, I, S, C trait percentages.
+        tolerance: Convergence threshold in percentage points.
+        max_iterations: Iteration cap.
+
+    Returns:
+        A dict of arrays:
+            stable_score: (N,) float64 stable recursion score.
+            iterations: (N,) int64 passes used.
+            converged: (N,) bool, False where the cap was reached first.
+    """
+    p = np.asarray(percentages, dtype=np.float64).reshape(-1, 4)
+    stable = np.empty(len(p))
+    iterations = np.zeros(len(p), dtype=np.int64)
+    converged = np.zeros(len(p), dtype=bool)
+    for lo in range(0, len(p), _RECURSION_BLOCK):
+        hi = lo + _RECURSION_BLOCK
+        stable[lo:hi] = _solve_block(p[lo:hi], tolerance, max_iterations, iterations[lo:hi], converged[lo:hi])
+    return {
+        "stable_score": _round2(stable),
+        "iterations": iterations,
+        "converged": converged,
+    }
+
+
+def _distinct_rows(traits: np.ndarray):
+    """(distinct rows, inverse index) of an N×4 int array; percentages pack into one int64 key."""
+    if len(traits) and traits.min() >= 0 and traits.max() < 1 << 15:
+        key = (traits[:, 0] << 45) | (traits[:, 1] << 30) | (traits[:, 2] << 15) | traits[:, 3]
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        return traits[first], inverse.ravel()
+    distinct, inverse = np.unique(traits, axis=0, return_inverse=True)
+    return distinct, inverse.ravel()
+
+
+def map_disc_to_stage_batch(scores: Any) -> np.ndarray:
+    """
+    Vectorized map_disc_to_stage.
+
+    Args:
+        scores: N×4 array-like or DataFrame of D, I, S, C metrics.
+
+    Returns:
+        int64 array of stage numbers (1–8), one per row.
+    """
+    m = _as_matrix(scores)
+    avg = (m[:, 0] + m[:, 1] + m[:, 2] + m[:, 3]) / 4.0
+    norm = np.where(avg > 1, avg / 100.0, (avg - 1.0) / 4.0)
+    norm = np.clip(norm, 0.0, 1.0)
+    return np.clip(np.floor(norm * 8).astype(np.int64) + 1, 1, 8)
+
+
+def analyze_profile_batch(scores: Any) -> Dict[str, np.ndarray]:
+    """
+    Score many raw DISC profiles at once with the analyze_profile rules.
+
+    Every value equals what analyze_profile and map_disc_to_stage return for
+    the same row, including their ``round()`` behaviour. Remedies and product
+    links are static per trait and therefore not repeated per row.
+
+    Args:
+        scores: N×4 array-like or DataFrame of raw D, I, S, C totals.
+
+    Returns:
+        A dict of columnar arrays:
+            traits: (N, 4) int64 percentages in D, I, S, C order.
+            subtraits: (N, 16) int64 subtrait scores, columns as SUBTRAIT_KEYS.
+            negated_mask: (N, 4) bool, True where a trait is under 25%.
+            negated: (N, 4) int64 negation levels (100 - pct), 0 where not negated.
+            harmony_ratio: (N,) float64 balance metric.
+            trait_score: (N,) float64 composite development score.
+            stage_index: (N,) int64 auto-mapped stage number (1–8).
+            stable_score: (N,) float64 stable recursion score.
+            recursion_iterations: (N,) int64 recursion passes used.
+            recursion_converged: (N,) bool recursion convergence flag.
+    """
+    m = _as_matrix(scores)
+    d, i, s, c = m[:, 0], m[:, 1], m[:, 2], m[:, 3]
+
+    # 1. Normalize to percentages (same operation order as the scalar path)
+    total = d + i + s + c
+    total = np.where(total <= 0, 1.0, total)
+    traits = np.rint((m / total[:, None]) * 100).astype(np.int64)
+
+    # 2. Subtrait approximations
+    subtraits = np.empty((len(m), len(SUBTRAIT_KEYS)), dtype=np.int64)
+    for col, (a, b) in enumerate(_SUBTRAIT_PAIRS):
+        if a == b:
+            subtraits[:, col] = np.rint(m[:, a] * 0.6)
+        else:
+            subtraits[:, col] = np.rint((m[:, a] + m[:, b]) / 2)
+
+    # 3. Negated traits (under 25%)
+    negated_mask = traits < 25
+    negated = np.where(negated_mask, 100 - traits, 0)
+
+    # 4. Harmony ratio and composite trait score
+    harmony_ratio, trait_score = _harmony_and_score(traits)
+
+    # 5. Z9 recursion, solved once per distinct percentage vector
+    distinct, inverse = _distinct_rows(traits)
+    recursion = solve_recursion_batch(distinct)
+
+    return {
+        "traits": traits,
+        "subtraits": subtraits,
+        "negated_mask": negated_mask,
+        "negated": negated,
+        "harmony_ratio": harmony_ratio,
+        "trait_score": trait_score,
+        "stage_index": map_disc_to_stage_batch(m),
+        "stable_score": recursion["stable_score"][inverse],
+        "recursion_iterations": recursion["iterations"][inverse],
+        "recursion_converged": recursion["converged"][inverse],
+    }
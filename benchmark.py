@@ -0,0 +1,347 @@
+# File: benchmark.py
+"""
+Reproducible benchmarks for the submission hot paths.
+
+    python benchmark.py                          # run everything, write bench_results.json
+    python benchmark.py --only scoring,pdf       # run selected groups
+    python benchmark.py --save-baseline          # store results as bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --threshold 0.25 \
+        --threshold-for render.radar.cold=0.5    # exit 1 on regressions
+
+Groups:
+    scoring  analyze_profile, map_disc_to_stage, summarize_trait, batch scoring,
+             a "profiles like yours" k-NN query over 1M profiles and (when
+             built) the outcome table lookup
+    render   every visuals.py chart, cold (cache cleared) and warm
+    pdf      generate_simple_report, cold and memoized
+    logging  AssessmentLog append and full scan on logs of 1k/100k/1M entries
+    imports  fresh-interpreter import time of the main modules
+
+Inputs come from fixed-seed synthetic quiz submissions, so runs on the same
+machine are comparable. Each benchmark records per-call time (median of the
+repeats, plus the minimum) and the peak traced allocation of one call. Everything
+runs offline; logs are generated in a temporary directory.
+
+bench_baseline.json is the committed reference run (its "meta" block names
+the machine). Timings only compare on similar hardware, so re-record it with
+--save-baseline when the reference machine changes.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+SEED = 20250614
+RESULTS_PATH = "bench_results.json"
+BASELINE_PATH = "bench_baseline.json"
+LOG_SIZES = (1_000, 100_000, 1_000_000)
+IMPORT_MODULES = ("analyze_profile", "batch_scoring", "visuals", "pdf_export", "z9CoachFree")
+GROUPS = ("scoring", "render", "pdf", "logging", "imports")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def synthetic_profiles(n: int, seed: int = SEED) -> List[tuple]:
+    """
+    Raw (d, i, s, c) totals from n simulated 16-question submissions.
+    """
+    from content import QUIZ_SIZE, SCORE_MAP
+
+    rng = random.Random(seed)
+    values = list(SCORE_MAP.values())
+    out = []
+    for _ in range(n):
+        totals = [0, 0, 0, 0]
+        for q in range(QUIZ_SIZE):  # stratified quizzes: questions spread evenly over traits
+            totals[q % 4] += rng.choice(values)
+        out.append(tuple(float(v) for v in totals))
+    return out
+
+
+def synthetic_log_entry(rng: random.Random) -> Dict[str, Any]:
+    d, i, s = rng.randint(5, 40), rng.randint(5, 40), rng.randint(5, 40)
+    return {
+        "timestamp": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00",
+        "traits": {"D": d, "I": i, "S": s, "C": max(0, 100 - d - i - s)},
+        "trait_score": round(rng.uniform(50, 62), 2),
+        "harmony_ratio": round(rng.uniform(80, 100), 2),
+        "stage": f"Stage {rng.randint(1, 8)}",
+    }
+
+
+class Runner:
+    """Times callables and collects results keyed by benchmark name."""
+
+    def __init__(self, repeats: int = 5, quiet: bool = False):
+        self.repeats = repeats
+        self.quiet = quiet
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def bench(self, name: str, fn: Callable[[], Any], number: int = 1,
+              setup: Optional[Callable[[], Any]] = None, repeats: Optional[int] = None) -> None:
+        """
+        Run ``fn`` ``number`` times per repeat and record per-call timings.
+
+        Args:
+            name: Benchmark name (dotted, group first).
+            fn: Zero-argument callable to time.
+            number: Calls per repeat.
+            setup: Called before each repeat, untimed (e.g. to clear caches).
+            repeats: Override the runner's repeat count.
+        """
+        samples = []
+        for _ in range(repeats or self.repeats):
+            if setup:
+                setup()
+            gc.collect()
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - t0) / number)
+
+        # Tracing slows allocation-heavy code, so peak memory comes from one
+        # separate call rather than the timed repeats.
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.record(name, {
+            "per_call_s": statistics.median(samples),
+            "min_s": min(samples),
+            "repeats": len(samples),
+            "number": number,
+            "peak_bytes": peak,
+        })
+
+    def record(self, name: str, result: Dict[str, Any]) -> None:
+        self.results[name] = result
+        if not self.quiet:
+            extra = f"  peak {result['peak_bytes'] / 1e6:8.2f} MB" if "peak_bytes" in result else ""
+            print(f"{name:<44} {result['per_call_s'] * 1e6:14.2f} µs{extra}", flush=True)
+
+
+# ——— Groups ————————————————————————————————————————————————————————
+
+def bench_scoring(r: Runner) -> None:
+    import numpy as np
+
+    from analyze_profile import _solve_recursion, analyze_profile
+    from batch_scoring import TRAIT_KEYS, analyze_profile_batch, solve_recursion_batch
+    from neighbours import NeighbourIndex
+    from outcome_table import get_outcome_table
+    from trait_summary import summarize_trait
+    from z9_spiral_logic import map_disc_to_stage
+
+    profiles = synthetic_profiles(1000)
+    it = iter(profiles * 10_000)
+    # The recursion solver is memoized per profile; clearing it each repeat
+    # makes every call score from scratch instead of timing cache hits.
+    r.bench("scoring.analyze_profile", lambda: analyze_profile(*next(it)), number=1000,
+            setup=_solve_recursion.cache_clear)
+    r.bench("scoring.map_disc_to_stage", lambda: map_disc_to_stage(*next(it)), number=1000)
+    traits = analyze_profile(*profiles[0])["traits"]
+    r.bench("scoring.summarize_trait", lambda: summarize_trait(traits, "Stage 2", 5), number=1000)
+
+    matrix = np.asarray(synthetic_profiles(20_000) * 50)  # 1M rows
+    r.bench("scoring.batch_1m", lambda: analyze_profile_batch(matrix), repeats=3)
+    percentages = analyze_profile_batch(matrix)["traits"]
+    r.bench("scoring.recursion_batch_1m", lambda: solve_recursion_batch(percentages), repeats=3)
+    index = NeighbourIndex.from_rows(percentages, analyze_profile_batch(matrix)["stage_index"])
+    queries = iter([dict(zip(TRAIT_KEYS, row)) for row in percentages[:1000].tolist()] * 1000)
+    r.bench("scoring.neighbours_query_1m", lambda: index.query(next(queries)), number=1000)
+
+    table = get_outcome_table()
+    if table is not None:
+        r.bench("scoring.outcome_table_lookup", lambda: table.lookup(*next(it)), number=1000)
+
+
+def bench_render(r: Runner) -> None:
+    import visuals
+    from analyze_profile import analyze_profile
+    from content import get_content
+
+    content = get_content()
+    profile = analyze_profile(*synthetic_profiles(1)[0])
+    traits = profile["traits"]
+    dominant = max(traits, key=traits.get)
+    charts = {
+        "radar": ((traits,), {}),
+        "spiral": ((traits,), {"recursion_score": 3.0, "negated_traits": profile["negated"]}),
+        "development_path": ((1, 4, content.ee_narratives, content.path_map, dominant), {}),
+        "harmonic_convergence": ((traits,), {}),
+        "negiton_damping": ((traits,), {}),
+        "triplet_state": ((traits,), {}),
+    }
+    for name, (args, kwargs) in charts.items():
+        call = lambda: visuals.render_chart(name, *args, **kwargs)  # noqa: E731
+        r.bench(f"render.{name}.cold", call, setup=visuals.chart_cache.clear, repeats=3)
+        r.bench(f"render.{name}.warm", call, number=1000)
+
+
+def bench_pdf(r: Runner) -> None:
+    import pdf_export
+    import visuals
+    from analyze_profile import analyze_profile
+    from trait_summary import summarize_trait
+
+    profile = analyze_profile(*synthetic_profiles(1)[0])
+    data = {
+        "trait_score": profile["trait_score"],
+        "harmony_ratio": profile["harmony_ratio"],
+        "stage": "Stage 2",
+        "trait_summary": summarize_trait(profile["traits"], "Stage 2", 5),
+        "charts": {"DISC Radar Chart": visuals.render_chart("radar", profile["traits"])},
+        "remedies": profile["remedies"],
+    }
+    r.bench("pdf.generate_simple_report.cold", lambda: pdf_export.generate_simple_report(data),
+            setup=pdf_export._report_cache.clear, repeats=3)
+    r.bench("pdf.generate_simple_report.warm", lambda: pdf_export.generate_simple_report(data), number=100)
+
+
+def bench_logging(r: Runner, sizes=LOG_SIZES) -> None:
+    from utils import AssessmentLog
+
+    rng = random.Random(SEED)
+    entry = synthetic_log_entry(rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"log_{size}.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                for _ in range(size):
+                    f.write(json.dumps(synthetic_log_entry(rng), separators=(",", ":")) + "\n")
+            log = AssessmentLog(path=path, legacy_path=None, max_bytes=1 << 40)
+            r.bench(f"logging.append.{size}", lambda: log.append(entry), number=500)
+            log.flush()
+            r.bench(f"logging.scan.{size}", lambda: sum(1 for _ in log.iter_entries()), repeats=1)
+            log.close()
+
+
+def bench_imports(r: Runner) -> None:
+    for module in IMPORT_MODULES:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        samples = []
+        for _ in range(3):
+            out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True)
+            if out.returncode != 0:
+                break
+            samples.append(float(out.stdout.strip().splitlines()[-1]))
+        if samples:
+            r.record(f"imports.{module}", {"per_call_s": statistics.median(samples), "min_s": min(samples),
+                                           "repeats": len(samples), "number": 1})
+
+
+# ——— Baseline comparison ——————————————————————————————————————————
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float, overrides: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Find benchmarks slower than the baseline by more than their threshold.
+
+    Args:
+        results: Current results keyed by benchmark name.
+        baseline: Baseline results keyed by benchmark name.
+        threshold: Allowed relative slowdown (0.2 = 20%).
+        overrides: Per-benchmark thresholds; a key may also be a group prefix.
+
+    Returns:
+        One dict per regression with name, baseline, current, ratio and threshold.
+    """
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("per_call_s"):
+            continue
+        limit = threshold
+        for key, value in overrides.items():
+            if name == key or name.startswith(key + "."):
+                limit = value
+        ratio = cur["per_call_s"] / base["per_call_s"]
+        if ratio > 1 + limit:
+            regressions.append({"name": name, "baseline_s": base["per_call_s"], "current_s": cur["per_call_s"],
+                                "ratio": round(ratio, 3), "threshold": limit})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Z9 submission hot paths.")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"comma-separated groups ({', '.join(GROUPS)})")
+    parser.add_argument("--log-sizes", default=",".join(map(str, LOG_SIZES)))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, help="also write results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--threshold-for", action="append", default=[], metavar="NAME=RATIO",
+                        help="per-benchmark or per-group threshold, repeatable")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    os.chdir(HERE)
+    sys.path.insert(0, HERE)
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown group(s): {', '.join(sorted(unknown))}")
+
+    runner = Runner(repeats=args.repeats, quiet=args.quiet)
+    started = time.time()
+    for group in groups:
+        if group == "logging":
+            bench_logging(runner, tuple(int(s) for s in args.log_sizes.split(",") if s))
+        else:
+            globals()[f"bench_{group}"](runner)
+
+    import numpy
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "duration_s": round(time.time() - started, 2),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": SEED,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "results": runner.results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        overrides = {}
+        for item in args.threshold_for:
+            name, _, value = item.partition("=")
+            overrides[name] = float(value)
+        regressions = compare(runner.results, baseline, args.threshold, overrides)
+        for reg in regressions:
+            print(f"REGRESSION {reg['name']}: {reg['baseline_s'] * 1e6:.2f} µs -> {reg['current_s'] * 1e6:.2f} µs "
+                  f"(x{reg['ratio']}, threshold +{reg['threshold']:.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
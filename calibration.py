@@ -0,0 +1,332 @@
+# File: calibration.py
+"""
+Opt-in stage mapping calibrated against the live population.
+
+map_disc_to_stage buckets the average of the four scores linearly, assuming
+percentages or 1-5 averages. The app passes raw quiz totals (16 questions
+scored 1-5, so the average is 4-20), which the linear map reads as 4-20% and
+puts almost everyone in Stage 1 or 2. With ``Z9_CALIBRATED_STAGES=1`` the
+stage comes from where the same average falls in the distribution of
+averages seen so far. The seven octiles of that distribution are the
+Stage 1|2 ... 7|8 thresholds, so each stage holds about an eighth of users
+and a higher average still means a later stage.
+
+The distribution is a QuantileSketch: constant memory, O(1) per update, and
+mergeable, so every worker process keeps its own pending sketch. Every
+``Z9_CALIBRATION_INTERVAL`` seconds (and at exit) a worker merges its sketch
+into the shared snapshot file under an exclusive flock, and it adopts the
+merged population, and its thresholds, as its own. Until the population has
+``Z9_CALIBRATION_MIN`` assessments the linear mapping is used. A snapshot
+taken with a different quiz size or score scale, or one that cannot be
+read as a snapshot, is ignored.
+
+Only logged submissions join the population (observe_submission, next to
+the assessment log append); calibrated_stage is a pure lookup, so API
+retries and benchmark traffic do not move the thresholds.
+
+    python calibration.py info        # population size and thresholds
+    python calibration.py reset
+"""
+import argparse
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from content import QUIZ_SIZE, SCORE_MAP
+from utils import locked
+
+logger = logging.getLogger(__name__)
+
+ENABLED_ENV = "Z9_CALIBRATED_STAGES"
+PATH_ENV = "Z9_CALIBRATION_PATH"
+INTERVAL_ENV = "Z9_CALIBRATION_INTERVAL"
+MIN_SAMPLES_ENV = "Z9_CALIBRATION_MIN"
+CALIBRATION_PATH = "stage_calibration.json"
+VERSION = 1
+STAGES = 8
+SYNC_INTERVAL = 60.0
+MIN_SAMPLES = 500
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch with relative accuracy (DDSketch).
+
+    Non-negative values are counted in logarithmic bins, so every quantile is
+    within ``alpha`` times its true value. Once there are ``max_bins`` bins
+    the lowest ones are folded together, which keeps memory constant and
+    only costs accuracy at the very bottom of the range. Sketches with the
+    same ``alpha`` merge by adding bin counts.
+
+    Args:
+        alpha: Relative accuracy.
+        max_bins: Bin limit.
+    """
+
+    def __init__(self, alpha: float = 0.01, max_bins: int = 1024):
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.bins: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value > 0:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + weight
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        else:
+            self.zero += weight
+        self.count += weight
+
+    def representative(self, value: float) -> float:
+        """The value every quantile in ``value``'s bin is reported as."""
+        if value <= 0:
+            return 0.0
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** math.ceil(math.log(value) / self._log_gamma) / (gamma + 1)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError(f"cannot merge sketches with alpha {self.alpha} and {other.alpha}")
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.zero += other.zero
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        folded = keys[:len(keys) - self.max_bins + 1]
+        self.bins[folded[-1]] = sum(self.bins.pop(k) for k in folded[:-1]) + self.bins[folded[-1]]
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        """
+        Values at each quantile in ``qs`` (ascending, 0-1), or an empty list
+        when the sketch is empty.
+        """
+        if not self.count:
+            return []
+        gamma = math.exp(self._log_gamma)
+        out = []
+        seen = self.zero
+        items = iter(sorted(self.bins.items()))
+        key = None
+        for q in qs:
+            rank = q * (self.count - 1)
+            while seen <= rank:
+                key, n = next(items)
+                seen += n
+            out.append(0.0 if key is None else 2 * gamma ** key / (gamma + 1))
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"alpha": self.alpha, "max_bins": self.max_bins, "count": self.count, "zero": self.zero,
+                "bins": {str(k): n for k, n in sorted(self.bins.items())}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["alpha"], data["max_bins"])
+        sketch.bins = {int(k): int(n) for k, n in data["bins"].items()}
+        sketch.zero = int(data["zero"])
+        sketch.count = int(data["count"])
+        return sketch
+
+
+def _scale() -> Dict[str, Any]:
+    """What the raw averages depend on; a snapshot taken under another scale is discarded."""
+    return {"quiz_size": QUIZ_SIZE, "scores": sorted(SCORE_MAP.values())}
+
+
+def _average(d: float, i: float, s: float, c: float) -> float:
+    """The statistic map_disc_to_stage buckets."""
+    return (d + i + s + c) / 4.0
+
+
+class StageCalibrator:
+    """
+    Population-calibrated stage mapping shared through a snapshot file.
+
+    Args:
+        path: Snapshot file.
+        interval: Seconds between merges into the snapshot.
+        min_samples: Population size below which ``stage`` returns None.
+    """
+
+    def __init__(self, path: str = CALIBRATION_PATH, interval: float = SYNC_INTERVAL,
+                 min_samples: int = MIN_SAMPLES):
+        self.path = path
+        self.interval = interval
+        self.min_samples = min_samples
+        self._population = QuantileSketch()
+        self._pending = QuantileSketch()
+        self._thresholds: List[float] = []
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, d: float, i: float, s: float, c: float) -> None:
+        """Count one assessment's raw totals; merges into the snapshot when due."""
+        with self._lock:
+            self._pending.add(_average(d, i, s, c))
+        self._sync_if_due()
+
+    def stage(self, d: float, i: float, s: float, c: float) -> Optional[str]:
+        """
+        Calibrated "Stage N" for raw totals, or None while the population is
+        smaller than ``min_samples``.
+        """
+        self._sync_if_due()
+        thresholds = self._thresholds
+        if not thresholds:
+            return None
+        # Compared bin to bin, so a value in a threshold's own bin stays below it.
+        value = self._population.representative(_average(d, i, s, c))
+        return f"Stage {bisect.bisect_left(thresholds, value) + 1}"
+
+    def thresholds(self) -> List[float]:
+        """Current Stage 1|2 ... 7|8 boundaries (empty while uncalibrated)."""
+        self._sync_if_due()
+        return list(self._thresholds)
+
+    def population(self) -> int:
+        """Assessments in the population as of the last sync."""
+        self._sync_if_due()
+        return self._population.count
+
+    def _sync_if_due(self) -> None:
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+
+    def sync(self) -> int:
+        """
+        Merge pending observations into the snapshot and adopt the merged
+        population and its thresholds.
+
+        Returns:
+            The population size.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, QuantileSketch()
+            self._next_sync = time.monotonic() + self.interval
+        try:
+            if pending.count:
+                with open(self.path + ".lock", "a") as lock_file, locked(lock_file.fileno()):
+                    population = self._read()
+                    population.merge(pending)
+                    self._write(population)
+            else:
+                population = self._read()
+        except (OSError, ValueError):
+            logger.exception("Could not update %s; keeping observations for the next sync", self.path)
+            with self._lock:
+                self._pending.merge(pending)
+            return self._population.count
+        thresholds = []
+        if population.count >= self.min_samples:
+            thresholds = population.quantiles([n / STAGES for n in range(1, STAGES)])
+        with self._lock:
+            self._population, self._thresholds = population, thresholds
+        return population.count
+
+    def _read(self) -> QuantileSketch:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return QuantileSketch()
+        except json.JSONDecodeError:
+            logger.warning("%s is not valid JSON; starting a new population", self.path)
+            return QuantileSketch()
+        try:
+            if data.get("version") != VERSION or data.get("scale") != _scale():
+                logger.warning("%s was taken under another quiz scale; starting a new population", self.path)
+                return QuantileSketch()
+            return QuantileSketch.from_dict(data["sketch"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            logger.warning("%s is not a calibration snapshot; starting a new population", self.path)
+            return QuantileSketch()
+
+    def _write(self, population: QuantileSketch) -> None:
+        data = {"version": VERSION, "scale": _scale(), "updated": time.time(), "sketch": population.to_dict()}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+_calibrator: Optional[StageCalibrator] = None
+_calibrator_lock = threading.Lock()
+
+
+def get_stage_calibrator() -> Optional[StageCalibrator]:
+    """
+    Return the process-wide StageCalibrator, or None unless ``Z9_CALIBRATED_STAGES`` is set.
+    """
+    global _calibrator
+    if _calibrator is None:
+        if os.environ.get(ENABLED_ENV, "").lower() not in ("1", "true", "yes"):
+            return None
+        with _calibrator_lock:
+            if _calibrator is None:
+                _calibrator = StageCalibrator(
+                    os.environ.get(PATH_ENV) or CALIBRATION_PATH,
+                    interval=float(os.environ.get(INTERVAL_ENV, SYNC_INTERVAL) or SYNC_INTERVAL),
+                    min_samples=int(os.environ.get(MIN_SAMPLES_ENV, MIN_SAMPLES) or MIN_SAMPLES),
+                )
+                atexit.register(_calibrator.sync)
+    return _calibrator
+
+
+def calibrated_stage(d: float, i: float, s: float, c: float, default: str) -> str:
+    """
+    Calibrated stage for raw totals, or ``default`` (the linear mapping)
+    when calibration is off or not yet ready. Does not record the totals.
+    """
+    calibrator = get_stage_calibrator()
+    if calibrator is None:
+        return default
+    return calibrator.stage(d, i, s, c) or default
+
+
+def observe_submission(d: float, i: float, s: float, c: float) -> None:
+    """Add a logged submission's raw totals to the population (no-op when calibration is off)."""
+    calibrator = get_stage_calibrator()
+    if calibrator is not None:
+        calibrator.observe(d, i, s, c)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Population-calibrated stage thresholds.")
+    parser.add_argument("--path", default=os.environ.get(PATH_ENV) or CALIBRATION_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="print population size and stage thresholds")
+    sub.add_parser("reset", help="discard the population")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    if args.command == "reset":
+        if os.path.exists(args.path):
+            os.remove(args.path)
+        print(json.dumps({"path": args.path, "reset": True}))
+        return 0
+    calibrator = StageCalibrator(args.path, min_samples=0)
+    population = calibrator.sync()
+    print(json.dumps({"path": args.path, "population": population,
+                      "thresholds": [round(t, 2) for t in calibrator.thresholds()]}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
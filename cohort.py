@@ -0,0 +1,527 @@
+# File: cohort.py
+"""
+Bulk cohort reports: a file of completed questionnaires in, per-person PDF
+reports and a cohort summary out.
+
+    python cohort.py responses.csv --out cohort_acme/
+    python cohort.py responses.jsonl --out cohort_acme/ --workers 8 --charts
+    python cohort.py responses.csv --out cohort_acme/               # rerun: resumes from the checkpoint
+
+Input (CSV with a header row, or JSON lines), one person per row:
+    id               person identifier (used in file names after the row number)
+    perceived_stage  optional, "Stage 3" or "3"
+    mood             optional, 0-10 (default 5)
+    q1 ... qN        answers to questions 1..N of master_disc_questions.json, as
+                     an option label ("Agree") or its 1-5 value; blank = skipped
+    d, i, s, c       alternatively, raw D/I/S/C totals
+JSON lines may also nest the answers: {"id": ..., "answers": {"q1": "Agree", ...}}.
+
+Output directory:
+    reports/<row>-<id>.pdf        the same report the app builds
+    charts/<row>-<id>/<name>.png  with --charts
+    results.csv             one line per row: scores, stage, report path or error
+    summary.json            cohort totals, stage distribution, mean traits, ...
+    checkpoint.json         progress; rerunning the same command resumes from it
+
+Rows are read as a stream and at most ``--workers * 4`` tasks of ``--chunk``
+rows are in flight, so memory stays flat however large the input is. Each checkpoint flushes
+results.csv first and records its length, so a resumed run never
+duplicates or loses a line.
+"""
+import argparse
+import csv
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from analytics import Aggregate, normalize_entry
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_FILE = "checkpoint.json"
+RESULTS_FILE = "results.csv"
+SUMMARY_FILE = "summary.json"
+CHECKPOINT_VERSION = 1
+RESULT_COLUMNS = ("row", "id", "status", "D", "I", "S", "C", "trait_score", "harmony_ratio",
+                  "stage", "perceived_stage", "mood", "report")
+REPORT_CHARTS = (  # (caption, chart name, kwargs), as in the app's PDF
+    ("DISC Radar Chart", "radar", {}),
+    ("Z9 Spiral Projection", "spiral", {"recursion_score": 3.0}),
+    ("Harmonic Convergence Index", "harmonic_convergence", {}),
+)
+MAX_ERROR_SAMPLES = 10
+PROGRESS_INTERVAL = 10.0  # seconds between progress log lines
+
+_QUESTION_KEY = re.compile(r"^q(\d+)$", re.IGNORECASE)
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class CohortError(ValueError):
+    """A row that cannot be scored."""
+
+
+# ——— Input ——————————————————————————————————————————————————————————
+
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows from a CSV (with header) or JSON-lines file.
+
+    A JSON line that does not decode is yielded as {"_error": message}.
+    """
+    if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {"_error": f"invalid JSON ({e})"}
+                    continue
+                yield row if isinstance(row, dict) else {"_error": "line is not a JSON object"}
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def _answer_value(raw: Any, score_map: Dict[str, int]) -> Optional[float]:
+    if raw is None or (isinstance(raw, str) and not raw.strip()):
+        return None
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        value = float(raw)
+    else:
+        text = str(raw).strip()
+        label = next((k for k in score_map if k.lower() == text.lower()), None)
+        if label is not None:
+            return float(score_map[label])
+        try:
+            value = float(text)
+        except ValueError:
+            raise CohortError(f"unrecognized answer {text!r}") from None
+    if not 1 <= value <= 5:
+        raise CohortError(f"answer {raw!r} outside 1-5")
+    return value
+
+
+def parse_row(row: Dict[str, Any], questions: Tuple[Dict[str, Any], ...], score_map: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Turn one input row into raw D/I/S/C totals plus the person's metadata.
+
+    Returns:
+        {"id", "perceived", "mood", "totals": (d, i, s, c)}.
+
+    Raises:
+        CohortError: If the row has no usable answers or malformed values.
+    """
+    if "_error" in row:
+        raise CohortError(row["_error"])
+    fields = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+    answers = row.get("answers")
+    if isinstance(answers, dict):
+        fields.update({str(k).strip().lower(): v for k, v in answers.items()})
+
+    totals = {t: 0.0 for t in "DISC"}
+    answered = 0
+    for key, raw in fields.items():
+        m = _QUESTION_KEY.match(key)
+        if not m:
+            continue
+        n = int(m.group(1))
+        if not 1 <= n <= len(questions):
+            raise CohortError(f"{key}: the question bank has {len(questions)} questions")
+        value = _answer_value(raw, score_map)
+        if value is not None:
+            totals[questions[n - 1]["trait"]] += value
+            answered += 1
+    if not answered:
+        if not all(k in fields and str(fields[k]).strip() for k in "disc"):
+            raise CohortError("no answers (q1..qN) and no d/i/s/c totals")
+        try:
+            totals = {t: float(fields[t.lower()]) for t in "DISC"}
+        except (TypeError, ValueError, OverflowError):
+            raise CohortError("d/i/s/c totals must be numbers") from None
+        if not all(math.isfinite(v) for v in totals.values()):
+            raise CohortError("d/i/s/c totals must be finite")
+        if any(v < 0 for v in totals.values()):
+            raise CohortError("d/i/s/c totals must not be negative")
+
+    perceived = str(fields.get("perceived_stage") or "").strip()
+    if perceived:
+        number = re.search(r"\d+", perceived)
+        if not number or not 1 <= int(number.group()) <= 8:
+            raise CohortError(f"perceived_stage {perceived!r} is not Stage 1-8")
+        perceived = f"Stage {int(number.group())}"
+    mood_raw = fields.get("mood")
+    try:
+        mood = 5 if mood_raw in (None, "") else int(float(mood_raw))
+    except (TypeError, ValueError, OverflowError):  # int() of nan / inf
+        raise CohortError(f"mood {mood_raw!r} is not a finite number") from None
+    if not 0 <= mood <= 10:
+        raise CohortError(f"mood {mood} outside 0-10")
+
+    return {"id": str(fields.get("id") or "").strip(), "perceived": perceived, "mood": mood,
+            "totals": tuple(totals[t] for t in "DISC")}
+
+
+def _row_id(row: Dict[str, Any]) -> str:
+    return str(row.get("id") or "").strip()
+
+
+def safe_name(person_id: str, row: int) -> str:
+    """
+    File-system-safe name for a person's outputs. The row number leads, so
+    repeated IDs and IDs that sanitize alike never share a file.
+    """
+    name = _UNSAFE.sub("_", person_id).strip("._")[:80]
+    return f"{row}-{name}" if name else str(row)
+
+
+# ——— Worker side ———————————————————————————————————————————————————
+
+def _init_worker() -> None:
+    from content import get_content
+
+    os.chdir(HERE)
+    get_content()
+
+
+def process_row(row_number: int, row: Dict[str, Any], out_dir: str, pdf: bool, charts: bool) -> Dict[str, Any]:
+    """
+    Score one row and write its report (and chart images).
+
+    Returns:
+        A results.csv record; ``status`` is "ok" or "error: <reason>".
+    """
+    from analyze_profile import analyze_profile
+    from content import SCORE_MAP, get_content
+    from metrics import ProfileMetrics
+    from z9_spiral_logic import map_disc_to_stage
+
+    result: Dict[str, Any] = {"row": row_number, "id": _row_id(row)}
+    try:
+        person = parse_row(row, get_content().questions, SCORE_MAP)
+    except CohortError as e:
+        result["status"] = f"error: {e}"
+        return result
+
+    d, i, s, c = person["totals"]
+    profile = analyze_profile(d, i, s, c, stage_label=person["perceived"])
+    stage = map_disc_to_stage(d, i, s, c)
+    result.update(profile["traits"])
+    result.update({
+        "status": "ok",
+        "trait_score": profile["trait_score"],
+        "harmony_ratio": profile["harmony_ratio"],
+        "stage": stage,
+        "perceived_stage": person["perceived"],
+        "mood": person["mood"],
+        "report": "",
+    })
+    if not (pdf or charts):
+        return result
+
+    import visuals
+
+    name = safe_name(person["id"], row_number)
+    images = {}
+    for caption, chart, kwargs in REPORT_CHARTS:
+        if chart == "spiral":
+            kwargs = {**kwargs, "negated_traits": profile["negated"]}
+        images[caption] = visuals.figure_to_bytes(visuals.CHART_FUNCTIONS[chart](profile["traits"], **kwargs))
+    if charts:
+        chart_dir = os.path.join(out_dir, "charts", name)
+        os.makedirs(chart_dir, exist_ok=True)
+        for (_, chart, _), png in zip(REPORT_CHARTS, images.values()):
+            with open(os.path.join(chart_dir, f"{chart}.png"), "wb") as f:
+                f.write(png)
+    if pdf:
+        import pdf_export
+
+        path = os.path.join("reports", f"{name}.pdf")
+        report_data = ProfileMetrics(profile, stage, person["mood"]).report_data
+        pdf_bytes = pdf_export.render_report({**report_data, "charts": images})
+        with open(os.path.join(out_dir, path), "wb") as f:
+            f.write(pdf_bytes)
+        result["report"] = path
+    return result
+
+
+def process_rows(rows: List[Tuple[int, Dict[str, Any]]], out_dir: str, pdf: bool, charts: bool) -> List[Dict[str, Any]]:
+    """process_row over a chunk of (row number, row) pairs; a crash is reported on its row only."""
+    results = []
+    for n, row in rows:
+        try:
+            results.append(process_row(n, row, out_dir, pdf, charts))
+        except Exception as e:
+            logger.exception("Row %d failed", n)
+            results.append({"row": n, "id": _row_id(row), "status": f"error: {type(e).__name__}: {e}"})
+    return results
+
+
+# ——— Driver ———————————————————————————————————————————————————————
+
+class CohortRun:
+    """
+    One resumable pass over an input file.
+
+    Args:
+        input_path: CSV or JSON-lines file of responses.
+        out_dir: Output directory (created if needed).
+        workers: Worker processes.
+        pdf: Write per-person PDF reports.
+        charts: Write per-person chart images.
+        checkpoint_every: Rows between checkpoints.
+        restart: Ignore an existing checkpoint and start over.
+        chunk: Rows per worker task (default 1 when rendering, 256 when only scoring).
+    """
+
+    def __init__(
+        self,
+        input_path: str,
+        out_dir: str,
+        workers: int = os.cpu_count() or 1,
+        pdf: bool = True,
+        charts: bool = False,
+        checkpoint_every: int = 200,
+        restart: bool = False,
+        chunk: Optional[int] = None
+    ):
+        self.input_path = os.path.abspath(input_path)
+        self.out_dir = os.path.abspath(out_dir)
+        self.workers = max(1, workers)
+        self.pdf = pdf
+        self.charts = charts
+        self.checkpoint_every = checkpoint_every
+        self.chunk = chunk or (1 if pdf or charts else 256)
+        self.window = self.workers * 4  # tasks in flight
+        self.max_ahead = self.window * self.chunk * 16  # bounds the rows done beyond the low-water mark
+
+        self.next_row = 0             # every row below this is done
+        self.done_above: set = set()  # rows >= next_row already done
+        self.results_bytes = 0
+        self.overall = Aggregate()
+        self.stages: Dict[str, Aggregate] = {}
+        self.alignment_gaps: Dict[str, int] = {}
+        self.errors = 0
+        self.error_samples: List[str] = []
+        self.elapsed = 0.0
+        self._lines: List[Dict[str, Any]] = []
+        self._since_checkpoint = 0
+
+        os.makedirs(os.path.join(self.out_dir, "reports"), exist_ok=True)
+        if not restart:
+            self._load_checkpoint()
+
+    @property
+    def _checkpoint_path(self) -> str:
+        return os.path.join(self.out_dir, CHECKPOINT_FILE)
+
+    @property
+    def _results_path(self) -> str:
+        return os.path.join(self.out_dir, RESULTS_FILE)
+
+    def _input_signature(self) -> Dict[str, Any]:
+        return {"path": self.input_path, "size": os.path.getsize(self.input_path)}
+
+    def _load_checkpoint(self) -> None:
+        try:
+            with open(self._checkpoint_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        if state.get("version") != CHECKPOINT_VERSION or state.get("input") != self._input_signature():
+            raise CohortError(f"{self._checkpoint_path} belongs to a different input; use --restart to start over")
+        self.next_row = state["next_row"]
+        self.done_above = set(state["done_above"])
+        self.results_bytes = state["results_bytes"]
+        self.overall = Aggregate.from_dict(state["overall"])
+        self.stages = {k: Aggregate.from_dict(v) for k, v in state["stages"].items()}
+        self.alignment_gaps = state["alignment_gaps"]
+        self.errors = state["errors"]
+        self.error_samples = state["error_samples"]
+        self.elapsed = state["elapsed_s"]
+        logger.info("Resuming at row %d (%d rows done)", self.next_row, self.overall.count + self.errors)
+
+    def _checkpoint(self, elapsed: float) -> None:
+        mode = "a" if self.results_bytes else "w"
+        with open(self._results_path, mode, encoding="utf-8", newline="") as f:
+            f.truncate(self.results_bytes)  # drop lines written after the last checkpoint
+            writer = csv.DictWriter(f, RESULT_COLUMNS)
+            if not self.results_bytes:
+                writer.writeheader()
+            writer.writerows(self._lines)
+            f.flush()
+            os.fsync(f.fileno())
+            self.results_bytes = f.tell()
+        self._lines = []
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "input": self._input_signature(),
+            "next_row": self.next_row,
+            "done_above": sorted(self.done_above),
+            "results_bytes": self.results_bytes,
+            "overall": self.overall.to_dict(),
+            "stages": {k: v.to_dict() for k, v in self.stages.items()},
+            "alignment_gaps": self.alignment_gaps,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+            "elapsed_s": elapsed,
+        }
+        tmp = self._checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._checkpoint_path)
+        self._since_checkpoint = 0
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        row = result["row"]
+        self.done_above.add(row)
+        while self.next_row in self.done_above:
+            self.done_above.remove(self.next_row)
+            self.next_row += 1
+        self._lines.append(result)
+        self._since_checkpoint += 1
+        if result["status"] != "ok":
+            self.errors += 1
+            if len(self.error_samples) < MAX_ERROR_SAMPLES:
+                self.error_samples.append(f"row {row}: {result['status'][len('error: '):]}")
+            return
+        record = normalize_entry({"traits": {t: result[t] for t in "DISC"}, "harmony_ratio": result["harmony_ratio"],
+                                  "trait_score": result["trait_score"], "stage": result["stage"],
+                                  "mood": result["mood"]})
+        self.overall.add(record)
+        self.stages.setdefault(result["stage"], Aggregate()).add(record)
+        if result["perceived_stage"]:
+            gap = abs(int(result["stage"].split()[1]) - int(result["perceived_stage"].split()[1]))
+            self.alignment_gaps[str(gap)] = self.alignment_gaps.get(str(gap), 0) + 1
+
+    def _pending_rows(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for n, row in enumerate(read_rows(self.input_path)):
+            if n >= self.next_row and n not in self.done_above:
+                yield n, row
+
+    def run(self) -> Dict[str, Any]:
+        """Process every row not yet done and return the cohort summary."""
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        started = time.perf_counter() - self.elapsed
+        rows = self._pending_rows()
+        pending: Dict[Future, List[Tuple[int, str]]] = {}
+        exhausted = False
+        processed = 0
+        last_log = time.perf_counter()
+        pool = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_init_worker)
+        try:
+            while True:
+                while not exhausted and len(pending) < self.window:
+                    batch = list(islice(rows, self.chunk))
+                    if len(batch) < self.chunk:
+                        exhausted = True
+                    if batch:
+                        future = pool.submit(process_rows, batch, self.out_dir, self.pdf, self.charts)
+                        pending[future] = [(n, _row_id(row)) for n, row in batch]
+                    if exhausted or batch[-1][0] - self.next_row >= self.max_ahead:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_ids = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:  # the worker died; its rows are reported, the run goes on
+                        logger.exception("Rows %d-%d failed", batch_ids[0][0], batch_ids[-1][0])
+                        results = [{"row": n, "id": person_id, "status": f"error: {type(e).__name__}: {e}"}
+                                   for n, person_id in batch_ids]
+                    for result in results:
+                        self._record(result)
+                    processed += len(results)
+                if self._since_checkpoint >= self.checkpoint_every:
+                    self._checkpoint(time.perf_counter() - started)
+                if time.perf_counter() - last_log >= PROGRESS_INTERVAL:
+                    last_log = time.perf_counter()
+                    logger.info("%d rows done (%.1f rows/s)", self.overall.count + self.errors,
+                                processed / max(1e-9, time.perf_counter() - started - self.elapsed))
+        except KeyboardInterrupt:
+            # The interrupt may land mid-_record, so keep the last complete checkpoint.
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.warning("Interrupted; rerun the same command to resume from the last checkpoint")
+            raise
+        pool.shutdown()
+        elapsed = time.perf_counter() - started
+        self._checkpoint(elapsed)
+        summary = self.summary(elapsed)
+        with open(os.path.join(self.out_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        overall = self.overall
+        rows = overall.count + self.errors
+        return {
+            "input": self.input_path,
+            "rows": rows,
+            "scored": overall.count,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+            "elapsed_s": round(elapsed, 2),
+            "rows_per_s": round(rows / elapsed, 2) if elapsed else None,
+            "stage_distribution": {k: v.count for k, v in sorted(self.stages.items(),
+                                                                 key=lambda kv: int(kv[0].split()[1]))},
+            "mean_traits": {t: round(v, 2) for t, v in overall.mean_traits().items()},
+            "mean_trait_score": round(overall.mean_score(), 2) if overall.score_n else None,
+            "mean_harmony_ratio": round(overall.mean_harmony(), 2) if overall.harmony_n else None,
+            "harmony_histogram": overall.harmony_hist,
+            "mean_mood": round(overall.mean_mood(), 2) if overall.mood_n else None,
+            "alignment_gaps": dict(sorted(self.alignment_gaps.items(), key=lambda kv: int(kv[0]))),
+            "mean_traits_by_stage": {k: {t: round(v, 2) for t, v in agg.mean_traits().items()}
+                                     for k, agg in sorted(self.stages.items(), key=lambda kv: int(kv[0].split()[1]))},
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score a cohort file and build per-person reports.")
+    parser.add_argument("input", help="CSV (with header) or JSON-lines file of responses")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--charts", action="store_true", help="also write each person's chart images")
+    parser.add_argument("--no-pdf", action="store_true", help="skip the PDF reports (scores and summary only)")
+    parser.add_argument("--checkpoint-every", type=int, default=200, help="rows between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--chunk", type=int, help="rows per worker task (default 1 with reports, 256 without)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    input_path, out_dir = os.path.abspath(args.input), os.path.abspath(args.out)
+    os.chdir(HERE)  # content and remedy files are resolved relative to the app directory
+    try:
+        run = CohortRun(input_path, out_dir, args.workers, not args.no_pdf, args.charts,
+                        args.checkpoint_every, args.restart, args.chunk)
+    except CohortError as e:
+        parser.error(str(e))
+    try:
+        summary = run.run()
+    except KeyboardInterrupt:
+        return 130
+    print(f"{summary['rows']} rows ({summary['scored']} scored, {summary['errors']} errors) "
+          f"in {summary['elapsed_s']:.1f} s, {summary['rows_per_s']} rows/s")
+    print("stages: " + ", ".join(f"{k}: {v}" for k, v in summary["stage_distribution"].items()))
+    for sample in summary["error_samples"]:
+        print(f"  error: {sample}")
+    print(f"summary written to {os.path.join(out_dir, SUMMARY_FILE)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+# File: content.py
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import AbstractSet, Any, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRAITS = ("D", "I", "S", "C")
+STAGE_COUNT = 8
+
+# Quiz scoring: questions drawn per submission and points per answer option.
+QUIZ_SIZE = 16
+SCORE_MAP = {"Strongly Disagree": 1, "Disagree": 2, "Agree": 4, "Strongly Agree": 5}
+
+QUESTIONS_FILE = "master_disc_questions.json"
+STAGE_SUMMARIES_FILE = "stage_summaries.json"
+EE_NARRATIVES_FILE = "results_ee_stage_summaries.json"
+PATH_MAP_FILE = "stage_path_map.json"
+REMEDIES_FILE = "remedy_traits.json"
+
+CONTENT_FILES = (
+    QUESTIONS_FILE,
+    STAGE_SUMMARIES_FILE,
+    EE_NARRATIVES_FILE,
+    PATH_MAP_FILE,
+    REMEDIES_FILE,
+)
+
+
+class ContentError(ValueError):
+    """Raised when a content file is missing or malformed."""
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts to read-only mappings and lists to tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Inverse of freeze: return plain, JSON-serializable dicts and lists."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+@dataclass(frozen=True)
+class ContentBundle:
+    """
+    Immutable, validated view of every JSON content file.
+
+    Attributes:
+        questions: All quiz questions, in file order.
+        questions_by_trait: Question positions in ``questions`` grouped by trait.
+        stage_summaries: Sidebar tips keyed by perceived-stage label.
+        ee_narratives: Erikson stage narratives keyed by "Stage N".
+        path_map: Obstacles and per-trait actions keyed by "Stage N".
+        stages_by_index: Narrative and path data merged per 0-based stage index.
+        remedies: Remedy metadata keyed by trait.
+        digest: SHA-256 over the raw bytes of every content file.
+    """
+    questions: Tuple[Mapping[str, Any], ...]
+    questions_by_trait: Mapping[str, Tuple[int, ...]]
+    stage_summaries: Mapping[str, str]
+    ee_narratives: Mapping[str, Mapping[str, Any]]
+    path_map: Mapping[str, Mapping[str, Any]]
+    stages_by_index: Mapping[int, Mapping[str, Any]]
+    remedies: Mapping[str, Mapping[str, Any]]
+    digest: str
+
+
+# ——— Validation ——————————————————————————————————————————————————
+
+def _require(cond: bool, filename: str, message: str) -> None:
+    if not cond:
+        raise ContentError(f"{filename}: {message}")
+
+
+def _validate_questions(data: Any) -> None:
+    f = QUESTIONS_FILE
+    _require(isinstance(data, list) and data, f, "expected a non-empty list of questions")
+    for n, q in enumerate(data):
+        _require(isinstance(q, dict), f, f"item {n} is not an object")
+        _require(isinstance(q.get("question"), str) and q["question"], f, f"item {n} has no question text")
+        _require(isinstance(q.get("options"), list) and q["options"], f, f"item {n} has no options")
+        _require(q.get("trait") in TRAITS, f, f"item {n} has unknown trait {q.get('trait')!r}")
+
+
+def _validate_stage_summaries(data: Any) -> None:
+    f = STAGE_SUMMARIES_FILE
+    _require(isinstance(data, dict) and data, f, "expected a non-empty object")
+    for label, tip in data.items():
+        _require(_stage_number(label) is not None, f, f"label {label!r} does not start with 'Stage N'")
+        _require(isinstance(tip, str), f, f"tip for {label!r} is not a string")
+
+
+def _validate_ee_narratives(data: Any) -> None:
+    f = EE_NARRATIVES_FILE
+    _require(isinstance(data, dict), f, "expected an object keyed by stage")
+    for label, entry in data.items():
+        _require(_stage_number(label) is not None, f, f"key {label!r} is not 'Stage N'")
+        _require(isinstance(entry, dict), f, f"{label} is not an object")
+        for field in ("summary", "tip", "sol_spark", "mindset_goal"):
+            _require(isinstance(entry.get(field), str), f, f"{label} is missing {field!r}")
+
+
+def _validate_path_map(data: Any) -> None:
+    f = PATH_MAP_FILE
+    _require(isinstance(data, dict), f, "expected an object keyed by stage")
+    for label, entry in data.items():
+        _require(_stage_number(label) is not None, f, f"key {label!r} is not 'Stage N'")
+        _require(isinstance(entry, dict), f, f"{label} is not an object")
+        _require(isinstance(entry.get("remedies", {}), dict), f, f"{label} remedies is not an object")
+        for trait, remedy in entry.get("remedies", {}).items():
+            _require(trait in TRAITS, f, f"{label} has unknown trait {trait!r}")
+            _require(isinstance(remedy, dict) and "action" in remedy, f, f"{label}/{trait} has no action")
+
+
+def _validate_remedies(data: Any) -> None:
+    f = REMEDIES_FILE
+    _require(isinstance(data, dict), f, "expected an object keyed by trait")
+    for trait, entry in data.items():
+        _require(isinstance(entry, dict), f, f"{trait} is not an object")
+        for field in ("action", "rationale", "mister_anu_advice", "stage_tip"):
+            _require(isinstance(entry.get(field), str), f, f"{trait} is missing {field!r}")
+        _require(isinstance(entry.get("products", []), list), f, f"{trait} products is not a list")
+
+
+def _stage_number(label: str) -> Optional[int]:
+    parts = label.split()
+    if len(parts) >= 2 and parts[0] == "Stage" and parts[1].isdigit():
+        n = int(parts[1])
+        if 1 <= n <= STAGE_COUNT:
+            return n
+    return None
+
+
+# (validator, default when the file is absent; None means the file is required)
+_SPECS = {
+    QUESTIONS_FILE: (_validate_questions, None),
+    STAGE_SUMMARIES_FILE: (_validate_stage_summaries, {f"Stage {i}": "" for i in range(1, STAGE_COUNT + 1)}),
+    EE_NARRATIVES_FILE: (_validate_ee_narratives, {}),
+    PATH_MAP_FILE: (_validate_path_map, {}),
+    REMEDIES_FILE: (_validate_remedies, {}),
+}
+
+
+# ——— Loading ———————————————————————————————————————————————————————
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _stat_signature(paths) -> Tuple:
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def build_bundle(raw: Dict[str, Optional[bytes]]) -> ContentBundle:
+    """
+    Parse and validate raw file contents into a ContentBundle.
+
+    Args:
+        raw: Mapping of content filename to its bytes (None if the file is absent).
+
+    Returns:
+        The validated, immutable ContentBundle.
+
+    Raises:
+        ContentError: If a required file is missing or any file is malformed.
+    """
+    parsed: Dict[str, Any] = {}
+    digest = hashlib.sha256()
+    for name in CONTENT_FILES:
+        validate, default = _SPECS[name]
+        blob = raw.get(name)
+        digest.update(name.encode() + b"\0" + (blob or b"") + b"\0")
+        if blob is None:
+            _require(default is not None, name, "required content file is missing")
+            parsed[name] = default
+            continue
+        try:
+            data = json.loads(blob.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ContentError(f"{name}: invalid JSON ({e})") from e
+        validate(data)
+        parsed[name] = data
+
+    questions = parsed[QUESTIONS_FILE]
+    by_trait: Dict[str, list] = {t: [] for t in TRAITS}
+    for n, q in enumerate(questions):
+        by_trait[q["trait"]].append(n)
+
+    ee = parsed[EE_NARRATIVES_FILE]
+    path_map = parsed[PATH_MAP_FILE]
+    stages = {}
+    for n in range(1, STAGE_COUNT + 1):
+        label = f"Stage {n}"
+        stages[n - 1] = {"label": label, **path_map.get(label, {}), **ee.get(label, {})}
+
+    return ContentBundle(
+        questions=freeze(questions),
+        questions_by_trait=MappingProxyType({t: tuple(v) for t, v in by_trait.items()}),
+        stage_summaries=freeze(parsed[STAGE_SUMMARIES_FILE]),
+        ee_narratives=freeze(ee),
+        path_map=freeze(path_map),
+        stages_by_index=freeze(stages),
+        remedies=freeze(parsed[REMEDIES_FILE]),
+        digest=digest.hexdigest(),
+    )
+
+
+# ——— Question sampling ———————————————————————————————————————————
+
+def _draw(pool: Tuple[int, ...], k: int, exclude: AbstractSet[int], rng: random.Random) -> List[int]:
+    """
+    Pick ``k`` distinct items of ``pool``, preferring ones not in ``exclude``.
+
+    Rejection sampling keeps this O(k) when few items are excluded; the pool
+    is only scanned when most of it has been seen.
+    """
+    if not exclude:
+        return [pool[p] for p in rng.sample(range(len(pool)), k)]
+    chosen: List[int] = []
+    picked = set()
+    for _ in range(4 * k + 16):
+        if len(chosen) == k:
+            return chosen
+        item = pool[rng.randrange(len(pool))]
+        if item not in exclude and item not in picked:
+            chosen.append(item)
+            picked.add(item)
+    fresh = [item for item in pool if item not in exclude and item not in picked]
+    chosen += rng.sample(fresh, min(k - len(chosen), len(fresh)))
+    if len(chosen) < k:  # not enough unseen items: repeat seen ones rather than unbalance the quiz
+        picked.update(chosen)
+        seen = [item for item in pool if item not in picked]
+        chosen += rng.sample(seen, k - len(chosen))
+    return chosen
+
+
+def sample_questions(
+    bundle: ContentBundle,
+    size: int = QUIZ_SIZE,
+    seed: Optional[int] = None,
+    exclude: AbstractSet[int] = frozenset()
+) -> Tuple[int, ...]:
+    """
+    Draw a quiz with an equal number of questions per trait.
+
+    When ``size`` does not divide evenly, the extra questions go to randomly
+    chosen traits; a trait with too small a bank gives its share to the others.
+
+    Args:
+        bundle: Content to sample from (uses its per-trait index).
+        size: Number of questions.
+        seed: Seed for a reproducible draw; None draws fresh randomness.
+        exclude: Question positions to avoid (e.g. already seen by this user);
+            they are only reused when a trait runs out of unseen questions.
+
+    Returns:
+        Positions in ``bundle.questions``, shuffled.
+
+    Raises:
+        ContentError: If the bank holds fewer than ``size`` questions.
+    """
+    if size > len(bundle.questions):
+        raise ContentError(f"{QUESTIONS_FILE}: {len(bundle.questions)} questions cannot fill a quiz of {size}")
+    rng = random.Random(seed)
+    traits = [t for t in TRAITS if bundle.questions_by_trait[t]]
+    quota = dict.fromkeys(traits, size // len(traits))
+    for t in rng.sample(traits, size % len(traits)):
+        quota[t] += 1
+    spare = 0
+    for t in traits:
+        over = quota[t] - len(bundle.questions_by_trait[t])
+        if over > 0:
+            quota[t] -= over
+            spare += over
+    while spare:
+        for t in traits:
+            if spare and quota[t] < len(bundle.questions_by_trait[t]):
+                quota[t] += 1
+                spare -= 1
+
+    picked: List[int] = []
+    for t in traits:
+        picked += _draw(bundle.questions_by_trait[t], quota[t], exclude, rng)
+    rng.shuffle(picked)
+    return tuple(picked)
+
+
+class _ContentCache:
+    """Process-wide bundle for one content directory, reloaded on change."""
+
+    def __init__(self, base_dir: str):
+        self.paths = [os.path.join(base_dir, name) for name in CONTENT_FILES]
+        self.bundle: Optional[ContentBundle] = None
+        self.signature: Optional[Tuple] = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self, check_interval: float) -> ContentBundle:
+        if self.bundle is not None and time.monotonic() - self.checked_at < check_interval:
+            return self.bundle
+        with self.lock:
+            signature = _stat_signature(self.paths)
+            self.checked_at = time.monotonic()
+            if self.bundle is not None and signature == self.signature:
+                return self.bundle
+            raw = {name: _read(path) for name, path in zip(CONTENT_FILES, self.paths)}
+            try:
+                bundle = build_bundle(raw)
+            except ContentError:
+                if self.bundle is None:
+                    raise
+                # Keep serving the last good content rather than failing live sessions.
+                logger.exception("Content reload failed; keeping previous bundle")
+                self.signature = signature
+                return self.bundle
+            if self.bundle is None or bundle.digest != self.bundle.digest:
+                self.bundle = bundle
+            self.signature = signature
+            return self.bundle
+
+
+_caches: Dict[str, _ContentCache] = {}
+_caches_guard = threading.Lock()
+
+
+def get_content(base_dir: str = ".", check_interval: float = 1.0) -> ContentBundle:
+    """
+    Return the shared ContentBundle, loading and validating it on first use.
+
+    The bundle is shared by every session in the process. Files are re-checked
+    at most every ``check_interval`` seconds and re-parsed only when their
+    mtime or size changed; an unchanged content hash keeps the same bundle.
+
+    Args:
+        base_dir: Directory containing the content files.
+        check_interval: Minimum seconds between file change checks.
+
+    Returns:
+        The current ContentBundle.
+
+    Raises:
+        ContentError: If the content cannot be loaded on first use.
+    """
+    cache = _caches.get(base_dir)
+    if cache is None:
+        with _caches_guard:
+            cache = _caches.setdefault(base_dir, _ContentCache(base_dir))
+    return cache.get(check_interval)
+
+
+if __name__ == "__main__":
+    bundle = get_content()
+    print(f"Content OK ({bundle.digest[:12]})")
+    print(f"  questions: {len(bundle.questions)} "
+          + ", ".join(f"{t}={len(ix)}" for t, ix in bundle.questions_by_trait.items()))
+    print(f"  stage summaries: {len(bundle.stage_summaries)}, narratives: {len(bundle.ee_narratives)}, "
+          f"path map: {len(bundle.path_map)}, remedies: {len(bundle.remedies)}")
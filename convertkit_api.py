@@ -1,24 +1,397 @@
 # File: convertkit_api.py
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Overridable so tests and load tests can point at convertkit_stub.py.
+API_BASE = os.environ.get("CONVERTKIT_API_BASE", "https://api.convertkit.com")
+REQUEST_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide keep-alive session used for ConvertKit calls.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
 
-def subscribe_user_to_convertkit(email: str, api_key: str, form_id: str) -> bool:
+
+def subscribe_user_to_convertkit(email: str, api_key: str, form_id: str, base_url: Optional[str] = None) -> bool:
     """
     Subscribe a user to a ConvertKit form via API.
 
+    This call blocks; the app enqueues through SubscriptionOutbox instead.
+
     Args:
         email: Subscriber email address.
         api_key: ConvertKit API key.
         form_id: ConvertKit form ID to subscribe to.
+        base_url: API root (defaults to API_BASE).
 
     Returns:
         True if subscription succeeded (status 200), else False.
     """
-    url = f"https://api.convertkit.com/v3/forms/{form_id}/subscribe"
+    url = f"{base_url or API_BASE}/v3/forms/{form_id}/subscribe"
     payload = {"api_key": api_key, "email": email}
     try:
-        resp = requests.post(url, json=payload)
+        resp = get_session().post(url, json=payload, timeout=REQUEST_TIMEOUT)
         return resp.status_code == 200
     except requests.RequestException:
         return False
 
+
+# ——— Durable outbox ————————————————————————————————————————————————
+
+OUTBOX_PATH = os.environ.get("CONVERTKIT_OUTBOX_PATH", "convertkit_outbox.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    email           TEXT NOT NULL,
+    form_id         TEXT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'pending',   -- pending | inflight | sent | dead
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    enqueued_at     REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    claimed_by      TEXT,
+    claim_expires   REAL,
+    sent_at         REAL,
+    last_error      TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class SubscriptionOutbox:
+    """
+    Durable local queue of ConvertKit subscriptions drained by a background worker.
+
+    ``enqueue`` only inserts a row into a SQLite (WAL) database and returns, so
+    the Streamlit script thread never waits on the network. A daemon worker
+    claims due rows in batches (claims expire, so rows held by a crashed
+    process are retried, and several processes can share one outbox), posts
+    them through the pooled keep-alive session and records the result:
+
+    - 2xx: sent.
+    - 429: the worker pauses for ``Retry-After`` and retries without
+      counting an attempt.
+    - network errors, 408 and 5xx: retried with exponential backoff and jitter.
+    - other 4xx, or ``max_attempts`` failures: dead-lettered with the last error.
+
+    Requests are also paced client-side to ``max_rate`` per second. ConvertKit's
+    v3 form endpoint takes one subscriber per request, so batching happens at
+    claim time rather than in the HTTP payload.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        form_id: str,
+        path: str = OUTBOX_PATH,
+        base_url: Optional[str] = None,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        backoff_base: float = 2.0,
+        backoff_cap: float = 600.0,
+        max_rate: float = 2.0,
+        claim_timeout: float = 120.0,
+        poll_interval: float = 5.0
+    ):
+        self.api_key = api_key
+        self.form_id = str(form_id)
+        self.path = path
+        self.base_url = base_url or API_BASE
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_rate = max_rate
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._paused_until = 0.0
+        self._next_send = 0.0
+        self._latencies: deque = deque(maxlen=1024)          # enqueue -> sent, seconds
+        self._request_latencies: deque = deque(maxlen=1024)  # HTTP round trip, seconds
+        self._counters = {"sent": 0, "retried": 0, "rate_limited": 0, "dead": 0}
+        self._local = threading.local()
+
+        self._conn().executescript(_SCHEMA)
+
+    # — Public API ———————————————————————————————————————————
+
+    def enqueue(self, email: str) -> int:
+        """
+        Queue a subscription and return immediately.
+
+        Args:
+            email: Subscriber email address.
+
+        Returns:
+            The outbox row ID.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO outbox (email, form_id, enqueued_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (email.strip(), self.form_id, now, now),
+            )
+        self._wake.set()
+        return cur.lastrowid
+
+    def start(self) -> "SubscriptionOutbox":
+        """Start the background worker (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="convertkit-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the background worker after its current request."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def drain_once(self) -> int:
+        """
+        Claim and send one batch of due subscriptions on the calling thread.
+
+        Returns:
+            Number of rows processed.
+        """
+        rows = self._claim()
+        for row in rows:
+            if self._stop.is_set():
+                self._release(row["id"])
+                continue
+            self._deliver(row)
+        return len(rows)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Queue depth, outcome counts and latency percentiles.
+
+        Returns:
+            Counts per status from the database, this process's counters, the
+            age of the oldest pending row, and p50/p95 for enqueue-to-sent and
+            HTTP request latency in seconds.
+        """
+        with self._snapshot() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = conn.execute(
+                "SELECT MIN(enqueued_at) FROM outbox WHERE status IN ('pending', 'inflight')"
+            ).fetchone()[0]
+        return {
+            "depth": counts.get("pending", 0) + counts.get("inflight", 0),
+            "by_status": counts,
+            "oldest_pending_age": round(time.time() - oldest, 3) if oldest else 0.0,
+            "process": dict(self._counters),
+            "paused_for": round(max(0.0, self._paused_until - time.time()), 3),
+            "latency": _percentiles(self._latencies),
+            "request_latency": _percentiles(self._request_latencies),
+        }
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Return dead-lettered rows, newest first."""
+        with self._snapshot() as conn:
+            cur = conn.execute(
+                "SELECT id, email, attempts, enqueued_at, last_error FROM outbox "
+                "WHERE status = 'dead' ORDER BY id DESC LIMIT ?", (limit,))
+            return [dict(r) for r in cur.fetchall()]
+
+    def requeue_dead(self) -> int:
+        """Move every dead-lettered row back to pending; returns the count."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'",
+                (time.time(),))
+        self._wake.set()
+        return cur.rowcount
+
+    # — Worker ———————————————————————————————————————————————
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            pause = self._paused_until - time.time()
+            if pause > 0:
+                self._stop.wait(pause)
+                continue
+            try:
+                processed = self.drain_once()
+            except Exception:
+                logger.exception("ConvertKit outbox worker error")
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._conn())
+
+    def _snapshot(self) -> "_Transaction":
+        """A read-only transaction; under WAL it never waits for or blocks writers."""
+        return _Transaction(self._conn(), "DEFERRED")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _claim(self) -> List[sqlite3.Row]:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', claimed_by = NULL "
+                "WHERE status = 'inflight' AND claim_expires < ?", (now,))
+            conn.execute(
+                "UPDATE outbox SET status = 'inflight', claimed_by = ?, claim_expires = ? "
+                "WHERE id IN (SELECT id FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?)",
+                (self.worker_id, now + self.claim_timeout, now, self.batch_size))
+            return conn.execute(
+                "SELECT * FROM outbox WHERE status = 'inflight' AND claimed_by = ? ORDER BY id",
+                (self.worker_id,)).fetchall()
+
+    def _release(self, row_id: int) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE outbox SET status = 'pending', claimed_by = NULL WHERE id = ?", (row_id,))
+
+    def _pace(self) -> None:
+        if self.max_rate > 0:
+            wait = self._next_send - time.monotonic()
+            if wait > 0:
+                self._stop.wait(wait)
+            self._next_send = max(self._next_send, time.monotonic()) + 1.0 / self.max_rate
+
+    def _deliver(self, row: sqlite3.Row) -> None:
+        if time.time() < self._paused_until:
+            self._release(row["id"])
+            return
+        self._pace()
+        url = f"{self.base_url}/v3/forms/{row['form_id']}/subscribe"
+        started = time.perf_counter()
+        try:
+            resp = get_session().post(url, json={"api_key": self.api_key, "email": row["email"]},
+                                      timeout=REQUEST_TIMEOUT)
+            status, error, retry_after = resp.status_code, f"HTTP {resp.status_code}", resp.headers.get("Retry-After")
+        except requests.RequestException as e:
+            status, error, retry_after = None, f"{type(e).__name__}: {e}", None
+        self._request_latencies.append(time.perf_counter() - started)
+
+        now = time.time()
+        if status is not None and 200 <= status < 300:
+            self._finish(row["id"], "sent", row["attempts"] + 1, error=None, sent_at=now)
+            self._latencies.append(now - row["enqueued_at"])
+            self._counters["sent"] += 1
+        elif status == 429:
+            delay = _parse_retry_after(retry_after, default=60.0)
+            self._paused_until = now + delay
+            self._reschedule(row["id"], row["attempts"], now + delay, error)
+            self._counters["rate_limited"] += 1
+        elif status is None or status == 408 or status >= 500:
+            attempts = row["attempts"] + 1
+            if attempts >= self.max_attempts:
+                self._finish(row["id"], "dead", attempts, error=error)
+                self._counters["dead"] += 1
+            else:
+                delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempts - 1))
+                self._reschedule(row["id"], attempts, now + delay * random.uniform(0.5, 1.0), error)
+                self._counters["retried"] += 1
+        else:
+            # Other 4xx (bad email, bad key, unknown form) will not succeed on retry.
+            self._finish(row["id"], "dead", row["attempts"] + 1, error=error)
+            self._counters["dead"] += 1
+
+    def _finish(self, row_id: int, status: str, attempts: int, error: Optional[str], sent_at: Optional[float] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, sent_at = ?, claimed_by = NULL "
+                "WHERE id = ?", (status, attempts, error, sent_at, row_id))
+
+    def _reschedule(self, row_id: int, attempts: int, when: float, error: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?, "
+                "claimed_by = NULL WHERE id = ?", (attempts, when, error, row_id))
+
+
+class _Transaction:
+    """Context manager running statements in one transaction (IMMEDIATE by default) on a shared connection."""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str = "IMMEDIATE"):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _parse_retry_after(value: Optional[str], default: float) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    data = sorted(samples)
+    if not data:
+        return {"count": 0, "p50": 0.0, "p95": 0.0}
+    return {
+        "count": len(data),
+        "p50": round(data[len(data) // 2], 4),
+        "p95": round(data[min(len(data) - 1, int(len(data) * 0.95))], 4),
+    }
+
+
+_outbox: Optional[SubscriptionOutbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(api_key: str, form_id: str, path: str = OUTBOX_PATH) -> SubscriptionOutbox:
+    """
+    Return the process-wide outbox with its worker running, creating it on first use.
+    """
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = SubscriptionOutbox(api_key, form_id, path=path).start()
+    return _outbox
@@ -0,0 +1,147 @@
+# File: convertkit_stub.py
+"""
+Local stand-in for the ConvertKit v3 form-subscribe endpoint.
+
+Used by tests and load tests so nothing reaches the real API. Point the app
+at it with ``CONVERTKIT_API_BASE=http://127.0.0.1:<port>`` or pass
+``base_url`` to SubscriptionOutbox.
+
+    python convertkit_stub.py --port 8765 --fail-rate 0.1 --rate-limit 120
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_SUBSCRIBE_PATH = re.compile(r"^/v3/forms/([^/]+)/subscribe$")
+
+
+class StubState:
+    """
+    Behaviour knobs and a record of received subscriptions.
+
+    Attributes:
+        fail_rate: Probability of answering 503.
+        rate_limit: Requests allowed per rolling minute before answering 429 (0 = unlimited).
+        latency: Seconds to sleep before answering.
+        subscriptions: (form_id, email) pairs accepted so far.
+    """
+
+    def __init__(self, fail_rate: float = 0.0, rate_limit: int = 0, latency: float = 0.0, seed: Optional[int] = None):
+        self.fail_rate = fail_rate
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.subscriptions: List[Tuple[str, str]] = []
+        self.requests = 0
+        self._recent: deque = deque()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def decide(self) -> Tuple[int, Dict[str, str]]:
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.rate_limit and len(self._recent) >= self.rate_limit:
+                return 429, {"Retry-After": str(max(1, int(60 - (now - self._recent[0])) + 1))}
+            self._recent.append(now)
+            if self._rng.random() < self.fail_rate:
+                return 503, {}
+            return 200, {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+    server: "StubServer"
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        m = _SUBSCRIBE_PATH.match(self.path)
+        if not m:
+            return self._reply(404, {"error": "Not Found"})
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return self._reply(400, {"error": "Invalid JSON"})
+        email = str(payload.get("email", ""))
+        if not payload.get("api_key"):
+            return self._reply(401, {"error": "Authorization Failed", "message": "API Key not valid"})
+        if "@" not in email:
+            return self._reply(400, {"error": "Bad Request", "message": "Email address is invalid"})
+
+        state = self.server.state
+        if state.latency:
+            time.sleep(state.latency)
+        status, headers = state.decide()
+        if status != 200:
+            return self._reply(status, {"error": "Unavailable" if status == 503 else "Too Many Requests"}, headers)
+        with state._lock:
+            state.subscriptions.append((m.group(1), email))
+            sub_id = len(state.subscriptions)
+        self._reply(200, {"subscription": {"id": sub_id, "state": "inactive", "subscriber": {"email_address": email}}})
+
+    def _reply(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], state: StubState):
+        super().__init__(address, _Handler)
+        self.state = state
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(port: int = 0, host: str = "127.0.0.1", **state_kwargs: Any) -> StubServer:
+    """
+    Start the stub on a background thread.
+
+    Args:
+        port: Port to bind (0 picks a free one).
+        host: Interface to bind.
+        **state_kwargs: StubState options (fail_rate, rate_limit, latency, seed).
+
+    Returns:
+        The running server; use ``.base_url``, ``.state`` and ``.shutdown()``.
+    """
+    server = StubServer((host, port), StubState(**state_kwargs))
+    threading.Thread(target=server.serve_forever, name="convertkit-stub", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local ConvertKit API stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute before 429")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each response")
+    args = parser.parse_args()
+    server = StubServer((args.host, args.port), StubState(args.fail_rate, args.rate_limit, args.latency))
+    print(f"ConvertKit stub listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
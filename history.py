@@ -0,0 +1,292 @@
+# File: history.py
+"""
+Per-user assessment history for returning users.
+
+assessment_log has no user key, so "how did my profile change" would mean
+scanning every assessment ever logged. This store keeps one row per
+assessment keyed by a stable, non-reversible user ID (an HMAC of the
+normalized email), in SQLite (WAL) next to the app:
+
+- ``assessments`` holds every entry, indexed by (user_id, ts), so a range
+  query reads only that user's rows.
+- ``latest`` holds each user's most recent entry under its primary key,
+  updated in the same transaction as the append, so the latest profile is
+  one keyed lookup however many users or entries there are.
+
+Appends are idempotent per submission ID, so a rerun never records the same
+submission twice. Each entry also keeps the question positions it was asked
+(with the content digest they refer to), so a returning user's next quiz can
+avoid questions they have already answered. The user-ID HMAC is keyed with ``Z9_HISTORY_SECRET`` or,
+when that is unset, a random per-install secret generated on first use and
+kept next to the database (``<database>.key``, mode 0600). IDs are never a
+bare hash of the email, which anyone with a list of addresses could match.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+HISTORY_PATH_ENV = "Z9_HISTORY_PATH"
+HISTORY_SECRET_ENV = "Z9_HISTORY_SECRET"
+HISTORY_PATH = "user_history.sqlite3"
+SECRET_SUFFIX = ".key"
+TRAITS = ("D", "I", "S", "C")
+
+_COLUMNS = ("ts", "submission_id", "d", "i", "s", "c", "trait_score", "harmony_ratio", "stage", "perceived", "mood")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    seq           INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id       TEXT NOT NULL,
+    ts            REAL NOT NULL,
+    submission_id TEXT NOT NULL UNIQUE,
+    d REAL NOT NULL, i REAL NOT NULL, s REAL NOT NULL, c REAL NOT NULL,
+    trait_score   REAL,
+    harmony_ratio REAL,
+    stage         INTEGER,      -- auto-mapped stage number
+    perceived     INTEGER,      -- perceived stage number
+    mood          INTEGER,
+    content_digest TEXT,        -- content bundle the question positions refer to
+    questions     TEXT          -- comma-separated question positions asked
+);
+CREATE INDEX IF NOT EXISTS assessments_user_ts ON assessments (user_id, ts);
+CREATE TABLE IF NOT EXISTS latest (
+    user_id       TEXT PRIMARY KEY,
+    entries       INTEGER NOT NULL,
+    ts            REAL NOT NULL,
+    submission_id TEXT NOT NULL,
+    d REAL NOT NULL, i REAL NOT NULL, s REAL NOT NULL, c REAL NOT NULL,
+    trait_score   REAL,
+    harmony_ratio REAL,
+    stage         INTEGER,
+    perceived     INTEGER,
+    mood          INTEGER
+) WITHOUT ROWID;
+"""
+
+
+_install_secrets: Dict[str, str] = {}
+_secret_lock = threading.Lock()
+
+
+def install_secret(path: str) -> str:
+    """
+    The per-install HMAC key stored in ``path``, generated on first use.
+
+    A new key is written to a temporary file and hard-linked into place, so
+    concurrent first uses agree on one key and never read a partial file.
+    """
+    with _secret_lock:
+        if path not in _install_secrets:
+            if not os.path.exists(path):
+                tmp = f"{path}.{os.getpid()}.tmp"
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(secrets.token_hex(32))
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.link(tmp, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.remove(tmp)
+            with open(path, "r", encoding="utf-8") as f:
+                key = f.read().strip()
+            if not key:
+                raise ValueError(f"{path}: empty history secret")
+            _install_secrets[path] = key
+        return _install_secrets[path]
+
+
+def user_id_for(email: str, secret: Optional[str] = None) -> str:
+    """
+    Stable user ID for an email address (case and surrounding space ignored).
+
+    Args:
+        email: The user's email address.
+        secret: HMAC key; defaults to ``Z9_HISTORY_SECRET``, then to the
+            per-install secret next to the history database.
+    """
+    normalized = email.strip().lower().encode("utf-8")
+    key = secret or os.environ.get(HISTORY_SECRET_ENV) or install_secret(
+        (os.environ.get(HISTORY_PATH_ENV) or HISTORY_PATH) + SECRET_SUFFIX)
+    return hmac.new(key.encode("utf-8"), normalized, hashlib.sha256).hexdigest()
+
+
+def _stage_number(label: Any) -> Optional[int]:
+    try:
+        return int(str(label).split()[-1])
+    except (ValueError, IndexError):
+        return None
+
+
+class HistoryStore:
+    """
+    SQLite-backed per-user history. Safe to share across threads and processes.
+
+    Args:
+        path: Database file.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # Databases created before the question columns existed gain them here.
+        have = {row["name"] for row in conn.execute("PRAGMA table_info(assessments)")}
+        for column in ("content_digest", "questions"):
+            if column not in have:
+                try:
+                    conn.execute(f"ALTER TABLE assessments ADD COLUMN {column} TEXT")
+                except sqlite3.OperationalError:  # another process added it first
+                    pass
+
+    def append(
+        self,
+        user_id: str,
+        submission_id: str,
+        profile: Dict[str, Any],
+        stage: str,
+        perceived: str = "",
+        mood: Optional[int] = None,
+        ts: Optional[float] = None,
+        questions: Sequence[int] = (),
+        content_digest: Optional[str] = None
+    ) -> bool:
+        """
+        Record one assessment for a user.
+
+        Args:
+            user_id: ID from user_id_for.
+            submission_id: Unique ID of the submission; repeats are ignored.
+            profile: analyze_profile result (traits, trait_score, harmony_ratio).
+            stage: Auto-mapped stage label ("Stage N").
+            perceived: Perceived stage label.
+            mood: Mood 0-10 at submission time.
+            ts: Epoch seconds (default now).
+            questions: Positions in the content bundle's questions that were asked.
+            content_digest: Digest of the content bundle ``questions`` refers to.
+
+        Returns:
+            True if the entry was added, False if the submission was already recorded.
+        """
+        traits = profile["traits"]
+        row = (ts if ts is not None else time.time(), submission_id,
+               *(float(traits.get(t, 0)) for t in TRAITS),
+               profile.get("trait_score"), profile.get("harmony_ratio"),
+               _stage_number(stage), _stage_number(perceived), mood)
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        with self._transaction() as conn:
+            cur = conn.execute(
+                f"INSERT OR IGNORE INTO assessments (user_id, {', '.join(_COLUMNS)}, content_digest, questions) "
+                f"VALUES (?, {placeholders}, ?, ?)",
+                (user_id, *row, content_digest, ",".join(str(int(q)) for q in questions)))
+            if not cur.rowcount:
+                return False
+            # Entries can arrive out of order (e.g. a backfill); latest keeps the newest.
+            conn.execute(
+                f"INSERT INTO latest (user_id, entries, {', '.join(_COLUMNS)}) VALUES (?, 1, {placeholders}) "
+                "ON CONFLICT (user_id) DO UPDATE SET entries = entries + 1, "
+                + ", ".join(f"{col} = CASE WHEN excluded.ts >= latest.ts THEN excluded.{col} ELSE latest.{col} END"
+                            for col in _COLUMNS),
+                (user_id, *row))
+        return True
+
+    def latest(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's most recent entry plus ``entries`` (their total count), or None."""
+        row = self._conn().execute("SELECT * FROM latest WHERE user_id = ?", (user_id,)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def history(
+        self,
+        user_id: str,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        The user's entries with ``since <= ts < until``, oldest first.
+
+        Args:
+            user_id: ID from user_id_for.
+            since: Start (epoch seconds), inclusive; None for no bound.
+            until: End (epoch seconds), exclusive; None for no bound.
+            limit: Keep only the most recent ``limit`` entries of the range.
+        """
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM assessments WHERE user_id = ? AND ts >= ? AND ts < ? ORDER BY ts DESC"
+        params: Tuple = (user_id, since if since is not None else float("-inf"),
+                         until if until is not None else float("inf"))
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        rows = self._conn().execute(sql, params).fetchall()
+        return [self._entry(row) for row in reversed(rows)]
+
+    def seen_questions(self, user_id: str, content_digest: str) -> Set[int]:
+        """Question positions the user has been asked under this content digest."""
+        rows = self._conn().execute(
+            "SELECT questions FROM assessments WHERE user_id = ? AND content_digest = ?",
+            (user_id, content_digest)).fetchall()
+        return {int(q) for (text,) in rows if text for q in text.split(",")}
+
+    def _entry(self, row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        entry.pop("user_id", None)
+        entry["traits"] = {t: entry.pop(t.lower()) for t in TRAITS}
+        return entry
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def trend_points(entries: List[Dict[str, Any]]) -> Tuple[Tuple, ...]:
+    """
+    Chart input for visuals.plot_trait_trend from history() entries:
+    one (local ISO timestamp, D, I, S, C, stage) tuple per entry.
+    """
+    return tuple(
+        (time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(e["ts"])), *(e["traits"][t] for t in TRAITS),
+         e["stage"] or 0)
+        for e in entries
+    )
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """
+    Return the process-wide HistoryStore (``Z9_HISTORY_PATH``, default user_history.sqlite3).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore(os.environ.get(HISTORY_PATH_ENV) or HISTORY_PATH)
+    return _store
@@ -0,0 +1,468 @@
+# File: loadtest.py
+"""
+Local load test: many simulated quiz takers against a running app instance.
+
+Starts ``streamlit run z9CoachFree.py`` on a free port (or targets ``--url``)
+and drives it over Streamlit's websocket protocol the way a browser does:
+each simulated user opens a session, answers and submits the quiz, moves
+the mood slider and (optionally) builds and downloads the PDF report.
+Users run concurrently on one asyncio loop, so the server sees real
+concurrent sessions, reruns and fragment reruns.
+
+ConvertKit is replaced by convertkit_stub.py (CONVERTKIT_API_BASE) and every
+state file the app writes (SCRATCH_STATE), plus the secrets file, lives in a
+temporary scratch directory that is removed afterwards (``--keep-scratch``
+keeps it), so nothing leaves the machine and the working tree is untouched.
+
+    python loadtest.py --users 200 --concurrency 16
+    python loadtest.py --users 50 --concurrency 8 --answer-weights 1,1,4,1,1 --pdf-rate 1
+    python loadtest.py --users 100 --concurrency 4 --json loadtest.json
+    Z9_RENDER_WORKERS=4 python loadtest.py --users 200 --concurrency 32   # server env is inherited
+
+Reported:
+    throughput   completed sessions per second
+    client       per-step latency as a user sees it (load, submit, rerun, pdf, download)
+    server       per-phase spans the app recorded (telemetry.py span log)
+    rss          server RSS, render workers included, over time
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+from telemetry import SpanRecorder
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = "z9CoachFree.py"
+STEPS = ("load", "submit", "rerun", "pdf", "download")
+WIDGET_TYPES = ("radio", "selectbox", "text_input", "slider", "button", "download_button")
+SCRATCH_STATE = (  # (environment variable, file name in the scratch directory) per app state file
+    ("CONVERTKIT_OUTBOX_PATH", "outbox.sqlite3"),
+    ("Z9_LOG_PATH", "assessment_log.jsonl"),
+    ("Z9_HISTORY_PATH", "user_history.sqlite3"),
+    ("Z9_TRAIT_STORE", "trait_store"),
+    ("Z9_NEIGHBOUR_INDEX", "neighbour_index.bin"),
+    ("Z9_CALIBRATION_PATH", "stage_calibration.json"),
+    ("Z9_SPAN_LOG", "spans.jsonl"),
+)
+
+
+# ——— Server process ————————————————————————————————————————————————
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kb(pid: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _child_pids(pid: str) -> List[str]:
+    out: List[str] = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                out.extend(f.read().split())
+    except OSError:
+        pass
+    return out
+
+
+def tree_rss_mb(pid: int) -> float:
+    """RSS of ``pid`` and its descendants in MB; 0 where /proc is unavailable."""
+    total, stack = 0, [str(pid)]
+    while stack:
+        p = stack.pop()
+        total += _rss_kb(p)
+        stack.extend(_child_pids(p))
+    return total / 1024
+
+
+class AppServer:
+    """
+    A ``streamlit run`` instance of the app with ConvertKit pointed at the stub.
+
+    Args:
+        scratch: Directory for the secrets file and every SCRATCH_STATE file.
+        convertkit_base: Base URL of the ConvertKit stub.
+        port: Port to serve on (0 picks a free one).
+    """
+
+    def __init__(self, scratch: str, convertkit_base: str, port: int = 0):
+        self.port = port or _free_port()
+        self.secrets = os.path.join(scratch, "secrets.toml")
+        with open(self.secrets, "w", encoding="utf-8") as f:
+            f.write('[convertkit]\napi_key = "load-test"\nform_id = "load-test"\n')
+        self.env = {**os.environ, "CONVERTKIT_API_BASE": convertkit_base, **self.scratch_env(scratch)}
+        self.span_log = self.env["Z9_SPAN_LOG"]
+        self.proc: Optional[subprocess.Popen] = None
+
+    @staticmethod
+    def scratch_env(scratch: str) -> Dict[str, str]:
+        """Environment pointing every app state file (SCRATCH_STATE) into ``scratch``."""
+        return {var: os.path.join(scratch, name) for var, name in SCRATCH_STATE}
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 60.0) -> "AppServer":
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP_SCRIPT, "--server.headless", "true",
+             "--server.port", str(self.port), "--server.address", "127.0.0.1",
+             "--browser.gatherUsageStats", "false", "--secrets.files", self.secrets],
+            cwd=HERE, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited: {self.proc.stderr.read().decode(errors='replace')[-500:]}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/_stcore/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return self
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"server did not become healthy within {timeout:.0f} s")
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()  # Streamlit exits cleanly on SIGTERM, flushing the span log
+            try:
+                self.proc.wait(15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    def server_spans(self, since: float) -> Dict[str, Dict[str, float]]:
+        """Per-phase summary of the span log lines written after ``since`` (epoch seconds)."""
+        recorder = SpanRecorder(capacity=1_000_000, enabled=True)
+        try:
+            with open(self.span_log, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if rec["ts"] >= since:
+                        recorder.record(rec["name"], rec["ms"] / 1000)
+        except FileNotFoundError:
+            pass
+        return recorder.summary()
+
+
+# ——— Simulated users ————————————————————————————————————————————————
+
+class Session:
+    """
+    One browser-like websocket session.
+
+    Keeps every widget's current value and sends them all on each rerun,
+    as the frontend does; a button press is a one-shot trigger.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.widgets: Dict[str, List[tuple]] = {}  # type -> [(proto, fragment_id)], from the last run
+        self.values: Dict[str, Any] = {}           # widget id -> WidgetState
+        self._ws = None
+
+    async def connect(self) -> None:
+        from tornado.websocket import websocket_connect
+
+        ws_url = self.base_url.replace("http", "ws", 1) + "/_stcore/stream"
+        self._ws = await asyncio.wait_for(websocket_connect(ws_url, subprotocols=["streamlit"]), self.timeout)
+
+    def close(self) -> None:
+        if self._ws is not None:
+            self._ws.close()
+
+    def set(self, widget, **value: Any) -> None:
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=widget.id)
+        for field, v in value.items():
+            if field == "double_array_value":
+                state.double_array_value.data.extend(v)
+            else:
+                setattr(state, field, v)
+        self.values[widget.id] = state
+
+    async def rerun(self, trigger=None, fragment_id: str = "") -> None:
+        """Send a rerun (pressing ``trigger``, if given) and read until the script finishes."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.widget_states.widgets.extend(self.values.values())
+        if trigger is not None:
+            state.widget_states.widgets.append(WidgetState(id=trigger.id, trigger_value=True))
+        if fragment_id:
+            state.fragment_id = fragment_id
+        await self._ws.write_message(msg.SerializeToString(), binary=True)
+
+        widgets: Dict[str, List[tuple]] = {}
+        while True:
+            data = await asyncio.wait_for(self._ws.read_message(), self.timeout)
+            if data is None:
+                raise ConnectionError("server closed the session")
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(data)
+            kind = fmsg.WhichOneof("type")
+            if kind == "delta" and fmsg.delta.WhichOneof("type") == "new_element":
+                element = fmsg.delta.new_element
+                etype = element.WhichOneof("type")
+                if etype == "exception":
+                    raise RuntimeError(f"app exception: {element.exception.message}")
+                if etype in WIDGET_TYPES:
+                    widgets.setdefault(etype, []).append((getattr(element, etype), fmsg.delta.fragment_id))
+            elif kind == "script_finished":
+                break
+        if fragment_id:
+            self.widgets.update(widgets)
+        else:
+            self.widgets = widgets
+
+    def find(self, etype: str, label: str = "") -> tuple:
+        return next(w for w in self.widgets.get(etype, []) if label in w[0].label)
+
+    async def download(self, url: str) -> int:
+        def fetch() -> int:
+            with urllib.request.urlopen(self.base_url + url, timeout=self.timeout) as resp:
+                return len(resp.read())
+        return await asyncio.get_running_loop().run_in_executor(None, fetch)
+
+
+class LoadTest:
+    """
+    Drive ``users`` simulated sessions against ``base_url``, ``concurrency`` at a time.
+
+    Args:
+        base_url: App root, e.g. http://127.0.0.1:8501.
+        users: Total sessions to run.
+        concurrency: Sessions in flight at once.
+        answer_weights: Relative probability of each answer option by position
+            (None = uniform).
+        pdf_rate: Fraction of users who also build and download the PDF report.
+        email_rate: Fraction of users who enter an email (queued to the stub).
+        seed: Seed for answers and per-user choices.
+        timeout: Seconds to wait for any single server response.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        users: int,
+        concurrency: int,
+        answer_weights: Optional[List[float]] = None,
+        pdf_rate: float = 0.25,
+        email_rate: float = 0.5,
+        seed: int = 0,
+        timeout: float = 120.0
+    ):
+        self.base_url = base_url
+        self.users = users
+        self.concurrency = concurrency
+        self.answer_weights = answer_weights
+        self.pdf_rate = pdf_rate
+        self.email_rate = email_rate
+        self.seed = seed
+        self.timeout = timeout
+        self.client = SpanRecorder(capacity=max(users, 2048), enabled=True)
+        self.errors: List[str] = []
+        self.completed = 0
+
+    async def _step(self, name: str, coro) -> Any:
+        start = time.perf_counter()
+        result = await coro
+        self.client.record(name, time.perf_counter() - start)
+        return result
+
+    async def _user(self, n: int) -> None:
+        rng = random.Random(self.seed * 1_000_003 + n)
+        session = Session(self.base_url, self.timeout)
+        try:
+            await self._step("load", self._load(session))
+
+            for radio, _ in session.widgets.get("radio", []):
+                weights = (self.answer_weights or [1.0] * len(radio.options))[:len(radio.options)]
+                session.set(radio, int_value=rng.choices(range(len(weights)), weights)[0])
+            stage, _ = session.find("selectbox")
+            session.set(stage, string_value=rng.choice(list(stage.options)))
+            if rng.random() < self.email_rate:
+                session.set(session.find("text_input")[0], string_value=f"load-{self.seed}-{n}@example.com")
+            await self._step("submit", session.rerun(trigger=session.find("button", "Generate")[0]))
+
+            session.set(session.find("slider")[0], double_array_value=[float(rng.randint(0, 10))])
+            await self._step("rerun", session.rerun())
+
+            if rng.random() < self.pdf_rate:
+                button, fragment_id = session.find("button", "PDF")
+                await self._step("pdf", session.rerun(trigger=button, fragment_id=fragment_id))
+                url = session.find("download_button")[0].url
+                if not await self._step("download", session.download(url)):
+                    raise RuntimeError("empty PDF download")
+        finally:
+            session.close()
+
+    async def _load(self, session: Session) -> None:
+        await session.connect()
+        await session.rerun()
+
+    async def _run(self) -> None:
+        gate = asyncio.Semaphore(self.concurrency)
+
+        async def one(n: int) -> None:
+            async with gate:
+                try:
+                    await self._user(n)
+                    self.completed += 1
+                except Exception as e:
+                    self.errors.append(f"user {n}: {type(e).__name__}: {e}")
+
+        await asyncio.gather(*(one(n) for n in range(self.users)))
+
+    def run(self, server_pid: Optional[int] = None, rss_interval: float = 1.0) -> Dict[str, Any]:
+        """
+        Run the load and return the report (see format_report).
+
+        Args:
+            server_pid: Server process to sample RSS from (None skips RSS).
+            rss_interval: Seconds between RSS samples.
+        """
+        samples: List[tuple] = []
+        started = time.perf_counter()
+
+        async def sample_rss(done: asyncio.Event) -> None:
+            while True:
+                samples.append((round(time.perf_counter() - started, 2), round(tree_rss_mb(server_pid), 1)))
+                try:
+                    await asyncio.wait_for(done.wait(), rss_interval)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+
+        async def main() -> None:
+            done = asyncio.Event()
+            sampler = asyncio.create_task(sample_rss(done)) if server_pid else None
+            await self._run()
+            done.set()
+            if sampler is not None:
+                await sampler
+
+        asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        rss = [mb for _, mb in samples]
+        return {
+            "users": self.users,
+            "concurrency": self.concurrency,
+            "elapsed_s": elapsed,
+            "completed": self.completed,
+            "errors": len(self.errors),
+            "error_samples": self.errors[:5],
+            "sessions_per_s": self.completed / elapsed if elapsed else 0.0,
+            "client": self.client.summary(),
+            "rss": {"start_mb": rss[0] if rss else 0.0, "peak_mb": max(rss, default=0.0),
+                    "end_mb": rss[-1] if rss else 0.0, "samples": samples},
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"{report['completed']}/{report['users']} sessions at concurrency {report['concurrency']} "
+        f"in {report['elapsed_s']:.1f} s: {report['sessions_per_s']:.2f} sessions/s, {report['errors']} errors",
+    ]
+    lines.extend(f"  error: {e}" for e in report["error_samples"])
+    for title in ("client", "server"):
+        phases = report.get(title)
+        if not phases:
+            continue
+        lines.append(f"{title:<26} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for phase in sorted(phases, key=lambda p: (STEPS.index(p) if p in STEPS else len(STEPS), p)):
+            s = phases[phase]
+            lines.append(f"  {phase:<24} {s['count']:>7} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} "
+                         f"{s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}")
+    rss = report["rss"]
+    if rss["samples"]:
+        lines.append(f"server rss MB: start {rss['start_mb']:.0f}, peak {rss['peak_mb']:.0f}, end {rss['end_mb']:.0f}")
+        step = max(1, len(rss["samples"]) // 20)
+        lines.append("  " + "  ".join(f"{t:.0f}s:{mb:.0f}" for t, mb in rss["samples"][::step]))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate concurrent quiz takers against a local app instance.")
+    parser.add_argument("--users", type=int, default=50, help="total simulated sessions")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions in flight at once")
+    parser.add_argument("--answer-weights", default="",
+                        help="comma-separated weights per answer option position (default uniform)")
+    parser.add_argument("--pdf-rate", type=float, default=0.25, help="fraction of users building the PDF")
+    parser.add_argument("--email-rate", type=float, default=0.5, help="fraction of users entering an email")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for any server response")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="seconds between RSS samples")
+    parser.add_argument("--stub-fail-rate", type=float, default=0.0, help="ConvertKit stub 503 rate")
+    parser.add_argument("--url", help="target an already running instance instead of starting one")
+    parser.add_argument("--json", metavar="PATH", help="also write the full report as JSON")
+    parser.add_argument("--keep-scratch", action="store_true",
+                        help="keep the scratch directory (logs, databases, span log) for debugging")
+    args = parser.parse_args(argv)
+
+    weights = [float(w) for w in args.answer_weights.split(",")] if args.answer_weights else None
+
+    from convertkit_stub import start_stub_server
+
+    stub = start_stub_server(fail_rate=args.stub_fail_rate, seed=args.seed)
+    scratch = None if args.url else tempfile.mkdtemp(prefix="z9-loadtest-")
+    server = None
+    try:
+        if scratch is not None:
+            server = AppServer(scratch, stub.base_url).start()
+        since = time.time()
+        test = LoadTest(args.url or server.url, args.users, args.concurrency, weights,
+                        args.pdf_rate, args.email_rate, args.seed, args.timeout)
+        report = test.run(server.proc.pid if server else None, args.rss_interval)
+        if server is not None:
+            server.stop()
+            report["server"] = server.server_spans(since)
+    finally:
+        if server is not None:
+            server.stop()
+        stub.shutdown()
+        if scratch is not None:
+            if args.keep_scratch:
+                print(f"scratch directory kept: {scratch}", file=sys.stderr)
+            else:
+                shutil.rmtree(scratch, ignore_errors=True)
+    report["convertkit_stub"] = {"requests": stub.state.requests, "accepted": len(stub.state.subscriptions)}
+
+    print(format_report(report))
+    print(f"convertkit stub: {report['convertkit_stub']['accepted']} subscriptions accepted")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+# File: memprofile.py
+"""
+Opt-in memory profiling for long-running app processes.
+
+Set ``Z9_MEMPROFILE=1`` and the app starts tracemalloc and a background
+thread that, every ``Z9_MEMPROFILE_INTERVAL`` seconds (default 60), takes a
+snapshot and records:
+
+- RSS and tracemalloc's traced/peak size,
+- the top allocation sites diffed against the first snapshot (what has
+  accumulated since start) and against the previous one (what is growing now),
+- open matplotlib figures (pyplot's registry; every chart should be closed),
+- per-session ``st.session_state`` size, reported by the app on each run.
+
+Thresholds come from the environment; crossing one logs a warning and
+issues a MemoryThresholdWarning (once per crossing, again after recovery):
+
+    Z9_MEM_RSS_MB        process RSS
+    Z9_MEM_GROWTH_MB     traced memory growth since the first snapshot
+    Z9_MEM_FIGURES       open matplotlib figures
+    Z9_MEM_SESSION_KB    largest single session state
+
+Reports are kept in memory for the operator page and, with
+``Z9_MEMPROFILE_LOG=/path/mem.jsonl``, appended as JSON lines. tracemalloc
+slows allocation-heavy code noticeably, so leave this off in normal serving.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import warnings
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from telemetry import SESSION_TTL
+
+logger = logging.getLogger(__name__)
+
+ENABLED_ENV = "Z9_MEMPROFILE"
+INTERVAL_ENV = "Z9_MEMPROFILE_INTERVAL"
+LOG_ENV = "Z9_MEMPROFILE_LOG"
+THRESHOLD_ENVS = {
+    "rss_mb": "Z9_MEM_RSS_MB",
+    "growth_mb": "Z9_MEM_GROWTH_MB",
+    "figures": "Z9_MEM_FIGURES",
+    "session_kb": "Z9_MEM_SESSION_KB",
+}
+
+# Allocations made by the profiler itself and by the import machinery are noise.
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryThresholdWarning(RuntimeWarning):
+    """A configured memory threshold was crossed."""
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def open_figures() -> int:
+    """Figures registered with pyplot, or 0 when pyplot has not been imported."""
+    plt = sys.modules.get("matplotlib.pyplot")
+    return len(plt.get_fignums()) if plt is not None else 0
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Approximate bytes held by ``obj`` and everything reachable through
+    containers and instance dicts (shared objects counted once).
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        try:
+            total += sys.getsizeof(o)
+        except TypeError:
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__"):
+            stack.append(vars(o))
+    return total
+
+
+def _top_sites(stats: List[tracemalloc.StatisticDiff], top: int) -> List[Dict[str, Any]]:
+    out = []
+    for stat in stats[:top]:
+        frame = stat.traceback[0]
+        out.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(stat.size / 1024, 1),
+            "diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+        })
+    return out
+
+
+class MemoryProfiler:
+    """
+    Periodic tracemalloc snapshots with threshold checks.
+
+    Args:
+        interval: Seconds between snapshots.
+        top: Allocation sites listed per diff.
+        frames: Traceback depth tracemalloc stores per allocation.
+        thresholds: Limits keyed as THRESHOLD_ENVS ("rss_mb", "growth_mb",
+            "figures", "session_kb"); missing keys are not checked.
+        log_path: Optional JSON-lines file to append each report to.
+        history: Reports kept in memory.
+    """
+
+    def __init__(
+        self,
+        interval: float = 60.0,
+        top: int = 10,
+        frames: int = 1,
+        thresholds: Optional[Dict[str, float]] = None,
+        log_path: Optional[str] = None,
+        history: int = 60
+    ):
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self.thresholds = dict(thresholds or {})
+        self.log_path = log_path
+        self.reports: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._sessions: Dict[str, tuple] = {}  # session_id -> (bytes, last seen)
+        self._crossed: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MemoryProfiler":
+        """Start tracing and the snapshot thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._baseline = self._previous = self._take()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="z9-memprofile", daemon=True)
+        self._thread.start()
+        logger.info("Memory profiling on: snapshot every %.0f s, thresholds %s", self.interval, self.thresholds)
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def record_session(self, session_id: str, state: Any) -> None:
+        """Record the current size of one session's state."""
+        size = deep_sizeof(state)
+        with self._lock:
+            self._sessions[session_id] = (size, time.monotonic())
+
+    def session_sizes(self, ttl: float = SESSION_TTL) -> Dict[str, float]:
+        """Count, total and largest state size (KB) over sessions seen within ``ttl`` seconds."""
+        cutoff = time.monotonic() - ttl
+        with self._lock:
+            for sid in [s for s, (_, seen) in self._sessions.items() if seen < cutoff]:
+                del self._sessions[sid]
+            sizes = [size for size, _ in self._sessions.values()]
+        return {"count": len(sizes), "total_kb": round(sum(sizes) / 1024, 1),
+                "max_kb": round(max(sizes, default=0) / 1024, 1)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Take a snapshot now, check thresholds and return the report.
+
+        Returns:
+            {"ts", "rss_mb", "traced_mb", "traced_peak_mb", "growth_mb",
+            "figures", "sessions", "top_since_start", "top_since_last",
+            "warnings"}.
+        """
+        with self._snapshot_lock:
+            current = self._take()
+            since_start = current.compare_to(self._baseline, "lineno")
+            since_last = current.compare_to(self._previous, "lineno")
+            self._previous = current
+        traced, peak = tracemalloc.get_traced_memory()
+        report = {
+            "ts": time.time(),
+            "rss_mb": round(rss_mb(), 1),
+            "traced_mb": round(traced / 2**20, 2),
+            "traced_peak_mb": round(peak / 2**20, 2),
+            "growth_mb": round(sum(s.size_diff for s in since_start) / 2**20, 2),
+            "figures": open_figures(),
+            "sessions": self.session_sizes(),
+            "top_since_start": _top_sites(since_start, self.top),
+            "top_since_last": _top_sites(since_last, self.top),
+        }
+        report["warnings"] = self._check(report)
+        self.reports.append(report)
+        if self.log_path:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report, separators=(",", ":")) + "\n")
+        return report
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.reports[-1] if self.reports else None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def _check(self, report: Dict[str, Any]) -> List[str]:
+        observed = {
+            "rss_mb": report["rss_mb"],
+            "growth_mb": report["growth_mb"],
+            "figures": report["figures"],
+            "session_kb": report["sessions"]["max_kb"],
+        }
+        messages = []
+        for name, limit in self.thresholds.items():
+            value = observed[name]
+            crossed = value > limit
+            if crossed:
+                messages.append(f"{name} {value:g} exceeds {limit:g}")
+                if not self._crossed.get(name):
+                    top = report["top_since_start"][:3]
+                    logger.warning("Memory threshold crossed: %s (top growth: %s)", messages[-1],
+                                   ", ".join(f"{s['site']} +{s['diff_kb']} KB" for s in top) or "n/a")
+                    warnings.warn(f"Memory threshold crossed: {messages[-1]}", MemoryThresholdWarning, stacklevel=2)
+            self._crossed[name] = crossed
+        return messages
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception("Memory snapshot failed")
+
+
+def thresholds_from_env() -> Dict[str, float]:
+    out = {}
+    for name, env in THRESHOLD_ENVS.items():
+        raw = os.environ.get(env, "").strip()
+        if raw:
+            try:
+                out[name] = float(raw)
+            except ValueError:
+                logger.warning("Ignoring %s=%r: not a number", env, raw)
+    return out
+
+
+_profiler: Optional[MemoryProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_memory_profiler() -> Optional[MemoryProfiler]:
+    """
+    Return the process-wide MemoryProfiler, started on first call, or None
+    unless ``Z9_MEMPROFILE`` is set.
+    """
+    global _profiler
+    if _profiler is None:
+        if os.environ.get(ENABLED_ENV, "").lower() not in ("1", "true", "yes"):
+            return None
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = MemoryProfiler(
+                    interval=float(os.environ.get(INTERVAL_ENV, 60) or 60),
+                    thresholds=thresholds_from_env(),
+                    log_path=os.environ.get(LOG_ENV) or None,
+                ).start()
+    return _profiler
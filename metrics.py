@@ -0,0 +1,130 @@
+# File: metrics.py
+"""
+Derived metrics for a scored profile, each computed lazily and at most once.
+
+analyze_profile returns the core scores. Everything derived from them (the
+dominant trait, harmonic convergence index, negiton damping, top-three
+triplet, average negation, the trait summary, and the report and log
+payloads) is a cached property here. The app, the charts, the PDF report, the
+assessment log and the scoring service read the same object instead of each
+recomputing its own copy, and the cheap metrics can be served without
+rendering anything.
+
+Metrics that depend only on the trait percentages live on TraitMetrics and
+are shared process-wide per percentage vector (trait_metrics), so a chart
+drawn for a profile reuses what the page already computed.
+"""
+from functools import cached_property, lru_cache
+from statistics import harmonic_mean
+from typing import Any, Dict, Tuple
+
+from trait_summary import summarize_trait
+
+
+class TraitMetrics:
+    """
+    Metrics derived from trait percentages alone.
+
+    Args:
+        traits: Trait percentages keyed by trait; key order is the chart label order.
+    """
+
+    def __init__(self, traits: Dict[str, float]):
+        self.traits = dict(traits)
+
+    @cached_property
+    def dominant(self) -> str:
+        """The highest trait (the first one on ties)."""
+        return max(self.traits, key=self.traits.get)
+
+    @cached_property
+    def harmonic_convergence(self) -> float:
+        """Harmonic mean of the positive trait percentages (0 when there are none)."""
+        positive = [v for v in self.traits.values() if v > 0]
+        return harmonic_mean(positive) if positive else 0
+
+    @cached_property
+    def damping(self) -> Tuple[float, ...]:
+        """Negiton damping level per trait, in trait order."""
+        neg = [100 - v for v in self.traits.values()]
+        return tuple(100 * (1 - n/100)**2 for n in neg)
+
+    @cached_property
+    def triplet(self) -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+        """(labels, values) of the three highest traits, highest first."""
+        top3 = sorted(self.traits.items(), key=lambda x: x[1], reverse=True)[:3]
+        return tuple(zip(*top3)) if top3 else ((), ())
+
+
+@lru_cache(maxsize=1024)
+def _trait_metrics(items: Tuple[Tuple[str, float], ...]) -> TraitMetrics:
+    return TraitMetrics(dict(items))
+
+
+def trait_metrics(traits: Dict[str, float]) -> TraitMetrics:
+    """Return the shared TraitMetrics for these trait percentages."""
+    return _trait_metrics(tuple(traits.items()))
+
+
+class ProfileMetrics:
+    """
+    Derived metrics for one scored submission.
+
+    Args:
+        profile: analyze_profile result (or the equivalent outcome-table profile).
+        stage: Auto-mapped stage label ("Stage N").
+        mood: Mood 0-10 at submission time.
+    """
+
+    def __init__(self, profile: Dict[str, Any], stage: str, mood: int = 0):
+        self.profile = profile
+        self.stage = stage
+        self.mood = mood
+
+    @cached_property
+    def trait(self) -> TraitMetrics:
+        return trait_metrics(self.profile["traits"])
+
+    @cached_property
+    def summary(self) -> str:
+        """summarize_trait markdown for the profile."""
+        return summarize_trait(self.profile["traits"], self.stage, self.mood)
+
+    @cached_property
+    def negation_rate(self) -> int:
+        """Average negation level (%) of the negated traits, 0 when none are negated."""
+        negated = self.profile["negated"]
+        return round(sum(negated.values()) / len(negated)) if negated else 0
+
+    @cached_property
+    def report_data(self) -> Dict[str, Any]:
+        """Report fields for pdf_export.generate_simple_report (charts are added by the caller)."""
+        return {
+            "trait_score": self.profile["trait_score"],
+            "harmony_ratio": self.profile["harmony_ratio"],
+            "stage": self.stage,
+            "trait_summary": self.summary,
+            "remedies": self.profile.get("remedies", {}),
+        }
+
+    def log_entry(self, timestamp: str) -> Dict[str, Any]:
+        """Assessment log entry (see utils.AssessmentLog) recorded at ``timestamp``."""
+        return {
+            "timestamp": timestamp,
+            "traits": self.profile["traits"],
+            "trait_score": self.profile["trait_score"],
+            "harmony_ratio": self.profile["harmony_ratio"],
+            "stage": self.stage,
+            "mood": self.mood,
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The cheap derived metrics, JSON-ready (nothing here renders a chart)."""
+        labels, values = self.trait.triplet
+        return {
+            "dominant": self.trait.dominant,
+            "harmonic_convergence": round(self.trait.harmonic_convergence, 2),
+            "damping": [round(v, 2) for v in self.trait.damping],
+            "triplet": dict(zip(labels, values)),
+            "negation_rate": self.negation_rate,
+        }
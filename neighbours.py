@@ -0,0 +1,495 @@
+# File: neighbours.py
+"""
+"Profiles like yours": nearest past assessments in D/I/S/C space.
+
+Trait percentages are integers 0-100, so millions of assessments collapse
+onto a few hundred thousand distinct vectors. The index keeps one point per
+distinct vector with its per-stage counts, bucketed on a 4-D grid of
+BUCKET-wide cells. A k-NN query scans the query's cell and then rings of
+cells around it, and it stops once the k nearest are inside the radius the
+rings are known to cover. With a dense cell that takes one or two rings,
+however many rows are indexed. In a sparse region, once the rings have
+visited cells and points worth BRUTE_FORCE_SHARE of the index, the query
+scans every point in one vectorized pass instead, which bounds the worst
+case.
+
+The index reads its rows from the columnar trait store (traitstore.py) and
+keeps the store's row count as a cursor. An update compacts new log entries
+into the store, folds only the rows past the cursor into the index, and
+atomically replaces the index file. The app maps the file and picks up a new
+version on its next query. Updates run on their own: the first
+get_neighbour_index() call in a process starts a daemon thread that updates
+every ``Z9_NEIGHBOUR_REFRESH`` seconds (default 300; 0 turns it off and
+leaves updates to ``python neighbours.py update``). Only the process holding
+the ``.refresher`` lock file updates; the others retry the lock each interval
+and take over if that process exits. Compaction is followed by a merge of
+small store segments, so periodic updates do not pile up tiny segments. An
+update with no new log entries writes nothing.
+
+File layout (little-endian): a 64-byte header (magic, version, bucket,
+point count, rows indexed), then 64-byte-aligned arrays: ``cell_start``
+(int64, one per grid cell plus one, so cell n's points are
+cell_start[n]:cell_start[n+1]), ``vectors`` (u1, points x 4) and ``stages``
+(<u4, points x 9: row counts for stage 0 = unknown through 8).
+
+    python neighbours.py update           # compact the log, absorb new rows
+    python neighbours.py query 40 20 25 15 -k 50
+    python neighbours.py info
+"""
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from content import TRAITS
+from traitstore import SEGMENT_ROWS, TraitStore, get_trait_store
+from utils import locked, try_lock
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = "neighbour_index.bin"
+INDEX_PATH_ENV = "Z9_NEIGHBOUR_INDEX"
+REFRESH_ENV = "Z9_NEIGHBOUR_REFRESH"
+REFRESH_INTERVAL = 300.0
+MAGIC = b"Z9NN"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQ")
+HEADER_SIZE = 64
+ALIGN = 64
+
+BUCKET = 5               # grid cell width in percentage points
+NEIGHBOURS = 50          # default k
+NEGATED_BELOW = 25       # analyze_profile's negation threshold
+BRUTE_FORCE_SHARE = 0.25  # scan every point once the rings have visited this share of them
+STAGES = 9               # stage 0 (unknown) through 8
+_SPAN = 101              # trait values 0-100
+_VECTORS = _SPAN ** 4
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _grid(bucket: int) -> int:
+    return (_SPAN - 1) // bucket + 1
+
+
+@lru_cache(maxsize=64)
+def _ring(r: int) -> np.ndarray:
+    """Cell offsets at Chebyshev distance exactly ``r`` (one row per cell)."""
+    axis = np.arange(-r, r + 1)
+    offsets = np.stack(np.meshgrid(axis, axis, axis, axis, indexing="ij"), -1).reshape(-1, 4)
+    offsets = offsets[np.abs(offsets).max(1) == r]
+    offsets.setflags(write=False)
+    return offsets
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenated aranges start:end for each pair."""
+    lengths = ends - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    if not len(lengths):
+        return np.empty(0, np.int64)
+    shift = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shift + np.arange(int(lengths.sum()))
+
+
+class NeighbourIndex:
+    """
+    Grid-bucketed distinct trait vectors with stage counts; ``query`` finds
+    the k nearest past assessments.
+
+    Args:
+        bucket: Grid cell width.
+        rows: Trait store rows folded in (the update cursor).
+        cell_start: Point offsets per grid cell (see module docstring).
+        vectors: (points, 4) trait percentages, grouped by cell.
+        stages: (points, 9) row counts per stage number.
+    """
+
+    def __init__(self, bucket: int, rows: int, cell_start: np.ndarray, vectors: np.ndarray, stages: np.ndarray):
+        self.bucket = bucket
+        self.grid = _grid(bucket)
+        self.rows = rows
+        # Plain ndarray views: memmap's subclass hooks cost more than the lookups.
+        self.cell_start = np.asarray(cell_start)
+        self.vectors = np.asarray(vectors)
+        self.stages = np.asarray(stages)
+        self.counts = stages.sum(1, dtype=np.int64)
+        self.total = int(self.counts.sum())
+        self._strides = self.grid ** np.arange(3, -1, -1)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "NeighbourIndex":
+        with open(path, "rb") as f:
+            magic, version, bucket, points, rows = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a neighbour index (version {VERSION})")
+        cells = _grid(bucket) ** 4 + 1
+        offset = HEADER_SIZE
+        cell_start = np.memmap(path, np.int64, "r", offset, (cells,))
+        offset = _aligned(offset + cell_start.nbytes)
+        if not points:
+            return cls(bucket, rows, cell_start, np.empty((0, 4), np.uint8), np.empty((0, STAGES), np.uint32))
+        vectors = np.memmap(path, np.uint8, "r", offset, (points, 4))
+        offset = _aligned(offset + vectors.nbytes)
+        stages = np.memmap(path, np.dtype("<u4"), "r", offset, (points, STAGES))
+        return cls(bucket, rows, cell_start, vectors, stages)
+
+    @classmethod
+    def empty(cls, bucket: int = BUCKET) -> "NeighbourIndex":
+        return cls(bucket, 0, np.zeros(_grid(bucket) ** 4 + 1, np.int64),
+                   np.empty((0, 4), np.uint8), np.empty((0, STAGES), np.uint32))
+
+    @classmethod
+    def from_rows(cls, traits: np.ndarray, stages: np.ndarray, bucket: int = BUCKET) -> "NeighbourIndex":
+        """An in-memory index of (n, 4) trait percentages and (n,) stage numbers."""
+        keys, counts = np.unique(_pack(np.asarray(traits), np.asarray(stages, np.int64)), return_counts=True)
+        return cls.empty(bucket).merged(keys, counts, len(traits))
+
+    def _order_keys(self, vectors: np.ndarray) -> np.ndarray:
+        """Sort keys of the point order: grid cell, then vector."""
+        return ((vectors // self.bucket).astype(np.int64) @ self._strides) * _VECTORS + _vector_keys(vectors)
+
+    def merged(self, keys: np.ndarray, counts: np.ndarray, rows: int) -> "NeighbourIndex":
+        """
+        A copy with more assessments added.
+
+        Existing points keep their order and new vectors are inserted where
+        they sort, so an update costs a copy of the index, not a re-sort.
+
+        Args:
+            keys: Distinct packed (vector, stage) keys (see _pack).
+            counts: Assessments per key.
+            rows: The new update cursor.
+        """
+        order_keys, inverse = np.unique(self._order_keys(_unpack(keys // STAGES)), return_inverse=True)
+        current = self._order_keys(self.vectors)
+        pos = np.searchsorted(current, order_keys)
+        new = pos == len(current)
+        new[~new] = current[pos[~new]] != order_keys[~new]
+        merged_keys = np.insert(current, pos[new], order_keys[new])
+        vectors = np.insert(self.vectors, pos[new], _unpack(order_keys[new] % _VECTORS), axis=0)
+        stages = np.insert(self.stages, pos[new], 0, axis=0)
+        np.add.at(stages, (np.searchsorted(merged_keys, order_keys)[inverse], keys % STAGES), counts)
+        cell_start = np.zeros_like(self.cell_start)
+        np.cumsum(np.bincount(merged_keys // _VECTORS, minlength=len(cell_start) - 1), out=cell_start[1:])
+        return NeighbourIndex(self.bucket, rows, cell_start, vectors, stages)
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.bucket, len(self.vectors), self.rows).ljust(HEADER_SIZE, b"\0"))
+            for arr in (self.cell_start, self.vectors, self.stages):
+                f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+                f.write(np.ascontiguousarray(arr).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def query(self, traits: Dict[str, float], k: int = NEIGHBOURS) -> Optional[Dict[str, Any]]:
+        """
+        Summarize the ``k`` past assessments nearest to ``traits`` (Euclidean).
+
+        Assessments tied with the k-th nearest count fractionally, so the
+        summary covers exactly k and does not depend on storage order.
+
+        Args:
+            traits: Trait percentages keyed by trait.
+            k: Neighbours to summarize.
+
+        Returns:
+            None when the index is empty, else {"neighbours": k used,
+            "distance": distance of the farthest one, "stages": {"Stage N":
+            share of the neighbours with a known stage}, "top_stage",
+            "remedies": {trait: share of the neighbours with that trait
+            negated}}, both maps sorted by share, largest first.
+        """
+        k = min(k, self.total)
+        if k <= 0:
+            return None
+        q = np.clip([float(traits.get(t, 0)) for t in TRAITS], 0, _SPAN - 1)
+        home = (q // self.bucket).astype(np.int64)
+        found: List[np.ndarray] = []
+        dist: List[np.ndarray] = []
+        r = 0
+        visited = 0
+        while True:
+            if visited + len(_ring(r)) > len(self.vectors) * BRUTE_FORCE_SHARE:
+                # Sparse region: the rings have cost about as much as one
+                # vectorized pass over every point, which bounds the worst case.
+                d2 = _squared_distances(self.vectors, q)
+                # The k nearest points hold the k-th nearest assessment (see
+                # below), so only points up to the farthest of them matter.
+                if k < len(d2):
+                    bound = d2[np.argpartition(d2, k - 1)[:k]].max()
+                    points = np.flatnonzero(d2 <= bound)
+                else:
+                    points = np.arange(len(d2))
+                found, dist = [points], [d2[points]]
+                break
+            cells = home + _ring(r)
+            cells = cells[((cells >= 0) & (cells < self.grid)).all(1)] @ self._strides
+            points = _ranges(self.cell_start[cells], self.cell_start[cells + 1])
+            visited += len(_ring(r)) + len(points)
+            if len(points):
+                found.append(points)
+                dist.append(_squared_distances(self.vectors[points], q))
+            # Any point beyond ring r differs from q by more than r * bucket on some axis.
+            if r >= self.grid - 1:
+                break
+            if found:
+                d2 = np.concatenate(dist)
+                if self.counts[np.concatenate(found)][d2 <= (r * self.bucket) ** 2].sum() >= k:
+                    break
+            r += 1
+
+        points, d2 = np.concatenate(found), np.concatenate(dist)
+        counts = self.counts[points]
+        # Every point holds at least one assessment, so the k-th nearest
+        # assessment is among the k nearest points.
+        nearest = np.argpartition(d2, k - 1)[:k] if k < len(d2) else np.arange(len(d2))
+        nearest = nearest[np.argsort(d2[nearest])]
+        boundary = d2[nearest][np.searchsorted(np.cumsum(counts[nearest]), k)]
+        inside = d2 < boundary
+        tied = d2 == boundary
+        weight = inside.astype(np.float64)
+        weight[tied] = (k - counts[inside].sum()) / counts[tied].sum()
+        keep = weight > 0
+        points, weight = points[keep], weight[keep]
+
+        by_stage = weight @ self.stages[points]
+        negated = (weight * self.counts[points]) @ (self.vectors[points] < NEGATED_BELOW)
+        known = by_stage[1:].sum()
+        stages = {f"Stage {n}": round(float(v / known), 3) for n, v in enumerate(by_stage) if n and v > 0}
+        stages = dict(sorted(stages.items(), key=lambda kv: kv[1], reverse=True))
+        remedies = {t: round(float(v / k), 3) for t, v in zip(TRAITS, negated) if v > 0}
+        return {
+            "neighbours": k,
+            "distance": round(float(np.sqrt(boundary)), 2),
+            "stages": stages,
+            "top_stage": next(iter(stages), None),
+            "remedies": dict(sorted(remedies.items(), key=lambda kv: kv[1], reverse=True)),
+        }
+
+    def info(self) -> Dict[str, Any]:
+        occupied = int(np.count_nonzero(np.diff(self.cell_start)))
+        return {"rows": self.rows, "assessments": self.total, "points": len(self.vectors),
+                "bucket": self.bucket, "cells_occupied": occupied}
+
+
+def _squared_distances(vectors: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Squared Euclidean distance of each (n, 4) vector to ``q``, one column at a time."""
+    d2 = (vectors[:, 0] - q[0]) ** 2
+    for axis in range(1, 4):
+        d2 += (vectors[:, axis] - q[axis]) ** 2
+    return d2
+
+
+def _vector_keys(vectors: np.ndarray) -> np.ndarray:
+    v = vectors.astype(np.int64)
+    return ((v[:, 0] * _SPAN + v[:, 1]) * _SPAN + v[:, 2]) * _SPAN + v[:, 3]
+
+
+def _unpack(vector_keys: np.ndarray) -> np.ndarray:
+    vectors = np.empty((len(vector_keys), 4), np.uint8)
+    rest = vector_keys
+    for axis in range(3, -1, -1):
+        rest, vectors[:, axis] = np.divmod(rest, _SPAN)
+    return vectors
+
+
+def _pack(vectors: np.ndarray, stage: np.ndarray) -> np.ndarray:
+    """One int64 key per (trait vector, stage number) pair."""
+    return _vector_keys(vectors) * STAGES + stage
+
+
+def update_index(
+    path: str = INDEX_PATH,
+    store: Optional[TraitStore] = None,
+    bucket: int = BUCKET,
+    compact: bool = True
+) -> Dict[str, Any]:
+    """
+    Fold trait store rows added since the last update into the index file.
+
+    The index is rebuilt from scratch when it does not exist, uses another
+    bucket width, or is ahead of the store (the store was rebuilt).
+
+    Args:
+        path: Index file.
+        store: Source store (default: the process-wide one).
+        bucket: Grid cell width for a new index.
+        compact: Compact new assessment-log entries into the store first,
+            then merge runs of segments smaller than SEGMENT_ROWS.
+
+    Returns:
+        {"added": rows folded in, **NeighbourIndex.info()}.
+    """
+    store = store or get_trait_store()
+    if compact and store.compact():
+        store.merge(max_rows=SEGMENT_ROWS)
+    with open(path + ".lock", "a") as lock_file, locked(lock_file.fileno()):
+        current = None
+        if os.path.exists(path):
+            try:
+                current = NeighbourIndex.load(path)
+            except (OSError, ValueError):
+                logger.exception("Rebuilding unreadable %s", path)
+        if current is not None and (current.bucket != bucket or current.rows > store.rows()):
+            logger.info("Rebuilding %s (bucket %d -> %d, %d rows indexed, %d in store)",
+                        path, current.bucket, bucket, current.rows, store.rows())
+            current = None
+        rebuild = current is None
+        current = current or NeighbourIndex.empty(bucket)
+
+        keys, counts = [], []
+        start = current.rows
+        added = 0
+        for cols, _ in store.scan(("D", "I", "S", "C", "stage"), start=start):
+            packed = _pack(np.stack([cols[t] for t in TRAITS], 1), cols["stage"].astype(np.int64))
+            unique, n = np.unique(packed, return_counts=True)
+            keys.append(unique)
+            counts.append(n)
+            added += len(packed)
+        if added or rebuild:
+            if keys:
+                unique, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+                totals = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(unique))
+                current = current.merged(unique, totals.astype(np.int64), start + added)
+            current.save(path)
+    _invalidate(path)
+    return {"added": added, **current.info()}
+
+
+class IndexRefresher:
+    """
+    Daemon thread that runs update_index every ``interval`` seconds while
+    this process holds the refresher lock (``path`` + ".refresher").
+
+    Args:
+        path: Index file.
+        interval: Seconds between updates.
+    """
+
+    def __init__(self, path: str = INDEX_PATH, interval: float = REFRESH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "IndexRefresher":
+        """Start the update thread (idempotent); the first update runs at once."""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="z9-neighbour-index", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        with open(self.path + ".refresher", "a") as lock_file:
+            while not self._stop.is_set():
+                if try_lock(lock_file.fileno()):
+                    break
+                self._stop.wait(self.interval)
+            while not self._stop.is_set():
+                try:
+                    result = update_index(self.path)
+                    if result["added"]:
+                        logger.info("Folded %d rows into %s", result["added"], self.path)
+                except Exception:
+                    logger.exception("Could not update %s", self.path)
+                self._stop.wait(self.interval)
+
+
+_index: Optional[NeighbourIndex] = None
+_index_stamp: Optional[Tuple[str, int, int]] = None
+_index_lock = threading.Lock()
+_refresher: Optional[IndexRefresher] = None
+
+
+def _invalidate(path: str) -> None:
+    global _index_stamp
+    with _index_lock:
+        if _index_stamp is not None and _index_stamp[0] == path:
+            _index_stamp = None
+
+
+def get_neighbour_index() -> Optional[NeighbourIndex]:
+    """
+    Return the process-wide index (``Z9_NEIGHBOUR_INDEX``, default
+    neighbour_index.bin), reloaded when the file has been replaced, or None
+    if it does not exist yet. The first call starts the IndexRefresher.
+    """
+    global _index, _index_stamp, _refresher
+    path = os.environ.get(INDEX_PATH_ENV) or INDEX_PATH
+    if _refresher is None:
+        with _index_lock:
+            if _refresher is None:
+                interval = float(os.environ.get(REFRESH_ENV, REFRESH_INTERVAL) or 0)
+                _refresher = IndexRefresher(path, interval)
+                if interval > 0:
+                    _refresher.start()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (path, st.st_mtime_ns, st.st_ino)
+    if stamp != _index_stamp:
+        with _index_lock:
+            if stamp != _index_stamp:
+                try:
+                    _index = NeighbourIndex.load(path)
+                except (OSError, ValueError):
+                    logger.exception("Could not load %s", path)
+                    _index = None
+                _index_stamp = stamp
+    return _index
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Nearest-neighbour index over past assessments.")
+    parser.add_argument("--path", default=os.environ.get(INDEX_PATH_ENV) or INDEX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    u = sub.add_parser("update", help="fold new trait store rows into the index")
+    u.add_argument("--bucket", type=int, default=BUCKET, help="grid cell width (a change rebuilds the index)")
+    u.add_argument("--no-compact", action="store_true", help="do not compact the assessment log first")
+    q = sub.add_parser("query", help="summarize the nearest past profiles")
+    for t in TRAITS:
+        q.add_argument(t, type=float)
+    q.add_argument("-k", type=int, default=NEIGHBOURS)
+    sub.add_parser("info", help="print index size")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    started = time.perf_counter()
+    if args.command == "update":
+        result: Any = update_index(args.path, bucket=args.bucket, compact=not args.no_compact)
+    else:
+        index = NeighbourIndex.load(args.path)
+        if args.command == "info":
+            result = index.info()
+        else:
+            result = index.query({t: getattr(args, t) for t in TRAITS}, args.k)
+    print(json.dumps(result, indent=2))
+    logger.info("%s took %.3f s", args.command, time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# File: outcome_table.py
+"""
+Precomputed scoring outcomes for every reachable quiz result.
+
+A submission answers QUIZ_SIZE questions drawn from the bank, each scoring one
+of the SCORE_MAP values, so only a finite set of raw (d, i, s, c) totals can
+occur. ``python outcome_table.py build`` enumerates that set, scores it, checks
+the result against the live scoring functions and writes a compact binary table;
+the app then scores a submission with one array index instead of running
+analyze_profile, map_disc_to_stage and summarize_trait.
+
+File layout (little-endian): a 16-byte preamble (magic, version, metadata
+length), UTF-8 JSON metadata, then 8-byte-aligned arrays ``cmin``, ``cmax``
+and ``base`` (one cell per (d, i, s)) followed by one fixed-width record per row.
+The table is memory-mapped, so loading it costs almost nothing.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from analyze_profile import analyze_profile, attach_remedies
+from batch_scoring import TRAIT_KEYS, SUBTRAIT_KEYS, analyze_profile_batch
+from content import QUIZ_SIZE, SCORE_MAP, get_content
+from trait_summary import summarize_trait
+from z9_spiral_logic import map_disc_to_stage
+
+logger = logging.getLogger(__name__)
+
+TABLE_PATH = "outcome_table.bin"
+MAGIC = b"Z9OT"
+VERSION = 2
+
+RECORD_DTYPE = np.dtype([
+    ("traits", "u1", (4,)),
+    ("harmony", "<u2"),    # harmony_ratio * 100
+    ("score", "<u2"),      # trait_score * 100
+    ("stage", "u1"),       # auto-mapped stage number 1–8
+    ("dominant", "u1"),    # index into TRAIT_KEYS of the top trait
+    ("stable", "<u2"),     # recursion stable_score * 100
+    ("iterations", "u1"),  # recursion passes used
+    ("converged", "u1"),   # recursion convergence flag
+])
+
+# Source files whose logic is baked into the table; any edit makes it stale.
+_SOURCE_FILES = ("analyze_profile.py", "batch_scoring.py", "z9_spiral_logic.py", "trait_summary.py")
+
+
+class Outcome(NamedTuple):
+    profile: Dict[str, Any]
+    stage: str
+    summary: str
+
+
+def _fingerprint(bank_counts: Dict[str, int]) -> str:
+    h = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in _SOURCE_FILES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    h.update(json.dumps([QUIZ_SIZE, sorted(SCORE_MAP.values()), bank_counts], sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _bank_counts() -> Dict[str, int]:
+    return {t: len(ix) for t, ix in get_content().questions_by_trait.items()}
+
+
+# ——— Build ——————————————————————————————————————————————————————————
+
+def reachable_mask(bank_counts: Dict[str, int], quiz_size: int = QUIZ_SIZE) -> np.ndarray:
+    """
+    Boolean 4-D mask over raw (d, i, s, c) totals that some quiz can produce.
+
+    Args:
+        bank_counts: Number of bank questions per trait.
+        quiz_size: Questions drawn per submission.
+
+    Returns:
+        A bool array of shape (M, M, M, M), M = max per-trait total + 1.
+    """
+    values = sorted(set(SCORE_MAP.values()))
+    caps = [min(bank_counts.get(t, 0), quiz_size) for t in TRAIT_KEYS]
+    size = max(values) * max(caps) + 1
+
+    # sums[n]: totals reachable with exactly n answers to one trait
+    sums = [np.zeros(size, bool)]
+    sums[0][0] = True
+    for _ in range(max(caps)):
+        nxt = np.zeros(size, bool)
+        for v in values:
+            nxt[v:] |= sums[-1][:size - v]
+        sums.append(nxt)
+
+    mask = np.zeros((size,) * 4, bool)
+    for nd, ni, ns in itertools.product(*(range(cap + 1) for cap in caps[:3])):
+        nc = quiz_size - nd - ni - ns
+        if 0 <= nc <= caps[3]:
+            mask |= (sums[nd][:, None, None, None] & sums[ni][None, :, None, None]
+                     & sums[ns][None, None, :, None] & sums[nc][None, None, None, :])
+    return mask
+
+
+def build_table(path: str = TABLE_PATH, verify_sample: int = 50_000) -> Dict[str, Any]:
+    """
+    Enumerate every reachable quiz outcome, score it, verify and write the table.
+
+    Args:
+        path: Output file path.
+        verify_sample: Rows checked against the live scalar functions
+            (0 for none, a negative value for every row).
+
+    Returns:
+        Build report: row count, file size, timings and verification result.
+    """
+    started = time.perf_counter()
+    bank_counts = _bank_counts()
+    mask = reachable_mask(bank_counts)
+    size = mask.shape[0]
+
+    # Rows are stored for the full c-range [cmin, cmax] of every (d, i, s) cell,
+    # so a lookup is base[d, i, s] + (c - cmin[d, i, s]).
+    has_any = mask.any(axis=3)
+    cmin = np.where(has_any, np.argmax(mask, axis=3), 0).astype(np.uint8)
+    cmax = np.where(has_any, size - 1 - np.argmax(mask[..., ::-1], axis=3), 0).astype(np.uint8)
+    span = np.where(has_any, cmax - cmin + 1, 0)
+    base = np.full(has_any.shape, -1, dtype=np.int32)
+    base[has_any] = np.concatenate([[0], np.cumsum(span[has_any])[:-1]])
+
+    cells = np.argwhere(has_any)
+    spans = span[has_any]
+    rows = np.repeat(cells, spans, axis=0)
+    offsets = np.arange(spans.sum()) - np.repeat(base[has_any], spans)
+    c_vals = np.repeat(cmin[has_any].astype(np.int64), spans) + offsets
+    raw = np.column_stack([rows, c_vals])
+
+    scored = analyze_profile_batch(raw)
+    records = np.zeros(len(raw), dtype=RECORD_DTYPE)
+    records["traits"] = scored["traits"]
+    records["harmony"] = np.rint(scored["harmony_ratio"] * 100)
+    records["score"] = np.rint(scored["trait_score"] * 100)
+    records["stage"] = scored["stage_index"]
+    records["dominant"] = np.argmax(scored["traits"], axis=1)
+    records["stable"] = np.rint(scored["stable_score"] * 100)
+    records["iterations"] = scored["recursion_iterations"]
+    records["converged"] = scored["recursion_converged"]
+    built = time.perf_counter()
+
+    summaries = []
+    for trait in TRAIT_KEYS:
+        traits = {t: (1 if t == trait else 0) for t in TRAIT_KEYS}
+        summaries.append(summarize_trait(traits, "", 0))
+
+    meta = {
+        "fingerprint": _fingerprint(bank_counts),
+        "size": size,
+        "rows": int(len(records)),
+        "reachable": int(mask.sum()),
+        "bank_counts": bank_counts,
+        "summaries": summaries,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    _write(path, meta, cmin, cmax, base, records)
+
+    table = OutcomeTable.load(path)
+    mismatches = table.verify(verify_sample, mask=mask)
+    finished = time.perf_counter()
+    return {
+        "path": path,
+        "rows": meta["rows"],
+        "reachable": meta["reachable"],
+        "file_bytes": os.path.getsize(path),
+        "build_seconds": round(built - started, 3),
+        "verify_seconds": round(finished - built, 3),
+        "verified_rows": len(raw) if verify_sample < 0 else min(verify_sample, len(raw)),
+        "mismatches": mismatches,
+    }
+
+
+def _aligned(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _write(path: str, meta: Dict[str, Any], cmin: np.ndarray, cmax: np.ndarray,
+           base: np.ndarray, records: np.ndarray) -> None:
+    blob = json.dumps(meta).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack("<4sIQ", MAGIC, VERSION, len(blob)))
+        f.write(blob)
+        for arr in (cmin, cmax, base, records):
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+    os.replace(tmp, path)
+
+
+# ——— Lookup ————————————————————————————————————————————————————————
+
+class OutcomeTable:
+    """
+    Memory-mapped outcome table; ``lookup`` scores a raw result in O(1).
+    """
+
+    def __init__(self, meta: Dict[str, Any], cmin: np.ndarray, cmax: np.ndarray,
+                 base: np.ndarray, records: np.ndarray):
+        self.meta = meta
+        self.size = meta["size"]
+        self.cmin = cmin
+        self.cmax = cmax
+        self.base = base
+        self.records = records
+        self.summaries = meta["summaries"]
+        self._self_sub = [round(v * 0.6) for v in range(self.size)]
+        self._pair_sub = [round(v / 2) for v in range(2 * self.size - 1)]
+
+    @classmethod
+    def load(cls, path: str = TABLE_PATH) -> "OutcomeTable":
+        with open(path, "rb") as f:
+            magic, version, meta_len = struct.unpack("<4sIQ", f.read(16))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path}: not an outcome table (version {VERSION})")
+            meta = json.loads(f.read(meta_len).decode("utf-8"))
+        size = meta["size"]
+        offset = _aligned(16 + meta_len)
+        cmin = np.memmap(path, np.uint8, "r", offset, (size, size, size))
+        offset = _aligned(offset + cmin.nbytes)
+        cmax = np.memmap(path, np.uint8, "r", offset, (size, size, size))
+        offset = _aligned(offset + cmax.nbytes)
+        base = np.memmap(path, np.int32, "r", offset, (size, size, size))
+        offset = _aligned(offset + base.nbytes)
+        records = np.memmap(path, RECORD_DTYPE, "r", offset, (meta["rows"],))
+        return cls(meta, cmin, cmax, base, records)
+
+    def is_current(self) -> bool:
+        """True when the table was built from the current scoring code and question bank."""
+        return self.meta.get("fingerprint") == _fingerprint(_bank_counts())
+
+    def _row(self, d: int, i: int, s: int, c: int) -> int:
+        n = self.size
+        if not (0 <= d < n and 0 <= i < n and 0 <= s < n):
+            return -1
+        start = int(self.base[d, i, s])
+        lo = int(self.cmin[d, i, s])
+        if start < 0 or not lo <= c <= int(self.cmax[d, i, s]):
+            return -1
+        return start + c - lo
+
+    def lookup(self, d: float, i: float, s: float, c: float, remedy_file: str = "remedy_traits.json") -> Optional[Outcome]:
+        """
+        Score a raw result from the table.
+
+        Args:
+            d, i, s, c: Raw D/I/S/C totals.
+            remedy_file: Remedy metadata file, as for analyze_profile.
+
+        Returns:
+            An Outcome equal to analyze_profile / map_disc_to_stage / summarize_trait
+            for these totals, or None if the totals are outside the table.
+        """
+        raw = (d, i, s, c)
+        if not all(float(v).is_integer() for v in raw):
+            return None
+        d, i, s, c = (int(v) for v in raw)
+        row = self._row(d, i, s, c)
+        if row < 0:
+            return None
+        rec = self.records[row]
+        pcts = rec["traits"].tolist()
+        traits = dict(zip(TRAIT_KEYS, pcts))
+        totals = dict(zip(TRAIT_KEYS, (d, i, s, c)))
+        subtraits = {
+            key: self._self_sub[totals[key[0]]] if key[0] == key[1]
+            else self._pair_sub[totals[key[0]] + totals[key[1]]]
+            for key in SUBTRAIT_KEYS
+        }
+        trait_score = int(rec["score"]) / 100
+        remedies, product_links = attach_remedies(traits, remedy_file)
+        profile = {
+            "traits": traits,
+            "subtraits": subtraits,
+            "negated": {t: 100 - p for t, p in traits.items() if p < 25},
+            "harmony_ratio": int(rec["harmony"]) / 100,
+            "trait_score": trait_score,
+            "recursion_result": {"stable_score": int(rec["stable"]) / 100, "iterations": int(rec["iterations"]),
+                                 "converged": bool(rec["converged"])},
+            "remedies": remedies,
+            "product_links": product_links,
+        }
+        return Outcome(profile, f"Stage {int(rec['stage'])}", self.summaries[int(rec["dominant"])])
+
+    def verify(self, sample: int = 50_000, mask: Optional[np.ndarray] = None, seed: int = 0) -> int:
+        """
+        Compare table rows with the live scoring functions.
+
+        Args:
+            sample: Number of reachable outcomes to check (negative for all).
+            mask: Reachability mask (recomputed from the question bank if omitted).
+            seed: Sampling seed.
+
+        Returns:
+            Number of mismatching outcomes.
+        """
+        if mask is None:
+            mask = reachable_mask(self.meta["bank_counts"])
+        points = np.argwhere(mask)
+        if 0 <= sample < len(points):
+            points = points[np.random.default_rng(seed).choice(len(points), sample, replace=False)]
+        mismatches = 0
+        for d, i, s, c in points.tolist():
+            outcome = self.lookup(d, i, s, c)
+            live = analyze_profile(d, i, s, c)
+            if (outcome is None or outcome.profile != live
+                    or outcome.stage != map_disc_to_stage(d, i, s, c)
+                    or outcome.summary != summarize_trait(live["traits"], outcome.stage, 0)):
+                mismatches += 1
+                if mismatches <= 5:
+                    logger.warning("Outcome table mismatch at %s", (d, i, s, c))
+        return mismatches
+
+
+_table: Optional[OutcomeTable] = None
+_table_checked = False
+
+
+def get_outcome_table(path: str = TABLE_PATH) -> Optional[OutcomeTable]:
+    """
+    Return the process-wide outcome table, or None if it is missing or stale.
+    """
+    global _table, _table_checked
+    if not _table_checked:
+        _table_checked = True
+        if os.path.exists(path):
+            try:
+                table = OutcomeTable.load(path)
+                if table.is_current():
+                    _table = table
+                else:
+                    logger.warning("%s is stale; rebuild with 'python outcome_table.py build'", path)
+            except (OSError, ValueError):
+                logger.exception("Could not load %s", path)
+    return _table
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or check the precomputed quiz outcome table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="enumerate, score, verify and write the table")
+    b.add_argument("--path", default=TABLE_PATH)
+    b.add_argument("--verify", type=int, default=50_000, help="rows to verify against live scoring (-1 = all)")
+    v = sub.add_parser("verify", help="check an existing table against live scoring")
+    v.add_argument("--path", default=TABLE_PATH)
+    v.add_argument("--sample", type=int, default=50_000, help="rows to check (-1 = all)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        report = build_table(args.path, args.verify)
+        print(json.dumps(report, indent=2))
+        return 1 if report["mismatches"] else 0
+
+    table = OutcomeTable.load(args.path)
+    stale = not table.is_current()
+    mismatches = table.verify(args.sample)
+    print(json.dumps({"path": args.path, "rows": table.meta["rows"], "stale": stale, "mismatches": mismatches}, indent=2))
+    return 1 if stale or mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,222 @@
 # ✅ File: pdf_export.py — for FREE app only
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Image, KeepTogether, Paragraph, SimpleDocTemplate, Spacer
+
+BRAND_COLOR = colors.HexColor("#4B0082")
+FOOTER_TEXT = "© 2025 KYLE DUSAN HENSON JR LC + YO SPARK: SOL ENSPIRATION LC — Licensed under Enterprise4Eternity, LC"
+
+
+def _register_fonts() -> Dict[str, str]:
+    """
+    Register a Unicode TrueType family once per process.
+
+    DejaVu ships with matplotlib (already a dependency); fall back to the
+    built-in Helvetica when it cannot be found.
+    """
+    try:
+        import matplotlib
+        ttf_dir = os.path.join(matplotlib.get_data_path(), "fonts", "ttf")
+        pdfmetrics.registerFont(TTFont("Z9Sans", os.path.join(ttf_dir, "DejaVuSans.ttf")))
+        pdfmetrics.registerFont(TTFont("Z9Sans-Bold", os.path.join(ttf_dir, "DejaVuSans-Bold.ttf")))
+        pdfmetrics.registerFont(TTFont("Z9Sans-Oblique", os.path.join(ttf_dir, "DejaVuSans-Oblique.ttf")))
+        pdfmetrics.registerFontFamily("Z9Sans", normal="Z9Sans", bold="Z9Sans-Bold",
+                                      italic="Z9Sans-Oblique", boldItalic="Z9Sans-Bold")
+        return {"regular": "Z9Sans", "bold": "Z9Sans-Bold"}
+    except Exception:
+        return {"regular": "Helvetica", "bold": "Helvetica-Bold"}
+
+
+class _ReportTemplate:
+    """Fonts, paragraph styles and page decorations shared by every report."""
+
+    def __init__(self):
+        fonts = _register_fonts()
+        base = getSampleStyleSheet()
+        self.fonts = fonts
+        self.title = ParagraphStyle("Z9Title", parent=base["Title"], fontName=fonts["bold"],
+                                    textColor=BRAND_COLOR, fontSize=20, leading=24)
+        self.heading = ParagraphStyle("Z9Heading", parent=base["Heading2"], fontName=fonts["bold"],
+                                      textColor=BRAND_COLOR, spaceBefore=12)
+        self.subheading = ParagraphStyle("Z9Sub", parent=base["Heading4"], fontName=fonts["bold"])
+        self.body = ParagraphStyle("Z9Body", parent=base["BodyText"], fontName=fonts["regular"],
+                                   fontSize=10.5, leading=14, spaceAfter=8)
+        self.caption = ParagraphStyle("Z9Caption", parent=self.body, fontSize=9, alignment=TA_CENTER,
+                                      textColor=colors.grey)
+
+    def decorate_page(self, canvas, doc) -> None:
+        canvas.saveState()
+        canvas.setFont(self.fonts["regular"], 7.5)
+        canvas.setFillColor(colors.grey)
+        canvas.drawCentredString(letter[0] / 2, 0.5 * inch, FOOTER_TEXT)
+        canvas.drawRightString(letter[0] - 0.75 * inch, 0.5 * inch - 10, f"Page {doc.page}")
+        canvas.restoreState()
+
+
+_template: Optional[_ReportTemplate] = None
+_template_lock = threading.Lock()
+
+
+def _get_template() -> _ReportTemplate:
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = _ReportTemplate()
+    return _template
+
+
+def _markdown_to_markup(text: str) -> str:
+    """Convert the small markdown subset used by summaries into reportlab markup."""
+    text = html.escape(text, quote=False)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text)
+    return text.replace("  \n", "<br/>").replace("\n", "<br/>")
+
+
+def _image(png: bytes, max_width: float, max_height: float) -> Image:
+    img = Image(io.BytesIO(png))
+    scale = min(max_width / img.imageWidth, max_height / img.imageHeight)
+    img.drawWidth = img.imageWidth * scale
+    img.drawHeight = img.imageHeight * scale
+    return img
+
+
+def _render(data: Dict[str, Any]) -> bytes:
+    t = _get_template()
+    story: List[Any] = [
+        Paragraph("Z9 Coach Free — Insight Report", t.title),
+        Spacer(1, 8),
+        Paragraph(f"<b>Composite Trait Score:</b> {data['trait_score']:.2f}", t.body),
+        Paragraph(f"<b>Harmony Ratio:</b> {data['harmony_ratio']:.2f}%", t.body),
+        Paragraph(f"<b>Stage:</b> {html.escape(str(data['stage']))}", t.body),
+        Paragraph("Your Trait Summary", t.heading),
+        Paragraph(_markdown_to_markup(data["trait_summary"]), t.body),
+    ]
+
+    charts = data.get("charts") or {}
+    if charts:
+        story.append(Paragraph("Your Charts", t.heading))
+        for title, png in charts.items():
+            story.append(KeepTogether([
+                _image(png, 5.5 * inch, 4.2 * inch),
+                Paragraph(html.escape(title), t.caption),
+            ]))
+
+    remedies = data.get("remedies") or {}
+    if remedies:
+        story.append(Paragraph("Your Remedies &amp; Coaching", t.heading))
+        for trait, r in remedies.items():
+            block = [Paragraph(f"{html.escape(trait)} Remedies", t.subheading)]
+            for label, field in (("Action", "action"), ("Rationale", "rationale"),
+                                 ("Sol Enspiration Advice", "mister_anu_advice"), ("Stage Tip", "stage_tip")):
+                if r.get(field):
+                    block.append(Paragraph(f"<b>{label}:</b> {html.escape(r[field])}", t.body))
+            story.append(KeepTogether(block))
+
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(
+        "Thank you for using Z9 Coach Free. For full visuals &amp; coaching, upgrade to Lite or Pro.", t.body))
+
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=letter, title="Z9 Insight Report", author="Z9 Insight Engine",
+                            leftMargin=0.75 * inch, rightMargin=0.75 * inch,
+                            topMargin=0.75 * inch, bottomMargin=0.9 * inch)
+    doc.build(story, onFirstPage=t.decorate_page, onLaterPages=t.decorate_page)
+    return buf.getvalue()
+
+
+def report_key(data: Dict[str, Any]) -> str:
+    """
+    Content hash of a report's inputs; equal inputs produce the same PDF.
+    """
+    h = hashlib.sha256()
+    plain = {k: v for k, v in data.items() if k != "charts"}
+    h.update(json.dumps(plain, sort_keys=True, default=str).encode("utf-8"))
+    for title, png in (data.get("charts") or {}).items():
+        h.update(title.encode("utf-8") + b"\0" + hashlib.sha256(png).digest())
+    return h.hexdigest()
+
+
+_report_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_report_cache_lock = threading.Lock()
+REPORT_CACHE_SIZE = 64
+_report_cache_counts = {"hits": 0, "misses": 0}
 
-import pdfkit
 
 def generate_simple_report(data):
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; padding: 30px; }}
-            h1 {{ color: #4B0082; }}
-            p {{ margin-bottom: 10px; }}
-        </style>
-    </head>
-    <body>
-        <h1>Z9 Coach Free — Insight Report</h1>
-        <p><strong>Composite Trait Score:</strong> {data['trait_score']:.2f}</p>
-        <p><strong>Harmony Ratio:</strong> {data['harmony_ratio']:.2f}%</p>
-        <p><strong>Stage:</strong> {data['stage']}</p>
-        <h2>Your Trait Summary</h2>
-        <p>{data['trait_summary']}</p>
-        <p>Thank you for using Z9 Coach Free. For full visuals & coaching, upgrade to Lite or Pro.</p>
-    </body>
-    </html>
     """
-    pdf_bytes = pdfkit.from_string(html, False)
+    Render the insight report PDF, memoized by the hash of its contents.
+
+    Args:
+        data: Report fields: trait_score, harmony_ratio, stage and trait_summary
+            (markdown), plus optional charts (title -> PNG bytes) and remedies
+            (trait -> remedy metadata).
+
+    Returns:
+        The PDF document as bytes.
+    """
+    key = report_key(data)
+    pdf_bytes = cached_report(key)
+    if pdf_bytes is None:
+        pdf_bytes = _render(data)
+        store_report(key, pdf_bytes)
     return pdf_bytes
+
+
+def cached_report(key: str) -> Optional[bytes]:
+    """Return the memoized PDF for a report_key, or None (counted as a miss)."""
+    with _report_cache_lock:
+        pdf_bytes = _report_cache.get(key)
+        if pdf_bytes is not None:
+            _report_cache.move_to_end(key)
+            _report_cache_counts["hits"] += 1
+            return pdf_bytes
+        _report_cache_counts["misses"] += 1
+        return None
+
+
+def store_report(key: str, pdf_bytes: bytes) -> None:
+    """Memoize a PDF rendered elsewhere (e.g. in a render worker) under its report_key."""
+    with _report_cache_lock:
+        _report_cache[key] = pdf_bytes
+        _report_cache.move_to_end(key)
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+
+
+def render_report(data: Dict[str, Any]) -> bytes:
+    """Render the report PDF without consulting the memo cache."""
+    return _render(data)
+
+
+def report_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counters and the current size of the report cache."""
+    with _report_cache_lock:
+        hits, misses = _report_cache_counts["hits"], _report_cache_counts["misses"]
+        return {
+            "entries": len(_report_cache),
+            "bytes": sum(len(v) for v in _report_cache.values()),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+def warm() -> None:
+    """Register fonts, build the shared styles and render one throwaway report."""
+    _render({"trait_score": 0.0, "harmony_ratio": 0.0, "stage": "Stage 1", "trait_summary": ""})
@@ -0,0 +1,227 @@
+# File: plotly_charts.py
+"""
+Plotly figure specs for the visuals.py charts, drawn in the browser.
+
+Each function mirrors its matplotlib counterpart in visuals.py (same inputs,
+titles, labels, colours and layout) but returns a plain ``{"data", "layout"}``
+dict instead of rasterizing on the server. Building a spec costs
+microseconds; Streamlit ships it to the client as JSON.
+
+Select this backend with ``Z9_CHART_BACKEND=plotly`` (see visuals.chart_backend).
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import trait_metrics
+from visuals import development_path_rows, trend_series
+
+# matplotlib's default colour cycle, so both backends colour series alike.
+MPL_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+              "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"]
+PX_PER_INCH = 100
+
+Spec = Dict[str, Any]
+
+
+def _rgba(hex_color: str, alpha: float) -> str:
+    r, g, b = (int(hex_color[k:k + 2], 16) for k in (1, 3, 5))
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def _layout(title: str, height_in: float = 4.8, **extra: Any) -> Dict[str, Any]:
+    # Width follows the Streamlit container; heights match the matplotlib figsize.
+    layout = {
+        "title": {"text": title, "x": 0.5, "xanchor": "center"},
+        "height": int(height_in * PX_PER_INCH),
+        "colorway": MPL_COLORS,
+        "paper_bgcolor": "white",
+        "plot_bgcolor": "white",
+        "showlegend": False,
+        "margin": {"l": 40, "r": 40, "t": 60, "b": 40},
+    }
+    layout.update(extra)
+    return layout
+
+
+def _polar_axes(labels: List[str], degrees: List[float]) -> Dict[str, Any]:
+    # matplotlib polar axes: 0 rad at east, counter-clockwise, radial tick labels hidden.
+    return {
+        "angularaxis": {"rotation": 0, "direction": "counterclockwise", "tickmode": "array",
+                        "tickvals": degrees, "ticktext": labels},
+        "radialaxis": {"showticklabels": False, "ticks": ""},
+    }
+
+
+def radar_spec(traits: Dict[str, float], title: str = "DISC Radar Chart") -> Spec:
+    labels = list(traits.keys())
+    values = list(traits.values()) + [list(traits.values())[0]]
+    degrees = [n * 360 / len(labels) for n in range(len(labels))]
+    return {
+        "data": [{
+            "type": "scatterpolar", "r": values, "theta": degrees + [degrees[0]], "mode": "lines",
+            "line": {"color": MPL_COLORS[0], "width": 2},
+            "fill": "toself", "fillcolor": _rgba(MPL_COLORS[0], 0.25), "hoverinfo": "skip",
+        }],
+        "layout": _layout(title, 6, polar=_polar_axes(labels, degrees)),
+    }
+
+
+def spiral_spec(
+    traits: Dict[str, float],
+    recursion_score: float = 3.0,
+    negated_traits: Optional[Dict[str, float]] = None,
+    title: str = "Z9 Spiral Projection"
+) -> Spec:
+    labels = list(traits.keys())
+    degrees = [n * 360 / len(labels) for n in range(len(labels) + 1)]
+    base = [traits[t] / 100 * recursion_score for t in labels]
+    data = [{
+        "type": "scatterpolar", "name": "Traits", "r": base + [base[0]], "theta": degrees, "mode": "lines",
+        "line": {"color": MPL_COLORS[0], "width": 2},
+        "fill": "toself", "fillcolor": _rgba(MPL_COLORS[0], 0.2),
+    }]
+    if negated_traits:
+        neg = [negated_traits.get(t, 0) / 100 * recursion_score for t in labels]
+        data.append({
+            "type": "scatterpolar", "name": "Negation", "r": neg + [neg[0]], "theta": degrees, "mode": "lines",
+            "line": {"color": "red", "dash": "dash"},
+            "fill": "toself", "fillcolor": "rgba(255,0,0,0.1)",
+        })
+    return {
+        "data": data,
+        "layout": _layout(title, 6, polar=_polar_axes(labels, degrees[:-1]), showlegend=True,
+                          legend={"x": 1, "y": 1, "xanchor": "right", "yanchor": "top"}),
+    }
+
+
+def stage_map_spec(
+    current_index: int,
+    next_index: int,
+    labels: Optional[List[str]] = None,
+    title: str = "Eriksonian Stage Progress Map"
+) -> Spec:
+    if labels is None:
+        labels = [f"Stage {i+1}" for i in range(8)]
+    radius = 2.5
+    angles = [2 * math.pi * i / len(labels) for i in range(len(labels))]
+    colors = ["green" if i == current_index else "blue" if i == next_index else "gray" for i in range(len(labels))]
+    return {
+        "data": [{
+            "type": "scatter", "mode": "text", "text": labels, "hoverinfo": "skip",
+            "x": [radius * math.cos(a) for a in angles], "y": [radius * math.sin(a) for a in angles],
+            "textfont": {"size": 13, "color": colors},
+        }],
+        "layout": _layout(title, 6, xaxis={"visible": False}, yaxis={"visible": False, "scaleanchor": "x"}),
+    }
+
+
+def development_path_spec(
+    perceived_idx: int,
+    auto_idx: int,
+    ee_summaries: Dict[str, Dict],
+    path_map: Dict[str, Dict],
+    dominant_trait: str
+) -> Spec:
+    stages, obstacles, actions, summaries = development_path_rows(
+        perceived_idx, auto_idx, ee_summaries, path_map, dominant_trait
+    )
+    y_pos = list(range(len(stages)))[::-1]
+    annotations, shapes = [], []
+
+    def text(x: float, y: float, body: str, size: int) -> None:
+        annotations.append({"x": x, "y": y, "text": body, "showarrow": False, "xanchor": "left",
+                            "yanchor": "bottom", "align": "left", "font": {"size": size * 1.3}})
+
+    for idx, (stg, obs, act, summ, y) in enumerate(zip(stages, obstacles, actions, summaries, y_pos)):
+        text(0.02, y, f"<b>{stg}</b>", 12)
+        text(0.20, y, f"Obstacle: {obs}", 10)
+        text(0.20, y - 0.3, f"Action: {act}", 10)
+        text(0.20, y - 0.6, f"<i>Context: {summ}</i>", 9)
+        if idx < len(stages) - 1:
+            shapes.append({"type": "line", "x0": 0.05, "x1": 0.05, "y0": y - 0.1, "y1": y_pos[idx + 1] + 0.1,
+                           "line": {"color": "black", "width": 1.5}})
+    return {
+        # Annotations and shapes do the drawing; plotly still wants one trace.
+        "data": [{"type": "scatter", "x": [], "y": [], "mode": "markers", "hoverinfo": "skip"}],
+        "layout": _layout("Your Development Journey", max(len(stages) * 1.2, 2.4),
+                          annotations=annotations, shapes=shapes,
+                          xaxis={"visible": False, "range": [0, 1]},
+                          yaxis={"visible": False, "range": [-1, len(stages)]}),
+    }
+
+
+def harmonic_convergence_spec(traits: Dict[str, float]) -> Spec:
+    hm = trait_metrics(traits).harmonic_convergence
+    return {
+        "data": [{"type": "bar", "orientation": "h", "x": [hm], "y": ["Harmonic Convergence"],
+                  "marker": {"color": MPL_COLORS[0]}}],
+        "layout": _layout(f"Harmonic Convergence Index: {hm:.2f}", xaxis={"range": [0, 100], "showline": True,
+                                                                          "mirror": True, "linecolor": "black"},
+                          yaxis={"showline": True, "mirror": True, "linecolor": "black"}),
+    }
+
+
+def negiton_damping_spec(traits: Dict[str, float]) -> Spec:
+    return {
+        "data": [{"type": "scatter", "mode": "lines+markers", "x": list(traits.keys()),
+                  "y": list(trait_metrics(traits).damping), "line": {"color": MPL_COLORS[0]}}],
+        "layout": _layout("Negiton Rest-Phase Damping",
+                          xaxis={"showline": True, "mirror": True, "linecolor": "black"},
+                          yaxis={"title": {"text": "Damping Level"}, "showline": True, "mirror": True,
+                                 "linecolor": "black"}),
+    }
+
+
+def triplet_state_spec(traits: Dict[str, float]) -> Spec:
+    labels, values = trait_metrics(traits).triplet
+    return {
+        "data": [{"type": "pie", "labels": list(labels), "values": list(values), "sort": False,
+                  "direction": "counterclockwise", "rotation": 90,  # matplotlib starts at 3 o'clock
+                  "marker": {"colors": MPL_COLORS[:len(labels)]},
+                  "texttemplate": "%{label}<br>%{percent:.1%}", "textposition": "inside"}],
+        "layout": _layout("Triplet State Distribution"),
+    }
+
+
+def trait_trend_spec(points: Tuple[Tuple, ...], title: str = "Your Traits Over Time") -> Spec:
+    dates, series, stages = trend_series(points)
+    data = [{"type": "scatter", "mode": "lines+markers", "name": trait, "x": dates, "y": values}
+            for trait, values in series.items()]
+    data.append({"type": "scatter", "mode": "lines", "name": "Stage", "x": dates, "y": stages, "yaxis": "y2",
+                 "line": {"shape": "hvh", "dash": "dash", "color": "gray"}, "opacity": 0.6})
+    return {
+        "data": data,
+        "layout": _layout(title, showlegend=True,
+                          legend={"orientation": "h", "x": 0, "y": 1, "yanchor": "bottom"},
+                          xaxis={"type": "date", "tickangle": -30},
+                          yaxis={"title": {"text": "Trait %"}, "range": [0, 100]},
+                          yaxis2={"title": {"text": "Stage"}, "range": [0.5, 8.5], "overlaying": "y",
+                                  "side": "right", "showgrid": False}),
+    }
+
+
+CHART_SPECS: Dict[str, Callable[..., Spec]] = {
+    "radar": radar_spec,
+    "spiral": spiral_spec,
+    "stage_map": stage_map_spec,
+    "development_path": development_path_spec,
+    "harmonic_convergence": harmonic_convergence_spec,
+    "negiton_damping": negiton_damping_spec,
+    "triplet_state": triplet_state_spec,
+    "trait_trend": trait_trend_spec,
+}
+
+
+def chart_spec(name: str, *args: Any, **kwargs: Any) -> Spec:
+    """
+    Build the Plotly spec for a chart from visuals.CHART_FUNCTIONS.
+
+    Args:
+        name: Chart name, a key of CHART_SPECS.
+        *args: Positional arguments, as for the matplotlib chart.
+        **kwargs: Keyword arguments, as for the matplotlib chart.
+
+    Returns:
+        A {"data": [...], "layout": {...}} figure dict.
+    """
+    return CHART_SPECS[name](*args, **kwargs)
@@ -0,0 +1,312 @@
+# File: render_pool.py
+"""
+Worker-process pool for chart and PDF rendering.
+
+matplotlib and reportlab are CPU-bound and hold the GIL, so rendering inline
+on Streamlit's script threads serializes concurrent sessions. With
+``Z9_RENDER_WORKERS=N`` (N > 0), charts and reports are rendered in N warm
+worker processes (matplotlib, fonts and the report template pre-loaded) and
+results are handed back as each completes.
+
+The parent keeps the existing caches: only cache misses are sent to the
+pool, and results are stored in the chart cache / report memo as usual.
+At most one task per worker is submitted at a time, across all sessions. A
+task not done ``Z9_RENDER_TIMEOUT`` seconds after it was submitted, or a
+pool that breaks, falls back to inline rendering; a pool with a task still
+running past its timeout is recycled, stopping its workers by the PIDs
+they report on start-up.
+
+Workers start from a fork server (spawn where unavailable), never by forking
+the threaded Streamlit process.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Deque, Dict, Hashable, Iterator, Optional, Tuple
+
+import visuals
+from content import thaw
+from telemetry import get_recorder
+
+logger = logging.getLogger(__name__)
+
+WORKERS_ENV = "Z9_RENDER_WORKERS"
+TIMEOUT_ENV = "Z9_RENDER_TIMEOUT"
+DEFAULT_TIMEOUT = 30.0
+
+ChartRequest = Tuple[str, Tuple, Dict[str, Any]]  # (chart name, args, kwargs)
+
+
+# ——— Worker side ———————————————————————————————————————————————————
+
+def _init_worker(pids) -> None:
+    import pdf_export
+    from matplotlib import font_manager
+
+    pids.put(os.getpid())  # lets the parent stop this worker if a task hangs
+
+    visuals.plt.load()
+    font_manager.fontManager  # builds or loads the font cache
+    pdf_export.warm()
+
+
+def _render_chart_task(name: str, args: Tuple, kwargs: Dict[str, Any], fmt: str) -> bytes:
+    return visuals.figure_to_bytes(visuals.CHART_FUNCTIONS[name](*args, **kwargs), fmt)
+
+
+def _render_report_task(data: Dict[str, Any]) -> bytes:
+    import pdf_export
+    return pdf_export.render_report(data)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ——— Parent side ———————————————————————————————————————————————————
+
+class RenderPool:
+    """
+    Process pool that renders charts and reports, with inline fallback.
+
+    Args:
+        workers: Number of worker processes.
+        timeout: Seconds a single task may take before it is rendered inline instead.
+    """
+
+    def __init__(self, workers: int, timeout: float = DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self.fallbacks = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid_queue: Any = None
+        self._lock = threading.Lock()
+        # At most one task per worker is submitted, so a submitted task is
+        # running rather than queued behind others, and an overrun means a
+        # stuck worker.
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pid_queue = ctx.Queue()
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_init_worker,
+                                                     initargs=(self._pid_queue,))
+            return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a pool with a stuck or dead worker; the next task starts a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor, pid_queue = None, self._pid_queue
+            self._pid_queue = None
+        # ProcessPoolExecutor cannot cancel a running task, so stop its workers
+        # by the PIDs they reported on start-up.
+        while True:
+            try:
+                pid = pid_queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        pid_queue.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take a worker slot: at once, or within ``timeout`` seconds when given."""
+        return self._slots.acquire(timeout=timeout) if timeout is not None else self._slots.acquire(False)
+
+    def _submit(self, fn, *args: Any) -> Tuple[Optional[Future], Optional[ProcessPoolExecutor]]:
+        """Submit ``fn`` on a slot the caller holds; the slot is freed when the task ends."""
+        try:
+            executor = self._pool()
+            future = executor.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError, OSError):
+            self._slots.release()
+            logger.exception("Render pool unavailable; rendering inline")
+            executor = self._executor
+            if executor is not None:
+                self._recycle(executor)
+            return None, None
+        future.add_done_callback(lambda _: self._slots.release())
+        return future, executor
+
+    def warm(self) -> None:
+        """Start every worker now rather than on the first submission."""
+        futures = [self._submit(_ping)[0] for _ in range(self.workers) if self._acquire(self.timeout)]
+        wait([f for f in futures if f is not None], timeout=self.timeout)
+
+    def render_charts(
+        self,
+        requests: Dict[Hashable, ChartRequest],
+        fmt: str = "png"
+    ) -> Iterator[Tuple[Hashable, bytes]]:
+        """
+        Render charts in parallel, yielding (request key, image bytes) as each completes.
+
+        Cached charts are yielded first without touching the pool.
+
+        Args:
+            requests: Request key -> (chart name, args, kwargs) as for visuals.render_chart.
+            fmt: Image format.
+        """
+        started = time.perf_counter()
+        pending: Dict[Future, Tuple[Hashable, ChartRequest, Tuple, ProcessPoolExecutor, float]] = {}
+        waiting: Deque[Tuple[Hashable, Tuple]] = deque()
+        inline = []
+        for rkey, (name, args, kwargs) in requests.items():
+            ckey = visuals.chart_key(name, args, kwargs, fmt)
+            data = visuals.chart_cache.get(ckey)
+            if data is not None:
+                yield rkey, data
+                continue
+            waiting.append((rkey, ckey))
+
+        while waiting or pending:
+            # Submit while worker slots are free. With nothing of ours in
+            # flight, wait up to the timeout for another session to free one.
+            while waiting:
+                if not self._acquire(None if pending else self.timeout):
+                    if not pending:
+                        inline.extend(rkey for rkey, _ in waiting)
+                        waiting.clear()
+                    break
+                rkey, ckey = waiting.popleft()
+                name, args, kwargs = requests[rkey]
+                future, executor = self._submit(_render_chart_task, name, thaw(tuple(args)), thaw(kwargs), fmt)
+                if future is None:
+                    inline.append(rkey)
+                else:
+                    deadline = time.perf_counter() + self.timeout
+                    pending[future] = (rkey, (name, args, kwargs), ckey, executor, deadline)
+            if not pending:
+                break
+
+            next_deadline = min(entry[4] for entry in pending.values())
+            done, _ = wait(pending, timeout=max(0.0, next_deadline - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Overrun tasks finish inline. Only one task per worker is
+                # submitted, so an overrun task is running on a stuck worker:
+                # its pool is recycled (once) and the rest of it fails over below.
+                now = time.perf_counter()
+                overrun = [f for f, entry in pending.items() if entry[4] <= now]
+                stuck = set()
+                for future in overrun:
+                    rkey, _, _, executor, _ = pending.pop(future)
+                    if not future.cancel():
+                        stuck.add(executor)
+                    inline.append(rkey)
+                if overrun:
+                    logger.warning("Chart rendering exceeded %g s; finishing %d inline",
+                                   self.timeout, len(overrun))
+                for executor in stuck:
+                    self._recycle(executor)
+                continue
+            for future in done:
+                rkey, (name, _, _), ckey, executor, _ = pending.pop(future)
+                try:
+                    data = future.result()
+                except BrokenProcessPool:
+                    self._recycle(executor)
+                    inline.append(rkey)
+                    continue
+                except Exception:
+                    logger.exception("Render worker failed on %s; rendering inline", name)
+                    inline.append(rkey)
+                    continue
+                visuals.chart_cache.put(ckey, data)
+                get_recorder().record(f"pool.chart.{name}", time.perf_counter() - started)
+                yield rkey, data
+
+        for rkey in inline:
+            self.fallbacks += 1
+            name, args, kwargs = requests[rkey]
+            yield rkey, visuals.render_chart(name, *args, fmt=fmt, **kwargs)
+
+    def render_report(self, data: Dict[str, Any]) -> bytes:
+        """
+        Render (or fetch from the memo) the report PDF for ``data`` in a worker.
+        """
+        import pdf_export
+
+        key = pdf_export.report_key(data)
+        pdf_bytes = pdf_export.cached_report(key)
+        if pdf_bytes is not None:
+            return pdf_bytes
+        future, executor = None, None
+        if self._acquire(self.timeout):
+            future, executor = self._submit(_render_report_task, thaw(data))
+        if future is not None:
+            try:
+                pdf_bytes = future.result(timeout=self.timeout)
+            except (FuturesTimeout, BrokenProcessPool):
+                logger.warning("Report worker timed out or died; rendering inline")
+                self._recycle(executor)
+            except Exception:
+                logger.exception("Report render in worker failed; rendering inline")
+        if pdf_bytes is None:
+            self.fallbacks += 1
+            pdf_bytes = pdf_export.render_report(data)
+        pdf_export.store_report(key, pdf_bytes)
+        return pdf_bytes
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[RenderPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> Optional[RenderPool]:
+    """
+    Return the process-wide RenderPool, or None when ``Z9_RENDER_WORKERS`` is unset or 0.
+    """
+    global _pool
+    if _pool is None:
+        workers = int(os.environ.get(WORKERS_ENV, "0") or 0)
+        if workers <= 0:
+            return None
+        with _pool_lock:
+            if _pool is None:
+                _pool = RenderPool(workers, float(os.environ.get(TIMEOUT_ENV, DEFAULT_TIMEOUT)))
+    return _pool
+
+
+def render_charts(requests: Dict[Hashable, ChartRequest], fmt: str = "png") -> Iterator[Tuple[Hashable, bytes]]:
+    """
+    Yield (request key, image bytes) for each chart, through the pool when
+    enabled and inline (in request order) otherwise.
+    """
+    pool = get_render_pool()
+    if pool is not None:
+        yield from pool.render_charts(requests, fmt)
+        return
+    for rkey, (name, args, kwargs) in requests.items():
+        yield rkey, visuals.render_chart(name, *args, fmt=fmt, **kwargs)
+
+
+def render_report(data: Dict[str, Any]) -> bytes:
+    """Build the report PDF through the pool when enabled, inline otherwise (memoized either way)."""
+    pool = get_render_pool()
+    if pool is not None:
+        return pool.render_report(data)
+    import pdf_export
+    return pdf_export.generate_simple_report(data)
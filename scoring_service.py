@@ -0,0 +1,273 @@
+# File: scoring_service.py
+"""
+Headless JSON scoring service: analyze_profile, map_disc_to_stage and
+summarize_trait over HTTP, with no Streamlit, charting or PDF overhead.
+
+    python scoring_service.py --port 8080 --workers 4
+
+Endpoints:
+    GET  /healthz          -> {"status": "ok", "pid": ...}
+    POST /v1/score         {"d", "i", "s", "c", "stage_label"?, "mood"?, "include_remedies"?}
+    POST /v1/score/batch   {"profiles": [<score body>, ...], "include_remedies"?}
+
+Each result is {"profile": <analyze_profile result>, "stage": "Stage N",
+"summary": <summarize_trait markdown>, "metrics": <derived metrics>} (see
+metrics.ProfileMetrics.as_dict). Remedies and product links are static per
+trait and omitted unless ``include_remedies`` is true. With
+``Z9_CALIBRATED_STAGES`` set, "stage" is the population-calibrated stage
+(see calibration.py); scoring only reads the thresholds and never adds to
+the population.
+
+Connections are HTTP/1.1 keep-alive. With ``--workers N`` the parent binds
+the socket once and forks N single-process servers that accept from it;
+workers that die are replaced.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import signal
+import socket
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from analyze_profile import analyze_profile
+from calibration import calibrated_stage
+from content import get_content
+from metrics import ProfileMetrics
+from outcome_table import get_outcome_table
+from z9_spiral_logic import map_disc_to_stage
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_BATCH = 10_000
+
+
+class RequestError(ValueError):
+    """Client error reported as HTTP 400."""
+
+
+def _finite(value: Any, key: str) -> float:
+    """``value`` as a float, or RequestError unless it is a finite JSON number."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RequestError(f"'{key}' must be a finite number")
+    try:
+        number = float(value)  # a huge JSON integer overflows here
+    except OverflowError:
+        raise RequestError(f"'{key}' must be a finite number") from None
+    if not math.isfinite(number):
+        raise RequestError(f"'{key}' must be a finite number")
+    return number
+
+
+def _number(body: Dict[str, Any], key: str) -> float:
+    value = body.get(key)
+    if _finite(value, key) < 0:
+        raise RequestError(f"'{key}' must not be negative")
+    return value
+
+
+def score_one(body: Dict[str, Any], include_remedies: bool = False) -> Dict[str, Any]:
+    """
+    Score one submission.
+
+    Args:
+        body: Mapping with raw totals d, i, s, c and optional stage_label and mood.
+        include_remedies: Keep remedies and product_links in the profile.
+
+    Returns:
+        {"profile", "stage", "summary", "metrics"} as the app computes them.
+
+    Raises:
+        RequestError: If the body is malformed.
+    """
+    if not isinstance(body, dict):
+        raise RequestError("each profile must be a JSON object")
+    d, i, s, c = (_number(body, k) for k in ("d", "i", "s", "c"))
+    mood = body.get("mood", 5)
+    if not 0 <= _finite(mood, "mood") <= 10:
+        raise RequestError("'mood' must be between 0 and 10")
+
+    table = get_outcome_table()
+    outcome = table.lookup(d, i, s, c) if table else None
+    if outcome:
+        profile, stage = outcome.profile, outcome.stage
+    else:
+        profile = analyze_profile(d, i, s, c, stage_label=str(body.get("stage_label", "")))
+        stage = map_disc_to_stage(d, i, s, c)
+    stage = calibrated_stage(d, i, s, c, stage)
+    if not include_remedies:
+        profile = {k: v for k, v in profile.items() if k not in ("remedies", "product_links")}
+    metrics = ProfileMetrics(profile, stage, mood)
+    return {"profile": profile, "stage": stage, "summary": metrics.summary, "metrics": metrics.as_dict()}
+
+
+def score_batch(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Score a batch of submissions; see score_one for the per-item format.
+    """
+    profiles = body.get("profiles") if isinstance(body, dict) else None
+    if not isinstance(profiles, list):
+        raise RequestError("'profiles' must be a list")
+    if len(profiles) > MAX_BATCH:
+        raise RequestError(f"batch too large (max {MAX_BATCH})")
+    include = bool(body.get("include_remedies", False))
+    return {"results": [score_one(p, include) for p in profiles]}
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "Z9Scoring/1.0"
+
+    def do_GET(self) -> None:
+        if self.path == "/healthz":
+            return self._reply(200, {"status": "ok", "pid": os.getpid()})
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body's extent is unknown, so the connection cannot be reused.
+            self.close_connection = True
+            return self._reply(400, {"error": "invalid Content-Length"})
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._reply(413, {"error": "request body too large"})
+        raw = self.rfile.read(length)
+        try:
+            body = json.loads(raw or b"null")
+            if self.path == "/v1/score":
+                result = score_one(body, bool(isinstance(body, dict) and body.get("include_remedies")))
+            elif self.path == "/v1/score/batch":
+                result = score_batch(body)
+            else:
+                return self._reply(404, {"error": "not found"})
+        except json.JSONDecodeError as e:
+            return self._reply(400, {"error": f"invalid JSON: {e}"})
+        except RequestError as e:
+            return self._reply(400, {"error": str(e)})
+        except Exception:
+            logger.exception("Scoring failed")
+            return self._reply(500, {"error": "internal error"})
+        self._reply(200, result)
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(ScoringServer.request_queue_size)
+    return sock
+
+
+def _serve(sock: socket.socket) -> None:
+    server = ScoringServer(sock.getsockname()[:2], ScoringHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def warm() -> None:
+    """Load content and the outcome table before accepting traffic."""
+    get_content()
+    get_outcome_table()
+
+
+def run(host: str = "127.0.0.1", port: int = 8080, workers: int = 1) -> None:
+    """
+    Serve until interrupted.
+
+    Args:
+        host: Interface to bind.
+        port: Port to bind.
+        workers: Number of forked worker processes (1 serves in-process).
+    """
+    sock = _listen(host, port)
+    warm()
+    logger.info("Scoring service on http://%s:%d with %d worker(s)", host, sock.getsockname()[1], workers)
+    if workers <= 1 or not hasattr(os, "fork"):
+        _serve(sock)
+        return
+
+    children: Dict[int, int] = {}
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(sock)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+
+    for slot in range(workers):
+        spawn(slot)
+
+    stopping = False
+
+    def stop(*_: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            logger.warning("Worker %d exited; restarting", pid)
+            time.sleep(0.1)
+            spawn(slot)
+    sock.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Headless Z9 scoring service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    run(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
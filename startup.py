@@ -0,0 +1,202 @@
+# File: startup.py
+"""
+Cold-start helpers: deferred imports, an import-time report and an opt-in
+warm-up phase.
+
+Heavy dependencies (numpy, pandas, matplotlib, reportlab, requests) are
+reached through ``lazy_module`` proxies, so a new server process only pays
+for them on the first code path that needs them. Each deferred import is
+timed and recorded as an ``import.<module>`` span (see telemetry.py).
+
+Set ``Z9_WARMUP=1`` to load content, the outcome table, the matplotlib font
+cache, the chart/PDF templates and any render workers (see render_pool.py)
+on a background thread when the app process starts serving, so the first
+real user does not wait for them.
+
+    python startup.py report     # per-module import cost of the app, fresh interpreter
+    python startup.py warm       # run the warm-up once (also builds the on-disk font cache)
+"""
+import argparse
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+from telemetry import get_recorder, span
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENV = "Z9_WARMUP"
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Args:
+        name: Dotted module name.
+        before_import: Optional callable run once just before the import
+            (e.g. selecting the matplotlib backend).
+    """
+
+    def __init__(self, name: str, before_import: Optional[Callable[[], None]] = None):
+        self._name = name
+        self._before_import = before_import
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        """Import (once) and return the real module."""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    cold = self._name not in sys.modules
+                    start = time.perf_counter()
+                    if self._before_import:
+                        self._before_import()
+                    module = importlib.import_module(self._name)
+                    if cold:
+                        elapsed = time.perf_counter() - start
+                        get_recorder().record(f"import.{self._name}", elapsed)
+                        logger.info("Deferred import of %s took %.0f ms", self._name, elapsed * 1000)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name: str, before_import: Optional[Callable[[], None]] = None) -> LazyModule:
+    """Return a LazyModule for ``name``; see LazyModule."""
+    return LazyModule(name, before_import)
+
+
+# ——— Import-time report ————————————————————————————————————————————
+
+def import_report(module: str = "z9CoachFree", top: int = 15) -> Dict[str, Any]:
+    """
+    Measure what importing ``module`` costs in a fresh interpreter.
+
+    Args:
+        module: Module to import (run from the app directory).
+        top: Number of most expensive modules (by cumulative time) to list.
+
+    Returns:
+        {"module", "total_ms", "top": [{"module", "self_ms", "cumulative_ms"}, ...],
+        "heavy_loaded": names of known heavy dependencies pulled in at import}.
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=HERE, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "import failed")
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if not parts[0].isdigit():
+            continue  # header line
+        rows.append({"module": parts[2], "self_ms": int(parts[0]) / 1000, "cumulative_ms": int(parts[1]) / 1000})
+    total = next((r["cumulative_ms"] for r in rows if r["module"] == module), 0.0)
+    heavy = ("numpy", "pandas", "matplotlib", "reportlab", "requests", "plotly", "seaborn")
+    return {
+        "module": module,
+        "total_ms": total,
+        "top": sorted((r for r in rows if r["module"] != module),
+                      key=lambda r: r["cumulative_ms"], reverse=True)[:top],
+        "heavy_loaded": sorted({r["module"] for r in rows if r["module"] in heavy}),
+    }
+
+
+# ——— Warm-up ————————————————————————————————————————————————————————
+
+def warm_up() -> Dict[str, float]:
+    """
+    Load everything the first submission would otherwise pay for.
+
+    Returns:
+        Seconds spent per warm-up step.
+    """
+    def call(module: str, func: str) -> Callable[[], Any]:
+        return lambda: getattr(importlib.import_module(module), func)()
+
+    def render_workers() -> None:
+        pool = importlib.import_module("render_pool").get_render_pool()
+        if pool is not None:
+            pool.warm()
+
+    steps: Dict[str, float] = {}
+    for name, step in (("content", call("content", "get_content")),
+                       ("outcome_table", call("outcome_table", "get_outcome_table")),
+                       ("neighbours", call("neighbours", "get_neighbour_index")),
+                       ("charts", call("visuals", "warm")),
+                       ("pdf", call("pdf_export", "warm")),
+                       ("pandas", lambda: importlib.import_module("pandas")),
+                       ("render_workers", render_workers)):
+        start = time.perf_counter()
+        try:
+            with span(f"warmup.{name}"):
+                step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+        steps[name] = time.perf_counter() - start
+    logger.info("Warm-up finished in %.2f s", sum(steps.values()))
+    return steps
+
+
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+def start_warm_up() -> bool:
+    """
+    Start warm_up() on a daemon thread once per process if ``Z9_WARMUP`` is set.
+
+    Returns:
+        True if this call started the warm-up.
+    """
+    global _warm_up_started
+    if _warm_up_started or os.environ.get(WARMUP_ENV, "").lower() not in ("1", "true", "yes"):
+        return False
+    with _warm_up_lock:
+        if _warm_up_started:
+            return False
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="z9-warm-up", daemon=True).start()
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Z9 cold-start tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="print the app's import-time breakdown")
+    rep.add_argument("--module", default="z9CoachFree")
+    rep.add_argument("--top", type=int, default=15)
+    sub.add_parser("warm", help="run the warm-up once")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        report = import_report(args.module, args.top)
+        print(f"import {report['module']}: {report['total_ms']:.0f} ms")
+        print(f"heavy dependencies loaded at import: {', '.join(report['heavy_loaded']) or 'none'}")
+        for row in report["top"]:
+            print(f"  {row['cumulative_ms']:9.1f} ms  {row['self_ms']:8.1f} ms self  {row['module']}")
+    else:
+        os.chdir(HERE)
+        for name, seconds in warm_up().items():
+            print(f"{name:<14} {seconds * 1000:9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
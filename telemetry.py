@@ -0,0 +1,219 @@
+# File: telemetry.py
+"""
+Lightweight span timing for the submission pipeline.
+
+    from telemetry import span
+
+    with span("scoring"):
+        profile = analyze_profile(...)
+
+Durations are kept per phase in bounded in-memory ring buffers, so the
+operator page can report recent p50/p95/p99 without unbounded growth.
+Recording a span costs two ``perf_counter_ns`` calls and a deque append
+(a few microseconds); sink lines are serialized off the request path.
+
+Set ``Z9_SPAN_LOG=/path/spans.jsonl`` to also write every span as one JSON
+line ({"ts", "name", "ms", "pid", ...attrs}); lines are buffered (at most
+``max_pending``, oldest dropped first) and flushed by a background thread.
+``Z9_TELEMETRY=0`` turns recording off.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+SPAN_LOG_ENV = "Z9_SPAN_LOG"
+ENABLED_ENV = "Z9_TELEMETRY"
+SESSION_TTL = 300.0
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values: Ascending values (must be non-empty).
+        q: Percentile in [0, 100].
+
+    Returns:
+        The value at that rank.
+    """
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(min(rank, len(sorted_values))) - 1]
+
+
+class SpanRecorder:
+    """
+    Thread-safe per-phase ring buffers of span durations, plus an optional
+    JSON-lines sink and a registry of recently active sessions.
+    """
+
+    def __init__(self, capacity: int = 2048, sink_path: Optional[str] = None,
+                 flush_interval: float = 1.0, enabled: bool = True, max_pending: int = 65536):
+        self.capacity = capacity
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self._buffers: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._sessions: Dict[str, float] = {}
+        self._sessions_pruned = time.monotonic()
+        self._lock = threading.Lock()
+        self._sink = None
+        self._sink_lock = threading.Lock()
+        self._pending: Deque[tuple] = deque(maxlen=max_pending)
+        self._pid = os.getpid()
+        if sink_path:
+            self._sink = open(sink_path, "a", encoding="utf-8")
+            self._flush_interval = flush_interval
+            threading.Thread(target=self._flusher, name="span-sink", daemon=True).start()
+
+    # ——— Recording ———————————————————————————————————————————————
+
+    def record(self, name: str, seconds: float, **attrs: Any) -> None:
+        """Record one completed span of ``seconds`` under phase ``name``."""
+        if not self.enabled:
+            return
+        with self._lock:
+            buf = self._buffers.get(name)
+            if buf is None:
+                buf = self._buffers[name] = deque(maxlen=self.capacity)
+                self._counts[name] = 0
+            buf.append(seconds)
+            self._counts[name] += 1
+            if self._sink is not None:
+                self._pending.append((time.time(), name, seconds, attrs))
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[None]:
+        """Time the enclosed block as phase ``name`` (recorded even if it raises)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter_ns() - start) / 1e9, **attrs)
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        """Decorator form of span(); defaults the phase name to the function name."""
+        def decorator(fn: Callable) -> Callable:
+            phase = name or fn.__name__
+
+            @wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.span(phase):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def touch_session(self, session_id: str) -> None:
+        """Mark a session as active now, dropping expired ones once per SESSION_TTL."""
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = now
+            if now - self._sessions_pruned >= SESSION_TTL:
+                self._prune_sessions(now - SESSION_TTL)
+                self._sessions_pruned = now
+
+    def _prune_sessions(self, cutoff: float) -> None:
+        """Drop sessions last seen before ``cutoff``; the caller holds the lock."""
+        for sid in [s for s, seen in self._sessions.items() if seen < cutoff]:
+            del self._sessions[sid]
+
+    # ——— Reporting ———————————————————————————————————————————————
+
+    def active_sessions(self, ttl: float = SESSION_TTL) -> int:
+        """Number of sessions seen within the last ``ttl`` seconds."""
+        cutoff = time.monotonic() - ttl
+        with self._lock:
+            self._prune_sessions(cutoff)
+            return len(self._sessions)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-phase statistics over the spans currently in the ring buffers.
+
+        Returns:
+            {phase: {"count", "window", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "max_ms"}},
+            where count is the lifetime total and window the buffered sample size.
+        """
+        with self._lock:
+            snapshot = {name: (sorted(buf), self._counts[name]) for name, buf in self._buffers.items() if buf}
+        out = {}
+        for name, (values, count) in sorted(snapshot.items()):
+            out[name] = {
+                "count": count,
+                "window": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "mean_ms": sum(values) / len(values) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buffers.clear()
+            self._counts.clear()
+
+    # ——— Sink ——————————————————————————————————————————————————————
+
+    def flush(self) -> None:
+        """Write buffered span lines to the sink, if one is configured."""
+        if self._sink is None:
+            return
+        with self._sink_lock:
+            with self._lock:
+                pending, self._pending = self._pending, deque(maxlen=self.max_pending)
+            if not pending:
+                return
+            lines = []
+            for ts, name, seconds, attrs in pending:
+                line = {"ts": round(ts, 6), "name": name, "ms": round(seconds * 1000, 3), "pid": self._pid}
+                line.update(attrs)
+                lines.append(json.dumps(line, separators=(",", ":"), default=str))
+            self._sink.write("\n".join(lines) + "\n")
+            self._sink.flush()
+
+    def _flusher(self) -> None:
+        while True:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except (OSError, ValueError):
+                return
+
+
+_recorder: Optional[SpanRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> SpanRecorder:
+    """Process-wide SpanRecorder configured from the environment."""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = SpanRecorder(
+                    sink_path=os.environ.get(SPAN_LOG_ENV) or None,
+                    enabled=os.environ.get(ENABLED_ENV, "1") != "0",
+                )
+                atexit.register(_recorder.flush)
+    return _recorder
+
+
+def span(name: str, **attrs: Any):
+    """Context manager timing a block on the process-wide recorder."""
+    return get_recorder().span(name, **attrs)
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator timing a function on the process-wide recorder."""
+    return get_recorder().timed(name)
@@ -0,0 +1,84 @@
+# File: tests/test_assessment_log.py
+"""AssessmentLog: legacy migration, rotation numbering and concurrent appends."""
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from utils import AssessmentLog
+
+
+def _log(tmp_path, **kwargs) -> AssessmentLog:
+    kwargs.setdefault("legacy_path", None)
+    return AssessmentLog(str(tmp_path / "log.jsonl"), **kwargs)
+
+
+def test_migrates_legacy_array_once(tmp_path):
+    legacy = tmp_path / "log.json"
+    legacy.write_text(json.dumps([{"n": 1}, {"n": 2}]))
+    log = _log(tmp_path, legacy_path=str(legacy))
+    log.append({"n": 3})
+    log.close()
+
+    # A second instance sees the published log and does not migrate again.
+    again = _log(tmp_path, legacy_path=str(legacy))
+    assert again.migrate_legacy() == 0
+    assert [e["n"] for e in again.iter_entries()] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("content", ["{not json", '{"an": "object"}'])
+def test_unreadable_legacy_log_is_not_replaced_by_an_empty_one(tmp_path, content):
+    legacy = tmp_path / "log.json"
+    legacy.write_text(content)
+    log = _log(tmp_path, legacy_path=str(legacy))
+    with pytest.raises(ValueError):
+        log.append({"n": 1})
+    assert not os.path.exists(log.path)
+
+    # Once the legacy file is fixed, the migration runs.
+    legacy.write_text(json.dumps([{"n": 0}]))
+    log.append({"n": 1})
+    assert [e["n"] for e in log.iter_entries()] == [0, 1]
+
+
+def test_rotation_keeps_every_entry_in_order_with_stable_numbers(tmp_path):
+    log = _log(tmp_path, max_bytes=256)
+    for n in range(50):
+        log.append({"n": n, "pad": "x" * 20})
+    numbered = log.numbered_segments()
+
+    assert len(numbered) > 2
+    numbers = [n for n, _ in numbered]
+    assert numbers == list(range(1, len(numbered) + 1))
+    assert numbered[-1][1] == log.path
+    assert [e["n"] for e in log.iter_entries()] == list(range(50))
+
+    # After another rotation the old active file keeps the number it was given.
+    active_number = numbered[-1][0]
+    while len(log.numbered_segments()) == len(numbered):
+        log.append({"n": -1, "pad": "x" * 20})
+    assert log.numbered_segments()[active_number - 1][0] == active_number
+
+
+def _append_many(path: str, worker: int, count: int) -> None:
+    log = AssessmentLog(path, legacy_path=None, max_bytes=4096)
+    for n in range(count):
+        log.append({"worker": worker, "n": n})
+    log.close()
+
+
+def test_concurrent_processes_never_lose_or_interleave_entries(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_append_many, args=(path, w, 200)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    entries = list(AssessmentLog(path, legacy_path=None).iter_entries())
+    assert len(entries) == 800
+    for w in range(4):
+        assert [e["n"] for e in entries if e["worker"] == w] == list(range(200))
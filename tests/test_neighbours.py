@@ -0,0 +1,67 @@
+# File: tests/test_neighbours.py
+"""NeighbourIndex.query against a brute-force scan of the raw rows."""
+import numpy as np
+import pytest
+
+from content import TRAITS
+from neighbours import NEGATED_BELOW, NeighbourIndex
+
+
+def _oracle(traits: np.ndarray, stages: np.ndarray, q, k: int):
+    """Summary of the k nearest rows, ties with the k-th counted fractionally."""
+    d2 = ((traits.astype(np.float64) - np.asarray(q, np.float64)) ** 2).sum(1)
+    boundary = np.sort(d2)[k - 1]
+    inside = d2 < boundary
+    tied = d2 == boundary
+    weight = inside.astype(np.float64)
+    weight[tied] = (k - inside.sum()) / tied.sum()
+
+    by_stage = np.bincount(stages, weights=weight, minlength=9)
+    known = by_stage[1:].sum()
+    stage_shares = {f"Stage {n}": round(float(v / known), 3) for n, v in enumerate(by_stage) if n and v > 0}
+    negated = weight @ (traits < NEGATED_BELOW)
+    remedies = {t: round(float(v / k), 3) for t, v in zip(TRAITS, negated) if v > 0}
+    return round(float(np.sqrt(boundary)), 2), stage_shares, remedies
+
+
+@pytest.fixture(scope="module")
+def rows():
+    rng = np.random.default_rng(7)
+    # A dense cluster plus a thin uniform spread, so queries hit both cases.
+    cluster = np.clip(rng.normal(30, 6, size=(3000, 4)), 0, 100)
+    spread = rng.uniform(0, 100, size=(300, 4))
+    traits = np.vstack([cluster, spread]).round().astype(np.uint8)
+    stages = rng.integers(0, 9, size=len(traits))
+    return traits, stages
+
+
+@pytest.mark.parametrize("q", [
+    (30, 30, 30, 30),      # dense cell: answered from the first rings
+    (25, 35, 20, 40),
+    (0, 0, 0, 100),        # sparse corner: falls back to the full scan
+    (100, 100, 100, 100),
+    (55, 5, 80, 10),
+])
+@pytest.mark.parametrize("k", [1, 7, 50, 400])
+def test_query_matches_brute_force(rows, q, k):
+    traits, stages = rows
+    index = NeighbourIndex.from_rows(traits, stages)
+    result = index.query(dict(zip(TRAITS, q)), k=k)
+
+    distance, stage_shares, remedies = _oracle(traits, stages, q, k)
+    assert result["neighbours"] == k
+    assert result["distance"] == distance
+    assert result["stages"] == pytest.approx(stage_shares, abs=1e-3)
+    assert result["remedies"] == pytest.approx(remedies, abs=1e-3)
+
+
+def test_k_is_capped_at_the_number_of_assessments():
+    traits = np.array([[10, 20, 30, 40], [10, 20, 30, 40], [90, 5, 5, 0]], np.uint8)
+    index = NeighbourIndex.from_rows(traits, np.array([1, 2, 3]))
+    result = index.query(dict(zip(TRAITS, (10, 20, 30, 40))), k=10)
+    assert result["neighbours"] == 3
+    assert result["stages"] == pytest.approx({"Stage 1": 1 / 3, "Stage 2": 1 / 3, "Stage 3": 1 / 3}, abs=1e-3)
+
+
+def test_empty_index_has_no_neighbours():
+    assert NeighbourIndex.empty().query({t: 25 for t in TRAITS}) is None
@@ -0,0 +1,80 @@
+# File: tests/test_outbox.py
+"""SubscriptionOutbox delivery, retry and dead-lettering against the ConvertKit stub."""
+import pytest
+
+from convertkit_api import SubscriptionOutbox
+from convertkit_stub import start_stub_server
+
+
+@pytest.fixture
+def stub():
+    server = start_stub_server(seed=0)
+    yield server
+    server.shutdown()
+
+
+def _outbox(tmp_path, stub, **kwargs) -> SubscriptionOutbox:
+    kwargs.setdefault("backoff_base", 0.0)  # retries are due at once
+    kwargs.setdefault("max_rate", 1000.0)
+    return SubscriptionOutbox("key", "form", path=str(tmp_path / "outbox.sqlite3"),
+                              base_url=stub.base_url, **kwargs)
+
+
+def _drain(outbox: SubscriptionOutbox, rounds: int = 20) -> None:
+    for _ in range(rounds):
+        if not outbox.drain_once():
+            return
+
+
+def test_delivers_queued_subscriptions(tmp_path, stub):
+    outbox = _outbox(tmp_path, stub)
+    for n in range(3):
+        outbox.enqueue(f"user{n}@example.com")
+    _drain(outbox)
+
+    assert sorted(email for _, email in stub.state.subscriptions) == [f"user{n}@example.com" for n in range(3)]
+    metrics = outbox.metrics()
+    assert metrics["depth"] == 0
+    assert metrics["by_status"] == {"sent": 3}
+    assert outbox.dead_letters() == []
+
+
+def test_retries_server_errors_then_dead_letters(tmp_path, stub):
+    stub.state.fail_rate = 1.0
+    outbox = _outbox(tmp_path, stub, max_attempts=3)
+    row_id = outbox.enqueue("user@example.com")
+    _drain(outbox)
+
+    assert stub.state.requests == 3
+    dead = outbox.dead_letters()
+    assert [(d["id"], d["attempts"], d["last_error"]) for d in dead] == [(row_id, 3, "HTTP 503")]
+    assert outbox.metrics()["by_status"] == {"dead": 1}
+
+    # Requeued rows start over and go out once the API recovers.
+    stub.state.fail_rate = 0.0
+    assert outbox.requeue_dead() == 1
+    _drain(outbox)
+    assert stub.state.subscriptions == [("form", "user@example.com")]
+    assert outbox.dead_letters() == []
+
+
+def test_client_errors_are_dead_lettered_without_retry(tmp_path, stub):
+    outbox = _outbox(tmp_path, stub)
+    outbox.enqueue("not-an-email")
+    _drain(outbox)
+
+    assert [(d["attempts"], d["last_error"]) for d in outbox.dead_letters()] == [(1, "HTTP 400")]
+
+
+def test_rate_limit_pauses_without_counting_an_attempt(tmp_path, stub):
+    stub.state.rate_limit = 1
+    outbox = _outbox(tmp_path, stub)
+    outbox.enqueue("first@example.com")
+    outbox.enqueue("second@example.com")
+    _drain(outbox)
+
+    metrics = outbox.metrics()
+    assert metrics["by_status"] == {"sent": 1, "pending": 1}
+    assert metrics["paused_for"] > 0
+    pending = outbox._conn().execute("SELECT attempts FROM outbox WHERE status = 'pending'").fetchone()
+    assert pending["attempts"] == 0
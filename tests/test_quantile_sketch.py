@@ -0,0 +1,54 @@
+# File: tests/test_quantile_sketch.py
+"""QuantileSketch: relative accuracy, merging and serialization."""
+import numpy as np
+import pytest
+
+from calibration import QuantileSketch
+
+QS = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]
+
+
+def _exact(values: np.ndarray, qs):
+    ordered = np.sort(values)
+    return [ordered[int(np.floor(q * (len(values) - 1)))] for q in qs]
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_quantiles_are_within_alpha_of_the_true_values(alpha):
+    values = np.random.default_rng(1).lognormal(3, 1, 20000)
+    sketch = QuantileSketch(alpha)
+    for v in values:
+        sketch.add(float(v))
+    for got, want in zip(sketch.quantiles(QS), _exact(values, QS)):
+        assert abs(got - want) <= alpha * want * (1 + 1e-9)
+
+
+def test_merged_sketches_equal_one_sketch_of_all_values():
+    values = np.random.default_rng(2).uniform(0, 100, 5000)
+    values[:50] = 0  # zeros are counted apart from the bins
+    whole, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for n, v in enumerate(values):
+        whole.add(float(v))
+        (left if n % 2 else right).add(float(v))
+    left.merge(right)
+    assert left.count == whole.count == len(values)
+    assert left.quantiles(QS) == whole.quantiles(QS)
+    assert QuantileSketch.from_dict(left.to_dict()).quantiles(QS) == whole.quantiles(QS)
+
+
+def test_merge_rejects_a_different_alpha():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_bin_limit_only_costs_accuracy_at_the_bottom():
+    values = np.geomspace(1e-6, 1e6, 10000)
+    sketch = QuantileSketch(0.01, max_bins=200)
+    for v in values:
+        sketch.add(float(v))
+    assert len(sketch.bins) <= 200
+    high = [0.9, 0.99, 1.0]
+    for got, want in zip(sketch.quantiles(high), _exact(values, high)):
+        assert abs(got - want) <= 0.01 * want * (1 + 1e-9)
+    assert sketch.quantiles([]) == []
+    assert QuantileSketch().quantiles([0.5]) == []
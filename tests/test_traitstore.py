@@ -0,0 +1,59 @@
+# File: tests/test_traitstore.py
+"""TraitStore: incremental compaction from a rotating log, and segment merges."""
+import numpy as np
+
+from content import TRAITS
+from traitstore import TraitStore
+from utils import AssessmentLog
+
+
+def _entry(n: int) -> dict:
+    return {"timestamp": f"2026-01-{n % 28 + 1:02d}T12:00:00", "stage": f"Stage {n % 8 + 1}", "mood": n % 10,
+            "traits": {"D": n % 101, "I": (n * 7) % 101, "S": (n * 13) % 101, "C": (n * 29) % 101}}
+
+
+def test_compaction_is_incremental_across_rotations(tmp_path):
+    log = AssessmentLog(str(tmp_path / "log.jsonl"), legacy_path=None, max_bytes=2048)
+    store = TraitStore(str(tmp_path / "store"))
+    for n in range(40):
+        log.append(_entry(n))
+    assert store.compact(log) == 40
+    assert store.compact(log) == 0  # nothing new: the cursor holds
+
+    for n in range(40, 100):
+        log.append(_entry(n))
+    log.append({"not": "an assessment"})  # skipped, but the cursor moves past it
+    assert len(log.segments()) > 2
+    assert store.compact(log, segment_rows=16) == 60
+    assert store.compact(log) == 0
+
+    assert store.rows() == 100
+    assert store.column("D").tolist() == [n % 101 for n in range(100)]
+    assert store.column("stage").tolist() == [n % 8 + 1 for n in range(100)]
+    assert store.count({"mood": [0]}) == 10
+    log.close()
+
+
+def test_merge_combines_small_segments_and_keeps_row_order(tmp_path):
+    store = TraitStore(str(tmp_path / "store"))
+    rng = np.random.default_rng(3)
+    sizes = [5, 3, 200, 4, 6]
+    written = []
+    for size in sizes:
+        traits = rng.integers(0, 101, size=(size, len(TRAITS)))
+        store.append({"ts": np.arange(size, dtype=float), **{t: traits[:, k] for k, t in enumerate(TRAITS)},
+                      "trait_score": np.zeros(size), "harmony_ratio": np.zeros(size),
+                      "stage": np.ones(size), "mood": np.full(size, -1)})
+        written.append(traits)
+    expected = np.vstack(written)
+
+    # Only the runs of small segments on either side of the large one merge.
+    assert store.merge(max_rows=100) == 4
+    assert store.info()["segments"] == 3
+    assert store.merge(max_rows=100) == 0
+    assert np.array_equal(np.column_stack([store.column(t) for t in TRAITS]), expected)
+
+    assert store.merge() == 3
+    assert store.info()["segments"] == 1
+    assert np.array_equal(np.column_stack([store.column(t) for t in TRAITS]), expected)
+    assert sorted(p.name for p in (tmp_path / "store").glob("seg-*")) == [f"seg-{8:08d}.z9c"]
@@ -0,0 +1,644 @@
+# File: traitstore.py
+"""
+Memory-mapped columnar store of assessments for fast cohort scans.
+
+``python traitstore.py compact`` turns the assessment log into fixed-width
+NumPy columns, so cohort queries read packed arrays instead of decoding JSON
+row by row. The store is a directory of immutable segment files plus a
+manifest:
+
+    trait_store/manifest.json        segment list and a cursor into the log
+    trait_store/seg-00000001.z9c     one file per append
+
+Each compaction parses only the entries appended to the log since the
+cursor (both log schemas, via analytics.normalize_entry) and appends them as
+new segments. ``merge`` rewrites each run of adjacent small segments as one,
+so rows keep their order. Segments are never modified once written; a merged
+segment replaces its inputs through an atomic manifest swap, so readers
+never see a partial file.
+
+Segment layout (little-endian): a 64-byte header (magic, version, row
+count, min and max timestamp) followed by one 64-byte-aligned block per
+column of COLUMNS. Queries memory-map the file and scan CHUNK_ROWS rows at a
+time, skipping segments whose time range misses the filter. Memory stays
+bounded by the chunk, not the store. Missing values are NaN for floats and
+-1 for mood; stage 0 means unknown.
+
+    python traitstore.py compact              # append new log entries
+    python traitstore.py merge                # combine adjacent segments
+    python traitstore.py info
+    python traitstore.py aggregate --by stage --since 2026-01-01 --where D=50:100
+"""
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from analytics import UNKNOWN_DAY, normalize_entry, read_entries
+from content import TRAITS
+from utils import AssessmentLog, get_assessment_log, locked
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = "trait_store"
+STORE_DIR_ENV = "Z9_TRAIT_STORE"
+MANIFEST = "manifest.json"
+MAGIC = b"Z9TS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQdd")
+HEADER_SIZE = 64
+ALIGN = 64
+SEGMENT_ROWS = 1 << 20     # rows per segment written by compact
+CHUNK_ROWS = 1 << 18       # rows per scan step
+
+# (column, dtype, array typecode used while compacting)
+COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ("ts", "<f8", "d"),              # epoch seconds; naive log timestamps are read as UTC wall-clock
+    *((t, "u1", "B") for t in TRAITS),   # trait percentages 0-100
+    ("trait_score", "<f4", "f"),
+    ("harmony_ratio", "<f4", "f"),
+    ("stage", "u1", "B"),            # 1-8, 0 when unknown
+    ("mood", "i1", "b"),             # 0-10, -1 when unknown
+)
+DTYPES = {name: np.dtype(dt) for name, dt, _ in COLUMNS}
+GROUP_BY = ("stage", "mood", "day")
+DAY = 86400
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def to_epoch(value: Any) -> float:
+    """
+    Epoch seconds for a number, ``datetime`` or ISO date/datetime string.
+    Naive times are taken as UTC wall-clock, as stored by compact.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _entry_ts(entry: Dict[str, Any]) -> float:
+    try:
+        return to_epoch(str(entry["timestamp"]))
+    except (KeyError, ValueError, TypeError):
+        return float("nan")
+
+
+# ——— Segments ——————————————————————————————————————————————————————
+
+def _write_segment(path: str, rows: int, ts_range: Tuple[float, float],
+                   blocks: Dict[str, Iterable[np.ndarray]]) -> None:
+    """
+    Write a segment atomically from per-column array pieces (streamed, so a
+    merge never holds more than one piece in memory).
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), rows, *ts_range).ljust(HEADER_SIZE, b"\0"))
+        for name, _, _ in COLUMNS:
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            written = 0
+            for piece in blocks[name]:
+                piece = np.ascontiguousarray(piece, dtype=DTYPES[name])
+                f.write(piece.tobytes())
+                written += len(piece)
+            if written != rows:
+                raise ValueError(f"column {name} has {written} rows, expected {rows}")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """
+    One memory-mapped segment file; ``column(name)`` is a read-only array view.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, ncols, self.rows, ts_min, ts_max = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or ncols != len(COLUMNS):
+            raise ValueError(f"{path}: not a trait store segment (version {VERSION})")
+        self.ts_range = (ts_min, ts_max)
+        self._raw = np.memmap(path, np.uint8, "r") if self.rows else None
+        self._offsets = {}
+        offset = HEADER_SIZE
+        for name, _, _ in COLUMNS:
+            offset = _aligned(offset)
+            self._offsets[name] = offset
+            offset += self.rows * DTYPES[name].itemsize
+
+    def column(self, name: str) -> np.ndarray:
+        dtype = DTYPES[name]
+        if self._raw is None:
+            return np.empty(0, dtype)
+        start = self._offsets[name]
+        return self._raw[start:start + self.rows * dtype.itemsize].view(dtype)
+
+
+# ——— Compaction buffer —————————————————————————————————————————————
+
+class _Buffer:
+    """Typed per-column arrays collecting parsed log rows (no per-row Python objects kept)."""
+
+    def __init__(self):
+        self.columns = {name: array(code) for name, _, code in COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.columns["ts"])
+
+    def add(self, entry: Dict[str, Any]) -> bool:
+        record = normalize_entry(entry)
+        if record is None:
+            return False
+        cols = self.columns
+        cols["ts"].append(_entry_ts(entry))
+        for t, v in zip(TRAITS, record["traits"]):
+            cols[t].append(min(100, max(0, int(round(v)))))
+        cols["trait_score"].append(record["score"] if record["score"] is not None else float("nan"))
+        cols["harmony_ratio"].append(record["harmony"] if record["harmony"] is not None else float("nan"))
+        cols["stage"].append(record["stage"])
+        cols["mood"].append(record["mood"] if record["mood"] is not None else -1)
+        return True
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: np.frombuffer(self.columns[name], DTYPES[name]) for name, _, _ in COLUMNS}
+
+
+def _pieces(segments: List[Segment], name: str) -> Iterator[np.ndarray]:
+    for seg in segments:
+        yield seg.column(name)
+
+
+def _ts_range(ts: np.ndarray) -> Tuple[float, float]:
+    known = ts[~np.isnan(ts)]
+    return (float(known.min()), float(known.max())) if len(known) else (float("nan"), float("nan"))
+
+
+# ——— Store ————————————————————————————————————————————————————————
+
+class TraitStore:
+    """
+    Columnar assessment store: compaction from the log, and chunked scans.
+
+    Filters (``where``) map a column to a condition, all of which must hold:
+    ``(lo, hi)`` is an inclusive range with either bound None; a list or set
+    is membership; anything else is equality. ``ts`` bounds may be ISO dates.
+
+    Args:
+        path: Store directory (created on first compaction).
+    """
+
+    def __init__(self, path: str = STORE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded: Optional[Tuple[int, int]] = None
+        self._segments: List[Segment] = []
+        self._manifest: Dict[str, Any] = self._empty_manifest()
+
+    # ——— Manifest ——————————————————————————————————————————————
+
+    @staticmethod
+    def _empty_manifest() -> Dict[str, Any]:
+        return {"version": VERSION, "cursor": [1, 0], "next": 1, "segments": []}
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return self._empty_manifest()
+        if manifest.get("version") != VERSION:
+            raise ValueError(f"{self._manifest_path()}: unsupported store version; rebuild the store")
+        return manifest
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp = f"{self._manifest_path()}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path())
+
+    def _load(self) -> List[Segment]:
+        """Current segments, re-read only when the manifest has changed."""
+        with self._lock:
+            try:
+                st = os.stat(self._manifest_path())
+            except FileNotFoundError:
+                self._segments, self._manifest, self._loaded = [], self._empty_manifest(), None
+                return self._segments
+            if (st.st_mtime_ns, st.st_size) != self._loaded:
+                manifest = self._read_manifest()
+                self._segments = [Segment(os.path.join(self.path, s["name"])) for s in manifest["segments"]]
+                self._manifest = manifest
+                self._loaded = (st.st_mtime_ns, st.st_size)
+            return self._segments
+
+    def _exclusive(self):
+        os.makedirs(self.path, exist_ok=True)
+        return open(os.path.join(self.path, ".lock"), "a")
+
+    def _new_segment(self, manifest: Dict[str, Any], rows: int, ts_range: Tuple[float, float],
+                     blocks: Dict[str, Iterable[np.ndarray]]) -> Dict[str, Any]:
+        """Write the next numbered segment file and return its manifest entry."""
+        name = f"seg-{manifest['next']:08d}.z9c"
+        _write_segment(os.path.join(self.path, name), rows, ts_range, blocks)
+        manifest["next"] += 1
+        return {"name": name, "rows": rows,
+                "ts_min": None if np.isnan(ts_range[0]) else ts_range[0],
+                "ts_max": None if np.isnan(ts_range[1]) else ts_range[1]}
+
+    # ——— Writing ———————————————————————————————————————————————
+
+    def append(self, columns: Dict[str, Any]) -> int:
+        """
+        Append rows given as whole columns (every name in COLUMNS, equal lengths).
+
+        Returns:
+            Rows appended.
+        """
+        arrays = {name: np.asarray(columns[name], DTYPES[name]) for name, _, _ in COLUMNS}
+        rows = len(arrays["ts"])
+        if not rows:
+            return 0
+        with self._exclusive() as lock_file, locked(lock_file.fileno()):
+            manifest = self._read_manifest()
+            manifest["segments"].append(
+                self._new_segment(manifest, rows, _ts_range(arrays["ts"]), {n: [a] for n, a in arrays.items()}))
+            self._write_manifest(manifest)
+        return rows
+
+    def compact(self, log: Optional[AssessmentLog] = None, segment_rows: int = SEGMENT_ROWS) -> int:
+        """
+        Append log entries written since the last compaction as new segments.
+
+        The cursor is saved with each segment, so an interrupted compaction
+        resumes where it stopped.
+
+        Args:
+            log: The AssessmentLog to read (defaults to the process-wide log).
+            segment_rows: Maximum rows per new segment.
+
+        Returns:
+            Rows appended.
+        """
+        log = log or get_assessment_log()
+        appended = 0
+        with self._exclusive() as lock_file, locked(lock_file.fileno()):
+            manifest = self._read_manifest()
+            seq, offset = manifest["cursor"]
+            cursor = (seq, offset)
+            buf = _Buffer()
+
+            def flush() -> None:
+                nonlocal buf, appended
+                if len(buf):
+                    arrays = buf.arrays()
+                    manifest["segments"].append(self._new_segment(
+                        manifest, len(buf), _ts_range(arrays["ts"]), {n: [a] for n, a in arrays.items()}))
+                    appended += len(buf)
+                    buf = _Buffer()
+                manifest["cursor"] = list(cursor)
+                self._write_manifest(manifest)
+
+            for number, path in log.numbered_segments():
+                if number < seq:
+                    continue
+                position = offset if number == seq else 0
+                for entry, position in read_entries(path, position):
+                    if entry is not None:
+                        buf.add(entry)
+                    cursor = (number, position)
+                    if len(buf) >= segment_rows:
+                        flush()
+                cursor = (number, position)
+            if len(buf) or list(cursor) != manifest["cursor"]:
+                flush()
+        return appended
+
+    def merge(self, max_rows: Optional[int] = None) -> int:
+        """
+        Rewrite each run of adjacent small segments as one, streaming column
+        by column. Only neighbours are combined, so rows keep their order.
+
+        Args:
+            max_rows: Only merge segments smaller than this many rows
+                (default: merge everything).
+
+        Returns:
+            Number of segments replaced.
+        """
+        with self._exclusive() as lock_file, locked(lock_file.fileno()):
+            manifest = self._read_manifest()
+            runs: List[List[Dict[str, Any]]] = [[]]
+            for s in manifest["segments"]:
+                if max_rows is None or s["rows"] < max_rows:
+                    runs[-1].append(s)
+                elif runs[-1]:
+                    runs.append([])
+            runs = [run for run in runs if len(run) > 1]
+            if not runs:
+                return 0
+            replaced = {}
+            for run in runs:
+                segments = [Segment(os.path.join(self.path, s["name"])) for s in run]
+                known = [v for s in run for v in (s["ts_min"], s["ts_max"]) if v is not None]
+                ts_range = (min(known), max(known)) if known else (float("nan"), float("nan"))
+                blocks = {name: _pieces(segments, name) for name, _, _ in COLUMNS}
+                replaced[run[0]["name"]] = (self._new_segment(
+                    manifest, sum(seg.rows for seg in segments), ts_range, blocks), run)
+            # Each merged segment takes the place of its run.
+            dropped = {s["name"] for _, run in replaced.values() for s in run[1:]}
+            manifest["segments"] = [replaced[s["name"]][0] if s["name"] in replaced else s
+                                    for s in manifest["segments"] if s["name"] not in dropped]
+            self._write_manifest(manifest)
+            for _, run in replaced.values():
+                for s in run:
+                    os.remove(os.path.join(self.path, s["name"]))
+        return sum(len(run) for run in runs)
+
+    # ——— Reading ———————————————————————————————————————————————
+
+    def rows(self) -> int:
+        return sum(seg.rows for seg in self._load())
+
+    def info(self) -> Dict[str, Any]:
+        segments = self._load()
+        return {
+            "path": self.path,
+            "rows": sum(seg.rows for seg in segments),
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(seg.path) for seg in segments),
+            "cursor": self._manifest["cursor"],
+        }
+
+    def scan(self, columns: Iterable[str], where: Optional[Dict[str, Any]] = None, start: int = 0
+             ) -> Iterator[Tuple[Dict[str, np.ndarray], Optional[np.ndarray]]]:
+        """
+        Yield ({column: chunk}, mask) per chunk of at most CHUNK_ROWS rows.
+
+        ``mask`` is a bool array of the rows matching ``where`` (None when
+        there is no filter). Chunks are views into the mapped files. Rows
+        keep their order across compactions and merges, so ``start`` (skip
+        the first ``start`` rows of the store) works as a cursor for readers
+        that only want rows appended since they last looked.
+        """
+        where = _normalize_where(where)
+        columns = list(columns)
+        for name in list(columns) + list(where):
+            if name not in DTYPES:
+                raise KeyError(f"unknown column {name!r}")
+        for seg in self._load():
+            skip, start = min(start, seg.rows), start - min(start, seg.rows)
+            if skip == seg.rows or not _overlaps(seg.ts_range, where.get("ts")):
+                continue
+            for lo in range(skip, seg.rows, CHUNK_ROWS):
+                hi = min(lo + CHUNK_ROWS, seg.rows)
+                mask = None
+                for name, cond in where.items():
+                    m = _match(seg.column(name)[lo:hi], cond)
+                    mask = m if mask is None else np.logical_and(mask, m, out=mask)
+                yield {name: seg.column(name)[lo:hi] for name in columns}, mask
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """Rows matching ``where``."""
+        if not where:
+            return self.rows()
+        return sum(int(np.count_nonzero(mask)) for _, mask in self.scan((), where))
+
+    def column(self, name: str, where: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """The values of one column for rows matching ``where``, as a new array."""
+        pieces = [cols[name] if mask is None else cols[name][mask] for cols, mask in self.scan((name,), where)]
+        return np.concatenate(pieces) if pieces else np.empty(0, DTYPES[name])
+
+    def aggregate(self, where: Optional[Dict[str, Any]] = None, by: Optional[str] = None
+                  ) -> Dict[Any, Dict[str, Any]]:
+        """
+        Count and means of the matching rows, overall or per group.
+
+        Args:
+            where: Row filter (see class docstring).
+            by: None, "stage", "mood" or "day" (UTC day of ``ts``, "unknown"
+                when the entry had no timestamp).
+
+        Returns:
+            {group: {"count", "mean": {D, I, S, C, trait_score, harmony_ratio,
+            mood}}}, keyed "all" when ``by`` is None. Means skip missing values.
+        """
+        if by is not None and by not in GROUP_BY:
+            raise ValueError(f"by must be one of {GROUP_BY}")
+        measures = [*TRAITS, "trait_score", "harmony_ratio", "mood"]
+        key_column = {"stage": "stage", "mood": "mood", "day": "ts"}.get(by)
+        acc: Dict[int, np.ndarray] = {}  # group -> [count, (sum, n) per measure]
+        for cols, mask in self.scan(measures + ([key_column] if key_column else []), where):
+            n = len(cols["D"])
+            if by is None:
+                keys = np.zeros(n, np.int64)
+            elif by == "day":
+                ts = cols["ts"]
+                days = np.floor(ts / DAY)
+                unknown = np.isnan(days)
+                if unknown.any():
+                    days[unknown] = -1
+                keys = days.astype(np.int64)
+            else:
+                keys = cols[key_column].astype(np.int64)
+            _accumulate(acc, keys, mask, cols, measures)
+
+        out: Dict[Any, Dict[str, Any]] = {}
+        for key in sorted(acc):
+            sums = acc[key]
+            count = int(sums[0])
+            if not count:
+                continue
+            means = {m: (float(sums[1 + 2 * k] / sums[2 + 2 * k]) if sums[2 + 2 * k] else None)
+                     for k, m in enumerate(measures)}
+            out[_group_label(by, key)] = {"count": count, "mean": means}
+        return out
+
+
+def _normalize_where(where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    out = {}
+    for name, cond in (where or {}).items():
+        if name == "ts" and isinstance(cond, tuple):
+            cond = tuple(None if v is None else to_epoch(v) for v in cond)
+        out[name] = cond
+    return out
+
+
+def _match(values: np.ndarray, cond: Any) -> np.ndarray:
+    if isinstance(cond, tuple):
+        lo, hi = cond
+        mask = np.ones(len(values), bool) if lo is None else values >= lo
+        if hi is not None:
+            mask &= values <= hi
+        return mask
+    if isinstance(cond, (list, set, frozenset)):
+        return np.isin(values, list(cond))
+    return values == cond
+
+
+def _overlaps(ts_range: Tuple[float, float], cond: Any) -> bool:
+    """False only when a ``ts`` range filter provably misses the whole segment."""
+    if not isinstance(cond, tuple) or np.isnan(ts_range[0]):
+        return True
+    lo, hi = cond
+    return (hi is None or ts_range[0] <= hi) and (lo is None or ts_range[1] >= lo)
+
+
+def _accumulate(acc: Dict[int, np.ndarray], keys: np.ndarray, mask: Optional[np.ndarray],
+                cols: Dict[str, np.ndarray], measures: List[str]) -> None:
+    """
+    Add one chunk's per-group count and (sum, valid count) per measure to ``acc``.
+
+    A single group is plain sums. Sorted keys (days of a time-ordered log)
+    are summed run by run with reduceat; bincount, which slows down on long
+    runs of one key, handles the rest.
+    """
+    if mask is not None:
+        if not mask.any():
+            return
+        keys = keys[mask]
+    if keys[0] == keys[-1] and (keys == keys[0]).all():
+        groups, reduce = keys[:1], lambda v: v.sum(dtype=np.float64)
+    elif (keys[1:] >= keys[:-1]).all():
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        groups, reduce = keys[starts], lambda v: np.add.reduceat(v, starts, dtype=np.float64)
+    else:
+        base = int(keys.min())
+        idx = keys - base
+        size = int(idx.max()) + 1
+        groups = np.arange(base, base + size)
+        reduce = lambda v: np.bincount(idx, weights=v, minlength=size)
+
+    sums = np.zeros((1 + 2 * len(measures), len(groups)))
+    sums[0] = reduce(np.ones(len(keys)))
+    for k, m in enumerate(measures):
+        v = cols[m] if mask is None else cols[m][mask]
+        missing = np.isnan(v) if v.dtype.kind == "f" else (v < 0 if m == "mood" else None)
+        if missing is not None and missing.any():
+            ok = ~missing
+            v = np.where(ok, v, 0)
+            sums[2 + 2 * k] = reduce(ok)
+        else:
+            sums[2 + 2 * k] = sums[0]
+        sums[1 + 2 * k] = reduce(v)
+
+    for key, column in zip(groups.tolist(), sums.T):
+        if not column[0]:
+            continue
+        if key in acc:
+            acc[key] += column
+        else:
+            acc[key] = column.copy()
+
+
+def _group_label(by: Optional[str], key: int) -> Any:
+    if by is None:
+        return "all"
+    if by == "day":
+        return UNKNOWN_DAY if key < 0 else time.strftime("%Y-%m-%d", time.gmtime(key * DAY))
+    return key
+
+
+_store: Optional[TraitStore] = None
+_store_lock = threading.Lock()
+
+
+def get_trait_store() -> TraitStore:
+    """
+    Return the process-wide TraitStore (``Z9_TRAIT_STORE``, default trait_store/).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TraitStore(os.environ.get(STORE_DIR_ENV) or STORE_DIR)
+    return _store
+
+
+def _parse_where(items: List[str]) -> Dict[str, Any]:
+    """CLI filters: ``col=value``, ``col=lo:hi`` (either side optional) or ``col=a,b,c``."""
+    where: Dict[str, Any] = {}
+    for item in items:
+        name, _, spec = item.partition("=")
+        if name not in DTYPES:
+            raise ValueError(f"unknown column {name!r}")
+        parse = str if name == "ts" else float
+        if ":" in spec:
+            lo, hi = spec.split(":", 1)
+            where[name] = (parse(lo) if lo else None, parse(hi) if hi else None)
+        elif "," in spec:
+            where[name] = {parse(v) for v in spec.split(",")}
+        else:
+            where[name] = parse(spec)
+    return where
+
+
+def _end_of_day(value: str) -> str:
+    """An ``--until`` date without a time covers that whole day."""
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return value
+    return datetime.combine(day, datetime.max.time()).isoformat()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Columnar assessment store for cohort scans.")
+    parser.add_argument("--path", default=os.environ.get(STORE_DIR_ENV) or STORE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    c = sub.add_parser("compact", help="append log entries written since the last compaction")
+    c.add_argument("--segment-rows", type=int, default=SEGMENT_ROWS)
+    m = sub.add_parser("merge", help="combine runs of adjacent segments")
+    m.add_argument("--max-rows", type=int, default=None, help="only merge segments smaller than this")
+    sub.add_parser("info", help="print row and segment counts")
+    a = sub.add_parser("aggregate", help="count and means, optionally grouped")
+    a.add_argument("--by", choices=GROUP_BY)
+    a.add_argument("--since", help="ISO date or datetime (inclusive)")
+    a.add_argument("--until", help="ISO date or datetime (inclusive; a date covers the whole day)")
+    a.add_argument("--where", action="append", default=[], metavar="COL=SPEC",
+                   help="filter: col=value, col=lo:hi or col=a,b,c (repeatable)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    store = TraitStore(args.path)
+    started = time.perf_counter()
+    if args.command == "compact":
+        result: Any = {"appended": store.compact(segment_rows=args.segment_rows), **store.info()}
+    elif args.command == "merge":
+        result = {"merged": store.merge(args.max_rows), **store.info()}
+    elif args.command == "info":
+        result = store.info()
+    else:
+        where = _parse_where(args.where)
+        if args.since or args.until:
+            where["ts"] = (args.since, args.until and _end_of_day(args.until))
+        result = {str(k): v for k, v in store.aggregate(where, args.by).items()}
+    print(json.dumps(result, indent=2))
+    logger.info("%s took %.3f s", args.command, time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
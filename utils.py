@@ -1,6 +1,17 @@
 # File: utils.py
+import atexit
 import json
-from typing import Any, Dict
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts fall back to thread locking
+    fcntl = None
 
 
 def load_json_file(filepath: str) -> Any:
@@ -27,3 +38,301 @@ def save_json_file(data: Any, filepath: str) -> None:
     """
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+# ——— Assessment log ————————————————————————————————————————————————
+
+LOG_PATH = "assessment_log.jsonl"
+LOG_PATH_ENV = "Z9_LOG_PATH"
+LEGACY_LOG_PATH = "assessment_log.json"
+
+
+@contextmanager
+def locked(fd: int, shared: bool = False) -> Iterator[None]:
+    """Hold an exclusive (or shared) advisory lock on ``fd`` (no-op where flock is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def try_lock(fd: int) -> bool:
+    """
+    Take an exclusive advisory lock on ``fd`` without waiting; it is held
+    until ``fd`` is closed. True when taken (always where flock is unavailable).
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class AssessmentLog:
+    """
+    Append-only JSON-lines assessment log shared by every session and process.
+
+    Each entry is one line written with a single ``O_APPEND`` write while an
+    exclusive ``flock`` is held on a sidecar ``.lock`` file, so concurrent
+    Streamlit sessions and worker processes never lose or interleave entries.
+    Appends cost O(1) regardless of history size.
+
+    Durability uses group commit: an ``fsync`` is issued once ``fsync_every``
+    entries are pending or ``fsync_interval`` seconds have passed, whichever
+    comes first, and a background flusher covers idle periods.
+
+    When the active file would grow past ``max_bytes`` it is renamed to a
+    numbered segment (``assessment_log.00000001.jsonl``, ...). Segments are
+    never renamed again, so readers can keep stable cursors into them.
+
+    On first use, an existing legacy ``assessment_log.json`` array is copied
+    into the JSON-lines log once; entries keep their original schema. A
+    legacy file that is not a JSON array raises ValueError and nothing is
+    published, so the migration runs again once it is fixed or moved aside.
+    """
+
+    def __init__(
+        self,
+        path: str = LOG_PATH,
+        legacy_path: Optional[str] = LEGACY_LOG_PATH,
+        max_bytes: int = 64 * 1024 * 1024,
+        fsync_every: int = 64,
+        fsync_interval: float = 1.0
+    ):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        root, ext = os.path.splitext(path)
+        self._segment_re = re.compile(re.escape(os.path.basename(root)) + r"\.(\d{8})" + re.escape(ext) + "$")
+        self._segment_fmt = root + ".{:08d}" + ext
+
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    # — Writing ——————————————————————————————————————————————
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        Append one entry to the log.
+
+        Args:
+            entry: JSON-serializable mapping to record.
+        """
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            self._open()
+            with locked(self._lock_fd):
+                self._reopen_if_rotated()
+                size = os.fstat(self._fd).st_size
+                if size and size + len(line) > self.max_bytes:
+                    self._rotate()
+                os.write(self._fd, line)
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+        self._start_flusher()
+
+    def flush(self) -> None:
+        """Force pending entries to stable storage."""
+        with self._lock:
+            if self._fd is not None:
+                self._sync()
+
+    def close(self) -> None:
+        """Flush pending entries and release file handles."""
+        self._closed.set()
+        with self._lock:
+            if self._fd is not None:
+                self._sync()
+                os.close(self._fd)
+                self._fd = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    # — Reading ——————————————————————————————————————————————
+
+    def segments(self) -> List[str]:
+        """
+        Return log file paths oldest first: rotated segments, then the active file.
+        """
+        self.migrate_legacy()
+        return self._list_segments()
+
+    def numbered_segments(self) -> List[Tuple[int, str]]:
+        """
+        Return (number, path) for every log file, oldest first.
+
+        The active file carries the number it will get when it is rotated
+        (one past the newest segment), so a (number, byte offset) position
+        stays valid across rotations. The directory is listed under a shared
+        lock, so a concurrent rotation cannot give two files one number.
+        """
+        self.migrate_legacy()
+        with self._lock:
+            self._open_lock()
+            with locked(self._lock_fd, shared=True):
+                paths = self._list_segments()
+        numbered = []
+        for path in paths:
+            m = self._segment_re.match(os.path.basename(path))
+            numbered.append((int(m.group(1)) if m else (numbered[-1][0] if numbered else 0) + 1, path))
+        return numbered
+
+    def _list_segments(self) -> List[str]:
+        directory = os.path.dirname(self.path) or "."
+        numbered = []
+        for name in os.listdir(directory):
+            m = self._segment_re.match(name)
+            if m:
+                numbered.append((int(m.group(1)), os.path.join(os.path.dirname(self.path), name)))
+        paths = [p for _, p in sorted(numbered)]
+        if os.path.exists(self.path):
+            paths.append(self.path)
+        return paths
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every logged entry, oldest first, without loading the log into memory.
+        """
+        for seg in self.segments():
+            with open(seg, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+    # — Migration ————————————————————————————————————————————
+
+    def migrate_legacy(self) -> int:
+        """
+        Copy the legacy JSON-array log into the JSON-lines log, once.
+
+        The migration runs only while no JSON-lines log exists yet and is
+        published atomically, so concurrent first calls cannot duplicate rows.
+
+        Returns:
+            Number of entries migrated (0 if nothing was done).
+
+        Raises:
+            ValueError: If the legacy file is not a JSON array; nothing is published.
+        """
+        if not self.legacy_path or not os.path.exists(self.legacy_path) or os.path.exists(self.path):
+            return 0
+        with self._lock:
+            self._open_lock()
+            return self._migrate_locked()
+
+    # — Internals ————————————————————————————————————————————
+
+    def _has_segments(self) -> bool:
+        directory = os.path.dirname(self.path) or "."
+        return any(self._segment_re.match(n) for n in os.listdir(directory))
+
+    def _open_lock(self) -> None:
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _open(self) -> None:
+        self._open_lock()
+        if self._fd is None:
+            self._migrate_locked()
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _migrate_locked(self) -> int:
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return 0
+        with locked(self._lock_fd):
+            if os.path.exists(self.path) or self._has_segments():
+                return 0
+            # Publishing an empty log over unreadable data would drop it for good,
+            # since migration only runs while no JSON-lines log exists.
+            try:
+                legacy = load_json_file(self.legacy_path)
+            except ValueError as e:
+                raise ValueError(f"{self.legacy_path}: cannot migrate legacy log ({e}); "
+                                 "fix or move it aside") from e
+            if not isinstance(legacy, list):
+                raise ValueError(f"{self.legacy_path}: cannot migrate legacy log (not a JSON array); "
+                                 "fix or move it aside")
+            tmp = self.path + ".migrating"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in legacy:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            return len(legacy)
+
+    def _reopen_if_rotated(self) -> None:
+        # Another process may have rotated the active file since we opened it.
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        mine = os.fstat(self._fd)
+        if current is None or (current.st_ino, current.st_dev) != (mine.st_ino, mine.st_dev):
+            self._sync()
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _rotate(self) -> None:
+        self._sync()
+        directory = os.path.dirname(self.path) or "."
+        seqs = [int(m.group(1)) for m in map(self._segment_re.match, os.listdir(directory)) if m]
+        os.rename(self.path, self._segment_fmt.format(max(seqs, default=0) + 1))
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _sync(self) -> None:
+        if self._pending and self._fd is not None:
+            os.fsync(self._fd)
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="assessment-log-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._pending and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+
+
+_assessment_log: Optional[AssessmentLog] = None
+_assessment_log_guard = threading.Lock()
+
+
+def get_assessment_log() -> AssessmentLog:
+    """
+    Return the process-wide AssessmentLog (``Z9_LOG_PATH``, default
+    assessment_log.jsonl), creating it on first use.
+    """
+    global _assessment_log
+    if _assessment_log is None:
+        with _assessment_log_guard:
+            if _assessment_log is None:
+                _assessment_log = AssessmentLog(os.environ.get(LOG_PATH_ENV) or LOG_PATH)
+                atexit.register(_assessment_log.close)
+    return _assessment_log
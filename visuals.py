@@ -1,11 +1,49 @@
 # File: visuals.py
+from __future__ import annotations
 
+import io
+import logging
 import math
-import matplotlib.pyplot as plt
-import numpy as np
-from matplotlib.figure import Figure
-from typing import Dict, Optional, List
-from statistics import harmonic_mean
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, List, Tuple
+
+from metrics import trait_metrics
+from startup import lazy_module
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+
+logger = logging.getLogger(__name__)
+
+# "matplotlib" rasterizes charts on the server; "plotly" sends specs for the browser to draw (plotly_charts.py).
+CHART_BACKEND_ENV = "Z9_CHART_BACKEND"
+CHART_BACKENDS = ("matplotlib", "plotly")
+
+
+def chart_backend() -> str:
+    """
+    Return the configured chart backend, falling back to matplotlib on unknown values.
+    """
+    backend = os.environ.get(CHART_BACKEND_ENV, "matplotlib").strip().lower()
+    if backend not in CHART_BACKENDS:
+        logger.warning("Unknown %s=%r; using matplotlib", CHART_BACKEND_ENV, backend)
+        return "matplotlib"
+    return backend
+
+
+def _use_agg() -> None:
+    import matplotlib
+    matplotlib.use("Agg")  # headless server: never open GUI windows or pick an interactive backend
+
+
+# matplotlib and numpy are imported on the first chart render, not at app start.
+plt = lazy_module("matplotlib.pyplot", before_import=_use_agg)
+np = lazy_module("numpy")
 
 
 def generate_radar_chart(traits: Dict[str, float], title: str = "DISC Radar Chart") -> Figure:
@@ -80,19 +118,39 @@ def plot_circular_stage_map(
     return fig
 
 
-def plot_development_path(
+def development_path_rows(
     perceived_idx: int,
     auto_idx: int,
     ee_summaries: Dict[str, Dict],
     path_map: Dict[str, Dict],
     dominant_trait: str
-) -> Figure:
+) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """
+    Stages walked from the perceived to the auto-mapped stage, with the
+    obstacle, dominant-trait action and narrative summary for each.
+
+    Returns:
+        (stages, obstacles, actions, summaries) as parallel lists.
+    """
     step = 1 if auto_idx >= perceived_idx else -1
     indices = list(range(perceived_idx, auto_idx + step, step))
     stages = [f"Stage {i+1}" for i in indices]
     obstacles = [path_map.get(s, {}).get("obstacle", "-") for s in stages]
     actions = [path_map.get(s, {}).get("remedies", {}).get(dominant_trait, {}).get("action", "-") for s in stages]
     summaries = [ee_summaries.get(s, {}).get("summary", "") for s in stages]
+    return stages, obstacles, actions, summaries
+
+
+def plot_development_path(
+    perceived_idx: int,
+    auto_idx: int,
+    ee_summaries: Dict[str, Dict],
+    path_map: Dict[str, Dict],
+    dominant_trait: str
+) -> Figure:
+    stages, obstacles, actions, summaries = development_path_rows(
+        perceived_idx, auto_idx, ee_summaries, path_map, dominant_trait
+    )
 
     fig, ax = plt.subplots(figsize=(8, len(stages) * 1.2))
     ax.axis('off')
@@ -117,8 +175,7 @@ def plot_harmonic_convergence(
     """
     Plot the Harmonic Convergence Index.
     """
-    values = list(traits.values())
-    hm = harmonic_mean([v for v in values if v > 0]) if any(v > 0 for v in values) else 0
+    hm = trait_metrics(traits).harmonic_convergence
     fig, ax = plt.subplots()
     ax.barh(["Harmonic Convergence"], [hm])
     ax.set_xlim(0, 100)
@@ -132,8 +189,7 @@ def plot_negiton_damping(
     """
     Plot damping for negation levels.
     """
-    neg = [100 - v for v in traits.values()]
-    damping = [100 * (1 - n/100)**2 for n in neg]
+    damping = list(trait_metrics(traits).damping)
     fig, ax = plt.subplots()
     ax.plot(list(traits.keys()), damping, marker='o')
     ax.set_ylabel("Damping Level")
@@ -147,9 +203,218 @@ def plot_triplet_state(
     """
     Plot top three trait states.
     """
-    top3 = sorted(traits.items(), key=lambda x: x[1], reverse=True)[:3]
-    labels, values = zip(*top3) if top3 else ([], [])
+    labels, values = trait_metrics(traits).triplet
     fig, ax = plt.subplots()
     ax.pie(values, labels=labels, autopct='%1.1f%%')
     ax.set_title("Triplet State Distribution")
     return fig
+
+
+def trend_series(
+    points: Tuple[Tuple, ...]
+) -> Tuple[List[str], Dict[str, List[float]], List[int]]:
+    """
+    Split trend points ((ISO timestamp, D, I, S, C, stage), ...) into
+    timestamps, per-trait series and stage numbers.
+    """
+    dates = [p[0] for p in points]
+    series = {t: [p[1 + k] for p in points] for k, t in enumerate(("D", "I", "S", "C"))}
+    return dates, series, [p[5] for p in points]
+
+
+def plot_trait_trend(
+    points: Tuple[Tuple, ...],
+    title: str = "Your Traits Over Time"
+) -> Figure:
+    """
+    Plot trait percentages across a user's assessments, with the mapped stage.
+
+    Args:
+        points: (ISO timestamp, D, I, S, C, stage) per assessment, oldest
+            first (see history.trend_points).
+        title: Chart title.
+    """
+    dates, series, stages = trend_series(points)
+    x = list(range(len(dates)))
+    fig, ax = plt.subplots(figsize=(8, 4.8))
+    for trait, values in series.items():
+        ax.plot(x, values, marker='o', label=trait)
+    ax.set_ylim(0, 100)
+    ax.set_ylabel("Trait %")
+    ax.set_xticks(x)
+    # One position per assessment, so two on the same day stay apart.
+    ax.set_xticklabels([d.replace("T", " ")[:16] for d in dates], rotation=30, ha='right')
+
+    stage_ax = ax.twinx()
+    stage_ax.step(x, stages, where='mid', color='gray', linestyle='--', alpha=0.6, label="Stage")
+    stage_ax.set_ylim(0.5, 8.5)
+    stage_ax.set_ylabel("Stage")
+
+    ax.legend(loc='upper left', ncol=4)
+    ax.set_title(title)
+    return fig
+
+
+# ——— Rendered-chart cache ——————————————————————————————————————————————
+
+CHART_FUNCTIONS: Dict[str, Callable[..., Figure]] = {
+    "radar": generate_radar_chart,
+    "spiral": project_spiral,
+    "stage_map": plot_circular_stage_map,
+    "development_path": plot_development_path,
+    "harmonic_convergence": plot_harmonic_convergence,
+    "negiton_damping": plot_negiton_damping,
+    "triplet_state": plot_triplet_state,
+    "trait_trend": plot_trait_trend,
+}
+
+# Matches st.pyplot's defaults so cached images look identical to the old inline charts.
+SAVEFIG_OPTIONS = {"dpi": 200, "bbox_inches": "tight"}
+
+# pyplot keeps global state and is not thread-safe; Streamlit runs sessions on threads.
+_render_lock = threading.RLock()
+
+
+def _normalize(value: Any) -> Any:
+    """
+    Turn chart inputs into a hashable cache key, preserving mapping order
+    (trait order drives label order on the charts).
+    """
+    if isinstance(value, Mapping):
+        return ("map", tuple((k, _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    numpy = sys.modules.get("numpy")  # a numpy scalar implies numpy is already imported
+    if numpy is not None and isinstance(value, numpy.generic):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def figure_to_bytes(fig: Figure, fmt: str = "png") -> bytes:
+    """
+    Serialize a figure and close it so pyplot's figure registry does not grow.
+
+    Args:
+        fig: The figure to render.
+        fmt: Output format ("png" or "svg").
+
+    Returns:
+        The encoded image bytes.
+    """
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format=fmt, **SAVEFIG_OPTIONS)
+    finally:
+        plt.close(fig)
+    return buf.getvalue()
+
+
+class ChartCache:
+    """
+    Thread-safe LRU cache of rendered chart bytes, bounded by entry count and total size.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: Tuple, data: bytes) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = data
+            self._size += len(data)
+            while self._data and (len(self._data) > self.max_entries or self._size > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+chart_cache = ChartCache()
+
+
+def chart_key(name: str, args: Tuple, kwargs: Dict[str, Any], fmt: str = "png") -> Tuple:
+    """Cache key for a chart render; equal for inputs that draw the same image."""
+    return (name, fmt, _normalize(args), _normalize(sorted(kwargs.items())))
+
+
+def render_chart(name: str, *args: Any, fmt: str = "png", **kwargs: Any) -> bytes:
+    """
+    Render a chart from CHART_FUNCTIONS to image bytes, served from the cache
+    when the same normalized inputs were rendered before.
+
+    Args:
+        name: Chart name, a key of CHART_FUNCTIONS.
+        *args: Positional arguments for the chart function.
+        fmt: Output format ("png" or "svg").
+        **kwargs: Keyword arguments for the chart function.
+
+    Returns:
+        The encoded image bytes.
+    """
+    key = chart_key(name, args, kwargs, fmt)
+    data = chart_cache.get(key)
+    if data is None:
+        with _render_lock:
+            data = figure_to_bytes(CHART_FUNCTIONS[name](*args, **kwargs), fmt)
+        chart_cache.put(key, data)
+    return data
+
+
+def chart_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counters and the current size of the chart cache."""
+    return chart_cache.stats()
+
+
+def warm() -> None:
+    """
+    Import matplotlib, load its font cache and render each chart once for a
+    neutral profile (outside the cache), so the first real render is fast.
+    """
+    traits = {"D": 25.0, "I": 25.0, "S": 25.0, "C": 25.0}
+    with _render_lock:
+        plt.load()
+        for name, fn in CHART_FUNCTIONS.items():
+            if name == "development_path":
+                fig = fn(0, 1, {}, {}, "D")
+            elif name == "stage_map":
+                fig = fn(0, 1)
+            elif name == "trait_trend":
+                fig = fn((("2025-01-01T09:00:00", 25, 25, 25, 25, 4), ("2025-02-01T09:00:00", 30, 20, 25, 25, 5)))
+            else:
+                fig = fn(traits)
+            figure_to_bytes(fig)
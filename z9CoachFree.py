@@ -1,23 +1,48 @@
 import streamlit as st
-import random
-import pandas as pd
-from typing import Dict, Any
-
-from utils import load_json_file, save_json_file
+import hmac
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils import load_json_file, get_assessment_log
+from content import SCORE_MAP, get_content, sample_questions
 from analyze_profile import analyze_profile
 from z9_spiral_logic import map_disc_to_stage
-from trait_summary import summarize_trait
-from visuals import (
-    generate_radar_chart,
-    project_spiral,
-    plot_circular_stage_map,
-    plot_development_path,
-    plot_harmonic_convergence,
-    plot_negiton_damping,
-    plot_triplet_state,
-)
-from pdf_export import generate_simple_report
-from convertkit_api import subscribe_user_to_convertkit
+from metrics import ProfileMetrics
+from visuals import chart_backend, render_chart, chart_cache_stats
+from telemetry import get_recorder, span
+from analytics import get_rollups
+from memprofile import get_memory_profiler
+from history import get_history_store, trend_points, user_id_for
+from calibration import calibrated_stage, get_stage_calibrator, observe_submission
+from startup import lazy_module, start_warm_up
+import render_pool
+
+# Heavy dependencies load on the first code path that needs them (see startup.py).
+pd             = lazy_module("pandas")
+outcome_table  = lazy_module("outcome_table")   # numpy
+neighbours     = lazy_module("neighbours")      # numpy
+pdf_export     = lazy_module("pdf_export")      # reportlab
+convertkit_api = lazy_module("convertkit_api")  # requests
+plotly_charts  = lazy_module("plotly_charts")
+
+logger = logging.getLogger(__name__)
+
+# Operator metrics page: open the app with ?ops=<Z9_OPS_TOKEN>. Disabled when unset.
+OPS_TOKEN_ENV = "Z9_OPS_TOKEN"
+
+# Session-state keys: the sampled quiz and the latest scored submission survive reruns.
+QUIZ_KEY   = "z9_quiz"
+RESULT_KEY = "z9_result"
+SEEN_KEY   = "z9_seen_questions"
+
+# Most recent assessments shown in a returning user's trend chart.
+HISTORY_CHART_LIMIT = 20
 
 # ——— Helpers ——————————————————————————————————————————————————
 
@@ -41,23 +66,294 @@ def show_stage_insights(
         st.markdown(f"**Sol Spark:** _{d['sol_spark']}_  ")
         st.markdown(f"**Mindset Goal:** {d['mindset_goal']}")
 
-def log_and_alert(profile: dict, final_stage: str, d: float, i: float, s: float, c: float):
-    entry = {
-        "timestamp": pd.Timestamp.now().isoformat(),
-        "traits": profile["traits"],
-        "trait_score": profile["trait_score"],
-        "harmony_ratio": profile["harmony_ratio"],
-        "stage": final_stage
+def record_history(email: str, result: Dict[str, Any], mood: int):
+    """
+    Add the submission to the user's history (once per submission), remember
+    their user ID, and add every question they have been asked before to the
+    questions this session's next quiz avoids.
+    """
+    try:
+        user_id = user_id_for(email)
+    except (OSError, ValueError):
+        logger.exception("Could not read or create the history secret")
+        return
+    result["user_id"] = user_id
+    quiz = st.session_state.get(QUIZ_KEY) or {}
+    try:
+        with span("history"):
+            store = get_history_store()
+            store.append(user_id, result["submission_id"], result["profile"],
+                         result["auto_stage"], result["perceived"], mood,
+                         questions=quiz.get("indices", ()), content_digest=quiz.get("digest"))
+            past = store.seen_questions(user_id, quiz["digest"]) if quiz else set()
+    except sqlite3.Error:
+        logger.exception("Could not record assessment history")
+        return
+    # The user's next quiz, in this session, avoids what they answered in any session.
+    seen = st.session_state.get(SEEN_KEY)
+    if seen is not None and seen["digest"] == quiz.get("digest"):
+        seen["indices"].update(past)
+
+def show_history(user_id: str, deferred: Dict[int, tuple]):
+    """Trend chart and change since the previous assessment, for users with more than one."""
+    try:
+        with span("history"):
+            entries = get_history_store().history(user_id, limit=HISTORY_CHART_LIMIT)
+    except sqlite3.Error:
+        logger.exception("Could not read assessment history")
+        return
+    st.subheader("📈 Your Progress Over Time")
+    if len(entries) < 2:
+        st.info("This is your first saved assessment. Retake the quiz with the same email later to see how you change.")
+        return
+    show_chart("trait_trend", trend_points(entries), deferred=deferred)
+    previous, latest = entries[-2], entries[-1]
+    changes = ", ".join(f"**{t}** {latest['traits'][t] - previous['traits'][t]:+.0f}" for t in latest["traits"])
+    since = datetime.fromtimestamp(previous["ts"]).strftime("%b %d, %Y")
+    st.markdown(f"Since your assessment on {since}: {changes} (percentage points); "
+                f"stage {previous['stage']} → {latest['stage']}.")
+
+def show_neighbours(result: Dict[str, Any]):
+    """How the nearest past profiles were staged; skipped until the neighbour index is built."""
+    if "neighbours" not in result:
+        with span("neighbours"):
+            index = neighbours.get_neighbour_index()
+            result["neighbours"] = index.query(result["profile"]["traits"]) if index else None
+    summary = result["neighbours"]
+    if not summary or not summary["top_stage"]:
+        return
+    st.subheader("👥 Profiles Like Yours")
+    top = summary["top_stage"]
+    same = " — the same stage you were mapped to" if top == result["auto_stage"] else ""
+    st.markdown(f"Among the **{summary['neighbours']}** past profiles closest to yours, "
+                f"**{summary['stages'][top]:.0%}** were mapped to **{top}**{same}.")
+    st.bar_chart(pd.DataFrame(summary["stages"], index=["Share"]).T)
+    if summary["remedies"]:
+        trait, share = next(iter(summary["remedies"].items()))
+        st.markdown(f"Their most common development area was **{trait}** ({share:.0%} of them), "
+                    f"so the {trait} remedies above are the ones people like you most often work on.")
+
+def queue_subscription(email: str) -> bool:
+    """Queue a ConvertKit subscription; delivery happens on the outbox worker."""
+    try:
+        ck = st.secrets["convertkit"]
+        outbox = convertkit_api.get_outbox(ck["api_key"], ck["form_id"])
+    except (FileNotFoundError, KeyError):
+        return False
+    try:
+        outbox.enqueue(email)
+    except sqlite3.Error:
+        logger.exception("Could not queue the ConvertKit subscription")
+        return False
+    return True
+
+def show_chart(name: str, *args, deferred: Optional[Dict[int, tuple]] = None, **kwargs):
+    """
+    Display a chart: a Plotly spec drawn by the browser, or a cached,
+    pre-rendered image (see visuals.render_chart), per Z9_CHART_BACKEND.
+
+    With ``deferred``, an image chart only reserves its place on the page and
+    is queued; fill_charts() renders the queue and fills each place in.
+    """
+    if chart_backend() == "plotly":
+        with span(f"chart.{name}"):
+            st.plotly_chart(plotly_charts.chart_spec(name, *args, **kwargs), use_container_width=True, theme=None)
+    elif deferred is not None:
+        deferred[len(deferred)] = (st.empty(), (name, args, kwargs))
+    else:
+        with span(f"chart.{name}"):
+            st.image(render_chart(name, *args, **kwargs), use_container_width=True)
+
+def fill_charts(deferred: Dict[int, tuple]):
+    """
+    Render the charts queued by show_chart (in worker processes when
+    Z9_RENDER_WORKERS is set) and show each one as soon as it is ready.
+    """
+    if not deferred:
+        return
+    with span("charts"):
+        requests = {slot: request for slot, (_, request) in deferred.items()}
+        for slot, image in render_pool.render_charts(requests):
+            deferred[slot][0].image(image, use_container_width=True)
+
+def is_operator() -> bool:
+    token = os.environ.get(OPS_TOKEN_ENV, "")
+    supplied = st.query_params.get("ops", "")
+    return bool(token) and hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8"))
+
+def show_operator_page():
+    """Phase latency percentiles, cache hit rates, active sessions and outbox health for operators."""
+    recorder = get_recorder()
+    st.header("🛠️ Operator Metrics")
+    st.button("Refresh")  # clicking reruns the script, which re-reads the counters
+    charts, reports = chart_cache_stats(), pdf_export.report_cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Active Sessions (5 min)", recorder.active_sessions())
+    col2.metric("Chart Cache Hit Rate", f"{charts['hit_rate']:.1%}")
+    col3.metric("PDF Cache Hit Rate", f"{reports['hit_rate']:.1%}")
+    col4.metric("Outcome Table", "loaded" if outcome_table.get_outcome_table() else "live scoring")
+
+    st.subheader("Phase Latency (ms)")
+    summary = recorder.summary()
+    if summary:
+        st.dataframe(pd.DataFrame(summary).T.round(2), use_container_width=True)
+    else:
+        st.info("No spans recorded in this process yet.")
+
+    st.subheader("Caches")
+    st.dataframe(pd.DataFrame({"charts": charts, "pdf reports": reports}).T, use_container_width=True)
+
+    profiler = get_memory_profiler()
+    if profiler is not None:
+        st.subheader("Memory")
+        report = profiler.snapshot() if st.button("Take snapshot now") else profiler.latest()
+        if report is None:
+            st.info(f"First snapshot in {profiler.interval:.0f} s.")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("RSS (MB)", report["rss_mb"])
+            col2.metric("Traced Growth (MB)", report["growth_mb"])
+            col3.metric("Open Figures", report["figures"])
+            col4.metric("Largest Session (KB)", report["sessions"]["max_kb"])
+            for message in report["warnings"]:
+                st.warning(message)
+            st.caption("Top allocation sites since start")
+            st.dataframe(pd.DataFrame(report["top_since_start"]), use_container_width=True)
+
+    st.subheader("Outbox")
+    try:
+        ck = st.secrets["convertkit"]
+        outbox = convertkit_api.get_outbox(ck["api_key"], ck["form_id"])
+        stats = outbox.metrics()
+        dead = stats["by_status"].get("dead", 0)
+    except (FileNotFoundError, KeyError):
+        st.info("ConvertKit is not configured.")
+    except sqlite3.Error:
+        logger.exception("Could not read outbox metrics")
+        st.warning("Could not read the subscription outbox.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Queue Depth", stats["depth"])
+        col2.metric("Oldest Pending (s)", stats["oldest_pending_age"])
+        col3.metric("Delivery p50 / p95 (s)", f"{stats['latency']['p50']} / {stats['latency']['p95']}")
+        col4.metric("Dead Letters", dead)
+        if stats["paused_for"]:
+            st.caption(f"Delivery paused for {stats['paused_for']:.0f} s (rate limited).")
+        if dead:
+            st.dataframe(pd.DataFrame(outbox.dead_letters()), use_container_width=True)
+            if st.button("Requeue dead letters"):
+                st.success(f"Requeued {outbox.requeue_dead()} subscriptions.")
+
+    st.subheader("Cohort")
+    rollups = get_rollups()
+    rollups.refresh()
+    cohort = rollups.summary()
+    st.metric("Logged Assessments", cohort["entries"])
+    if cohort["stages"]:
+        st.bar_chart(pd.Series(cohort["stages"], name="Assessments"))
+    calibrator = get_stage_calibrator()
+    if calibrator is not None:
+        thresholds = calibrator.thresholds()
+        st.caption(f"Calibrated stages: population {calibrator.population()}, thresholds "
+                   + (", ".join(f"{t:.2f}" for t in thresholds) if thresholds
+                      else f"pending (linear mapping until {calibrator.min_samples})"))
+
+def current_quiz(content) -> Dict[str, Any]:
+    """
+    The session's sampled questions, drawn once and kept across reruns.
+
+    A new sample is drawn when the content files change (question indices
+    would no longer line up) or after the user asks for new questions; new
+    samples avoid questions this session has already seen and, once the user
+    has given their email, questions from their earlier assessments (see
+    record_history). ``?seed=N`` makes the draw reproducible.
+    """
+    quiz = st.session_state.get(QUIZ_KEY)
+    if quiz is None or quiz["digest"] != content.digest:
+        seen = st.session_state.get(SEEN_KEY)
+        if seen is None or seen["digest"] != content.digest:
+            seen = {"digest": content.digest, "indices": set()}
+        seed = st.query_params.get("seed", "")
+        quiz = {
+            "id": uuid.uuid4().hex[:12],
+            "digest": content.digest,
+            "indices": sample_questions(content, seed=int(seed) if seed.isdigit() else None,
+                                        exclude=seen["indices"]),
+        }
+        seen["indices"].update(quiz["indices"])
+        st.session_state[SEEN_KEY] = seen
+        st.session_state[QUIZ_KEY] = quiz
+        st.session_state.pop(RESULT_KEY, None)
+    return quiz
+
+def score_submission(sampled, answers, perceived: str) -> Dict[str, Any]:
+    """Score one set of answers; the result is kept in session state under a submission ID."""
+    d = i = s = c = 0.0
+    for q, answer in zip(sampled, answers):
+        val = SCORE_MAP.get(answer, 0)
+        if q["trait"] == "D": d += val
+        if q["trait"] == "I": i += val
+        if q["trait"] == "S": s += val
+        if q["trait"] == "C": c += val
+
+    # Analyze + map (precomputed outcome table when available, live scoring otherwise)
+    with span("scoring"):
+        table   = outcome_table.get_outcome_table()
+        outcome = table.lookup(d, i, s, c) if table else None
+        if outcome:
+            profile, auto_stage = outcome.profile, outcome.stage
+        else:
+            profile    = analyze_profile(d, i, s, c, stage_label=perceived)
+            auto_stage = map_disc_to_stage(d, i, s, c)
+        auto_stage = calibrated_stage(d, i, s, c, auto_stage)
+    return {
+        "submission_id": uuid.uuid4().hex,
+        "totals": (d, i, s, c),
+        "perceived": perceived,
+        "profile": profile,
+        "auto_stage": auto_stage,
     }
-    log = safe_load("assessment_log.json", default=[])
-    log.append(entry)
-    save_json_file(log, "assessment_log.json")
+
+def log_and_alert(metrics: ProfileMetrics):
+    get_assessment_log().append(metrics.log_entry(datetime.now().isoformat()))
     st.success("✅ Your profile has been saved to the log.")
 
+@st.fragment
+def report_download(report_data: Dict[str, Any], report_charts: Dict[str, tuple]):
+    """
+    Build the PDF on request; reruns only this fragment, not the whole page.
+
+    ``report_charts`` maps a caption to (chart name, args, kwargs); the images
+    are rendered here, so nothing is rasterized until a report is asked for.
+    """
+    if not st.button("📄 Prepare my PDF report"):
+        return
+    with st.spinner("Preparing your report…"), span("pdf"):
+        charts = dict(render_pool.render_charts(report_charts))
+        pdf_bytes = render_pool.render_report({**report_data, "charts": charts})
+    st.download_button(
+        "Download PDF",
+        pdf_bytes,
+        "Z9_Insight_Report.pdf",
+        "application/pdf",
+        on_click="ignore"
+    )
+
 # ——— Main App ——————————————————————————————————————————————————
     
 def main():
     st.set_page_config(page_title="Z9 Insight Engine", layout="centered")
+    start_warm_up()
+    ctx = get_script_run_ctx()
+    profiler = get_memory_profiler()
+    if ctx is not None:
+        get_recorder().touch_session(ctx.session_id)
+        if profiler is not None:
+            profiler.record_session(ctx.session_id, st.session_state.to_dict())
+    if is_operator():
+        show_operator_page()
+        return
+
     st.title("🧠 Z9 Insight Engine — Z9 CoachFree © 2025")
 
     st.markdown("""
@@ -82,11 +378,12 @@ def main():
     st.markdown(f"**Your current mood level:** {mood}/10")
     st.markdown("---")
 
-    # Load all JSON sources safely up-front
-    DEFAULT_SIMPLE = {f"Stage {i}": "" for i in range(1,9)}
-    stage_summaries = safe_load("stage_summaries.json", DEFAULT_SIMPLE)
-    ee_narratives   = safe_load("results_ee_stage_summaries.json", {})
-    path_map        = safe_load("stage_path_map.json", {})
+    # Shared, pre-validated content (parsed once per process, reloaded on change)
+    with span("content"):
+        content = get_content()
+    stage_summaries = content.stage_summaries
+    ee_narratives   = content.ee_narratives
+    path_map        = content.path_map
 
     # Sidebar
     st.sidebar.subheader("🔖 Quick E.Erikson Stage Tips")
@@ -94,16 +391,16 @@ def main():
         st.sidebar.markdown(f"**{lbl}**: {tip}")
     st.sidebar.markdown("---")
 
-    # DISC quiz + perceived stage form
-    questions = load_json_file("master_disc_questions.json")
-    sampled   = random.sample(questions, 16)
+    # DISC quiz + perceived stage form (same questions on every rerun of this session)
+    quiz      = current_quiz(content)
+    sampled   = [content.questions[n] for n in quiz["indices"]]
 
     with st.form("quiz"):
         st.subheader("📋 Quiz Questions"
                       "🤔Answer each question according to how you currently feel.")
         responses = {}
         for idx, q in enumerate(sampled):
-            responses[idx] = st.radio(q["question"], q["options"], key=f"q_{idx}")
+            responses[idx] = st.radio(q["question"], q["options"], key=f"q_{quiz['id']}_{idx}")
 
         st.subheader("🧭 Your Perceived EE Stage")
         perceived = st.selectbox(
@@ -111,24 +408,46 @@ def main():
             list(stage_summaries.keys())
         )
 
+        email = st.text_input("📧 Email (optional) — receive your insights and Z9 updates")
+
         submit = st.form_submit_button("📊 Generate My Profile")
 
-    if not submit:
+    if st.button("🔄 Start over with new questions"):
+        st.session_state.pop(QUIZ_KEY, None)
+        st.session_state.pop(RESULT_KEY, None)
+        st.rerun()
+
+    # Score only on submit, and only when the answers changed; any other rerun
+    # (mood slider, PDF button) reuses the stored submission.
+    submitted_at = time.perf_counter()
+    if submit:
+        answers = tuple(responses[idx] for idx in range(len(sampled)))
+        result  = st.session_state.get(RESULT_KEY)
+        if result is None or result["inputs"] != (quiz["id"], answers, perceived):
+            result = score_submission(sampled, answers, perceived)
+            result["inputs"] = (quiz["id"], answers, perceived)
+            result["metrics"] = ProfileMetrics(result["profile"], result["auto_stage"], mood)
+            st.session_state[RESULT_KEY] = result
+            # Logging happens once per submission; resubmitting the same answers reuses it.
+            log_and_alert(result["metrics"])
+            observe_submission(*result["totals"])
+        # History and the subscription happen once per submission and email, so
+        # adding an email and resubmitting the same answers still records them.
+        normalized = email.strip().lower()
+        if normalized and result.get("email") != normalized:
+            result["email"] = normalized
+            record_history(email, result, mood)
+            if queue_subscription(email):
+                st.caption("📬 You're subscribed — watch your inbox.")
+
+    result = st.session_state.get(RESULT_KEY)
+    if result is None:
         return
-
-    # Score mapping
-    score_map = {"Strongly Disagree":1, "Disagree":2, "Agree":4, "Strongly Agree":5}
-    d = i = s = c = 0.0
-    for idx, q in enumerate(sampled):
-        val = score_map.get(responses[idx], 0)
-        if q["trait"] == "D": d += val
-        if q["trait"] == "I": i += val
-        if q["trait"] == "S": s += val
-        if q["trait"] == "C": c += val
-
-    # Analyze + map
-    profile    = analyze_profile(d, i, s, c, stage_label=perceived)
-    auto_stage = map_disc_to_stage(d, i, s, c)
+    profile, auto_stage, perceived = result["profile"], result["auto_stage"], result["perceived"]
+    # Derived metrics are computed on first use and kept with the submission.
+    metrics = result.get("metrics")
+    if metrics is None or metrics.mood != mood:
+        metrics = result["metrics"] = ProfileMetrics(profile, auto_stage, mood)
 
     # Indices for visuals
     perc_idx = int(perceived.split()[1]) - 1
@@ -142,17 +461,17 @@ def main():
     gap = abs(perc_idx - auto_idx)
     st.metric("Alignment Gap", f"{gap}", delta_color="normal" if gap<=1 else "inverse")
 
-      # Determine dominant trait once
-    dominant = max(profile["traits"], key=profile["traits"].get)
+    dominant = metrics.trait.dominant
 
     # — Charts & Summaries —————————————————————————————
     st.markdown("---")
     st.header("📊 Your Charts & Metrics")
     st.success(f"Composite Trait Score: **{profile['trait_score']}**")
+    deferred_charts: Dict[int, tuple] = {}
 
     # 🔵 DISC Radar Chart
     st.subheader("🔵 DISC Radar Chart")
-    st.pyplot(generate_radar_chart(profile["traits"]))
+    show_chart("radar", profile["traits"], deferred=deferred_charts)
     st.markdown(
         "“Your footprint across Dominance, Influence, Steadiness, and Conscientiousness”  \n"
         "This spider-web plot shows at a glance where you naturally shine and where you might pull back. "
@@ -163,7 +482,8 @@ def main():
 
     # 🌀 Z9 Spiral Projection
     st.subheader("🌀 Z9 Spiral Projection")
-    st.pyplot(project_spiral(profile["traits"], recursion_score=3.0, negated_traits=profile["negated"]))
+    show_chart("spiral", profile["traits"], recursion_score=3.0, negated_traits=profile["negated"],
+               deferred=deferred_charts)
     st.markdown(
         "“Visualizing your trait harmony and recursive growth”  \n"
         "By mapping your trait percentages onto a spiral, this chart reflects how balanced (or lopsided) "
@@ -173,14 +493,18 @@ def main():
     )
     
     st.subheader("🧩 Your Trait Summary")
-    st.markdown(summarize_trait(profile["traits"], auto_stage, mood))
-    st.metric("Stable Recursion Score", profile["recursion_result"]["stable_score"])
+    with span("summary"):
+        st.markdown(metrics.summary)
+    recursion = profile["recursion_result"]
+    st.metric("Stable Recursion Score", recursion["stable_score"],
+              help=f"Your profile after the Z9 recursion settles: converged in {recursion['iterations']} iterations."
+              if recursion.get("converged", True) else
+              f"Your profile after {recursion['iterations']} iterations of the Z9 recursion (not yet settled).")
 
     st.subheader("⚖️ Balance & Negation Metrics")
     col1, col2 = st.columns(2)
     col1.metric("Harmony Ratio", f"{profile['harmony_ratio']}%")
-    neg_rate = round(sum(profile["negated"].values()) / max(len(profile["negated"]),1) * 100)
-    col2.metric("Avg Negation Rate", f"{neg_rate}%")
+    col2.metric("Avg Negation Rate", f"{metrics.negation_rate}%")
     if profile["negated"]:
         df_neg = pd.DataFrame(profile["negated"], index=["Negation %"]).T
         st.bar_chart(df_neg)
@@ -203,16 +527,19 @@ def main():
     else:
         st.info("No coaching remedies available.")
 
+    show_neighbours(result)
+
 # 🗺️ Your Development Journey
     st.subheader("🗺️ Your Development Journey")
-    fig = plot_development_path(
+    show_chart(
+        "development_path",
         perc_idx,
         auto_idx,
         ee_narratives,
         path_map,
-        dominant
+        dominant,
+        deferred=deferred_charts
     )
-    st.pyplot(fig)
     st.markdown(
         "“A step-by-step path from where you feel to where you’re guided”  \n"
         "This linear flow walks you through each Erikson stage between your Perceived and Auto-Mapped stages, "
@@ -222,7 +549,7 @@ def main():
 
     # 🎶 Harmonic Convergence Index
     st.subheader("🎶 Harmonic Convergence Index")
-    st.pyplot(plot_harmonic_convergence(profile["traits"]))
+    show_chart("harmonic_convergence", profile["traits"], deferred=deferred_charts)
     st.markdown(
         "“Measuring the resonance of your four styles”  \n"
         "Borrowing from Z9’s mathematical core, this index scores how well your traits blend into a coherent whole. "
@@ -233,7 +560,7 @@ def main():
 
     # ⏳ Negiton Rest-Phase Damping
     st.subheader("⏳ Negiton Rest-Phase Damping")
-    st.pyplot(plot_negiton_damping(profile["traits"]))
+    show_chart("negiton_damping", profile["traits"], deferred=deferred_charts)
     st.markdown(
         "“Spotlighting the shadows of your primary trait”  \n"
         "Negiton damping reflects how your lesser traits pull back when your dominant style takes over. Think of it as the echo "
@@ -243,7 +570,7 @@ def main():
 
     # 🔄 Triplet State Function
     st.subheader("🔄 Triplet State Function")
-    st.pyplot(plot_triplet_state(profile["traits"]))
+    show_chart("triplet_state", profile["traits"], deferred=deferred_charts)
     st.markdown(
         "“Capturing your three-trait interplay in dynamic form”  \n"
         "This tri-node graph models how any three of your trait percentages interact in real time—like a mini ecosystem of you. "
@@ -251,6 +578,12 @@ def main():
         "can turbocharge creativity or productivity; gently pull it back if you sense burnout or tunnel vision."
     )
 
+    if result.get("user_id"):
+        show_history(result["user_id"], deferred_charts)
+
+    # All chart text is on the page; now draw the queued charts into their places.
+    fill_charts(deferred_charts)
+
     # — Gate to Z9CoachLite Free Trial —————————————————————
     st.markdown("---")
     st.markdown(
@@ -282,25 +615,20 @@ def main():
     )
 
     # 📌Reporting 
-    report_data = {
-        "trait_score": profile["trait_score"],
-        "harmony_ratio": profile["harmony_ratio"],
-        "stage": auto_stage,
-        "trait_summary": summarize_trait(profile["traits"], auto_stage, mood)
-    }
-
-    # 📌 Generate the simple PDF
-    pdf_bytes = generate_simple_report(report_data)
-
-    # 📌 Download button
+    with span("report_data"):
+        report_data = metrics.report_data
+        report_charts = {
+            "DISC Radar Chart": ("radar", (profile["traits"],), {}),
+            "Z9 Spiral Projection": (
+                "spiral", (profile["traits"],), {"recursion_score": 3.0, "negated_traits": profile["negated"]}
+            ),
+            "Harmonic Convergence Index": ("harmonic_convergence", (profile["traits"],), {}),
+        }
+
+    # 📌 Download (the PDF is only built when asked for, then memoized)
     st.markdown("---")
     st.subheader("📥 Download Your Full Insight Report")
-    st.download_button(
-        "Download PDF",
-        pdf_bytes,
-        "Z9_Insight_Report.pdf",
-        "application/pdf"
-    )
+    report_download(report_data, report_charts)
 
     # — ✅ Footer ————————————————————————————————————————————————
     st.markdown(
@@ -311,6 +639,7 @@ def main():
         """,
         unsafe_allow_html=True
     )
+    get_recorder().record("submission" if submit else "rerun", time.perf_counter() - submitted_at)
 
 if __name__ == "__main__":
     main()